@@ -0,0 +1,342 @@
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+from .config import settings
+from .rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    # httpx (with httpcore and h2) is one of the slowest imports in the app; the
+    # gateway only needs it once a Gemini client exists
+    import httpx
+
+# Latency samples kept per operation for percentiles
+LATENCY_SAMPLES = 1000
+
+class AIGatewayError(Exception):
+    """A Gemini call failed; `retry_after` is a hint for clients, in seconds"""
+
+    kind = "error"
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, kind: Optional[str] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        if kind is not None:
+            self.kind = kind
+
+class CircuitOpenError(AIGatewayError):
+    kind = "circuit_open"
+
+class GatewayBusyError(AIGatewayError):
+    kind = "rate_limited"
+
+class UpstreamError(AIGatewayError):
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"Gemini returned status {status_code}", retry_after, kind=f"status_{status_code}")
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code == 429 or self.status_code >= 500
+
+def _retry_after(response: "httpx.Response") -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """
+    Fails calls fast while Gemini is failing.
+
+    Opens after `failure_threshold` consecutive failures; after
+    `reset_seconds` a single probe call is let through, which closes the
+    circuit on success or re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        """Give up the half-open probe without an outcome (the call was shed or cancelled)"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+            if self._opened_at is None:
+                self.opened += 1
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+class OperationMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1)
+
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "errors": dict(self.errors),
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
+
+class AIGateway:
+    """
+    Single path for every Gemini request.
+
+    Calls are admitted through a token bucket sized to the Gemini quota and a
+    cap on in-flight requests; callers that cannot be admitted within
+    `queue_timeout` are shed instead of queueing indefinitely. 429 and 5xx
+    responses, timeouts and connection errors are retried with exponential
+    backoff and full jitter, and feed a circuit breaker that rejects calls
+    immediately while Gemini is down. Non-streaming calls can be hedged: if
+    no response has arrived after `hedge_after` seconds a second request is
+    sent, quota permitting, and the first success wins.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        burst: int,
+        max_concurrent_requests: int,
+        queue_timeout: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        failure_threshold: int,
+        reset_seconds: float,
+        hedge_after: float = 0.0
+    ):
+        self.rate_limiter = TokenBucket(rate=requests_per_minute / 60.0, capacity=float(burst))
+        self.max_concurrent_requests = max_concurrent_requests
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.circuit = CircuitBreaker(failure_threshold=failure_threshold, reset_seconds=reset_seconds)
+        self.metrics: Dict[str, OperationMetrics] = defaultdict(OperationMetrics)
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore belongs to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent_requests)
+        return self._slots
+
+    async def post(self, operation: str, client: "httpx.AsyncClient", url: str, payload: dict, hedge: bool = False) -> "httpx.Response":
+        """POST to Gemini, returning a 200 response or raising AIGatewayError"""
+
+        async def send() -> "httpx.Response":
+            await self._acquire_slot()
+            try:
+                response = await client.post(url, json=payload)
+            finally:
+                self.slots.release()
+            if response.status_code != 200:
+                raise UpstreamError(response.status_code, _retry_after(response))
+            return response
+
+        return await self._call(operation, send, hedge=hedge and self.hedge_after > 0)
+
+    @asynccontextmanager
+    async def stream(self, operation: str, client: "httpx.AsyncClient", url: str, payload: dict) -> "AsyncIterator[httpx.Response]":
+        """
+        POST to Gemini and yield the streaming 200 response. Only opening the
+        stream is retried; the request holds a concurrency slot until closed.
+        """
+
+        async def send() -> "httpx.Response":
+            response = await client.send(client.build_request("POST", url, json=payload), stream=True)
+            if response.status_code != 200:
+                await response.aread()
+                await response.aclose()
+                raise UpstreamError(response.status_code, _retry_after(response))
+            return response
+
+        await self._acquire_slot()
+        try:
+            response = await self._call(operation, send)
+            try:
+                yield response
+            finally:
+                await response.aclose()
+        finally:
+            self.slots.release()
+
+    async def _acquire_slot(self) -> None:
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise GatewayBusyError("Too many Gemini requests in flight", retry_after=1.0)
+
+    def _allow(self) -> bool:
+        """Pass the circuit breaker; True when this call is the half-open probe"""
+        if not self.circuit.allow():
+            raise CircuitOpenError("Gemini circuit is open", retry_after=self.circuit.retry_after())
+        return self.circuit.state == "half_open"
+
+    async def _admit(self) -> None:
+        try:
+            await asyncio.wait_for(self.rate_limiter.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise GatewayBusyError("Gemini request quota exhausted", retry_after=1.0 / self.rate_limiter.rate)
+
+    async def _call(self, operation: str, send: Callable[[], Awaitable["httpx.Response"]], hedge: bool = False) -> "httpx.Response":
+        import httpx
+
+        metrics = self.metrics[operation]
+        metrics.calls += 1
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            error: AIGatewayError
+            probe = False
+            try:
+                probe = self._allow()
+                await self._admit()
+                response = await (self._hedged(metrics, send) if hedge else send())
+            except UpstreamError as e:
+                error = e
+                if e.retryable:
+                    self.circuit.record_failure()
+                else:
+                    # The request itself was rejected; Gemini is healthy
+                    self.circuit.record_success()
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                self.circuit.record_failure()
+                kind = "timeout" if isinstance(e, httpx.TimeoutException) else "transport"
+                error = AIGatewayError(f"Gemini request failed: {e!r}", kind=kind)
+            except AIGatewayError as e:
+                # Circuit open or shed by the limiter: nothing was sent, so no retry
+                metrics.failures += 1
+                metrics.errors[e.kind] += 1
+                raise
+            else:
+                self.circuit.record_success()
+                metrics.successes += 1
+                metrics.latencies.append(time.perf_counter() - started)
+                return response
+            finally:
+                # A probe that was shed or cancelled produced no outcome; free
+                # it, or the breaker would stay half-open and reject every call
+                if probe:
+                    self.circuit.release_probe()
+
+            metrics.errors[error.kind] += 1
+            retryable = not isinstance(error, UpstreamError) or error.retryable
+            if not retryable or attempt >= self.max_retries:
+                metrics.failures += 1
+                raise error
+
+            attempt += 1
+            metrics.retries += 1
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if error.retry_after is not None:
+                delay = max(delay, min(error.retry_after, self.backoff_max))
+            await asyncio.sleep(delay)
+
+    async def _hedged(self, metrics: OperationMetrics, send: Callable[[], Awaitable["httpx.Response"]]) -> "httpx.Response":
+        primary = asyncio.create_task(send())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_after)
+            # A hedge spends quota, so only send one when a token is free right now
+            if done or not self.rate_limiter.try_acquire():
+                return await primary
+
+            metrics.hedges += 1
+            hedge = asyncio.create_task(send())
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing request, or both when the caller is cancelled
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "circuit": {
+                "state": self.circuit.state,
+                "opened": self.circuit.opened,
+                "retry_after": round(self.circuit.retry_after(), 1),
+            },
+            "operations": {operation: metrics.stats() for operation, metrics in self.metrics.items()},
+        }
+
+# Global instance
+ai_gateway = AIGateway(
+    requests_per_minute=settings.gemini_requests_per_minute,
+    burst=settings.gemini_burst,
+    max_concurrent_requests=settings.gemini_max_concurrent_requests,
+    queue_timeout=settings.gemini_queue_timeout_seconds,
+    max_retries=settings.gemini_max_retries,
+    backoff_base=settings.gemini_backoff_base_seconds,
+    backoff_max=settings.gemini_backoff_max_seconds,
+    failure_threshold=settings.gemini_circuit_failure_threshold,
+    reset_seconds=settings.gemini_circuit_reset_seconds,
+    hedge_after=settings.gemini_hedge_after_seconds
+)
@@ -1,69 +1,183 @@
-import httpx
-from typing import Optional, List
+import json
+import logging
+from typing import TYPE_CHECKING, AsyncIterator, Optional, List, Sequence
+from .ai_gateway import ai_gateway, AIGatewayError
 from .config import settings
+from .rag import Passage
+from .response_cache import response_cache
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
 
 class GeminiAIService:
     def __init__(self):
         self.api_key = settings.gemini_api_key
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+        self.model_url = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.gemini_model}"
+        self.base_url = f"{self.model_url}:generateContent"
+        self.stream_url = f"{self.model_url}:streamGenerateContent"
+        self._client: Optional["httpx.AsyncClient"] = None
+    
+    async def start(self) -> None:
+        """
+        Open the shared HTTP client used for every Gemini request
+        """
+        if self._client is None:
+            self._client = self._create_client()
+    
+    async def close(self) -> None:
+        """
+        Close the shared HTTP client and release pooled connections
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _create_client(self) -> "httpx.AsyncClient":
+        # Imported here so importing the app does not pay for httpx and h2
+        import httpx
+
+        return httpx.AsyncClient(
+            http2=settings.gemini_http2,
+            limits=httpx.Limits(
+                max_connections=settings.gemini_max_connections,
+                max_keepalive_connections=settings.gemini_max_keepalive_connections,
+                keepalive_expiry=settings.gemini_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.gemini_connect_timeout,
+                read=settings.gemini_read_timeout,
+                write=settings.gemini_write_timeout,
+                pool=settings.gemini_pool_timeout,
+            ),
+        )
+    
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        # Created lazily when the service is used outside the app lifecycle (scripts, shells)
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
     
     async def generate_response(
         self, 
         message: str, 
         subject_context: Optional[str] = None,
-        grade: Optional[int] = None
+        grade: Optional[int] = None,
+        passages: Sequence[Passage] = ()
     ) -> str:
         """
-        Generate AI response for CeynovX chat
+        Generate AI response for CeynovX chat.
+        
+        Raises AIGatewayError when Gemini cannot be reached (after retries) or
+        the circuit is open.
         """
-        try:
-            # Build context-aware prompt
-            context_prompt = self._build_context_prompt(message, subject_context, grade)
-            
-            # Prepare request payload
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": context_prompt
-                            }
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 1024,
+        # Build context-aware prompt
+        context_prompt = self._build_context_prompt(message, subject_context, grade, passages)
+        
+        # Serve repeated and near-identical questions from the response cache
+        if settings.chat_cache_enabled:
+            cached = response_cache.get(context_prompt, message, subject_context, grade)
+            if cached is not None:
+                return cached
+        
+        # Chat prompts are idempotent, so slow calls may be hedged
+        response = await ai_gateway.post(
+            "chat",
+            self.client,
+            f"{self.base_url}?key={self.api_key}",
+            self._build_chat_payload(context_prompt),
+            hedge=True
+        )
+        
+        text = self._extract_text(response.json())
+        if text:
+            if settings.chat_cache_enabled:
+                response_cache.set(context_prompt, message, subject_context, grade, text)
+            return text
+        
+        # Fallback response (e.g. the answer was blocked)
+        return "I'm sorry, I couldn't process your request at the moment. Please try again."
+    
+    async def stream_response(
+        self,
+        message: str,
+        subject_context: Optional[str] = None,
+        grade: Optional[int] = None,
+        passages: Sequence[Passage] = ()
+    ) -> AsyncIterator[str]:
+        """
+        Stream AI response text chunks for CeynovX chat as Gemini produces them.
+        
+        The upstream request is read only as fast as the caller consumes chunks,
+        and closing or cancelling the generator closes the upstream stream.
+        """
+        context_prompt = self._build_context_prompt(message, subject_context, grade, passages)
+        
+        if settings.chat_cache_enabled:
+            cached = response_cache.get(context_prompt, message, subject_context, grade)
+            if cached is not None:
+                yield cached
+                return
+        
+        parts = []
+        async with ai_gateway.stream(
+            "chat_stream",
+            self.client,
+            f"{self.stream_url}?alt=sse&key={self.api_key}",
+            self._build_chat_payload(context_prompt)
+        ) as response:
+            async for line in response.aiter_lines():
+                # Server-Sent Events: only "data:" lines carry response chunks
+                if not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[len("data:"):].strip())
+                text = self._extract_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+        
+        # Only a stream that ran to completion is cached
+        if parts and settings.chat_cache_enabled:
+            response_cache.set(context_prompt, message, subject_context, grade, "".join(parts))
+    
+    def _build_chat_payload(self, prompt: str) -> dict:
+        return {
+            "contents": [
+                {
+                    "parts": [
+                        {
+                            "text": prompt
+                        }
+                    ]
                 }
+            ],
+            "generationConfig": {
+                "temperature": 0.7,
+                "topK": 40,
+                "topP": 0.95,
+                "maxOutputTokens": 1024,
             }
-            
-            # Make API request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}?key={self.api_key}",
-                    json=payload,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if "candidates" in result and len(result["candidates"]) > 0:
-                        content = result["candidates"][0]["content"]
-                        if "parts" in content and len(content["parts"]) > 0:
-                            return content["parts"][0]["text"]
-                
-                # Fallback response
-                return "I'm sorry, I couldn't process your request at the moment. Please try again."
-                
-        except Exception as e:
-            print(f"Error in Gemini AI service: {e}")
-            return "I'm experiencing technical difficulties. Please try again later."
+        }
+    
+    def _extract_text(self, result: dict) -> str:
+        candidates = result.get("candidates") or []
+        if not candidates:
+            return ""
+        parts = candidates[0].get("content", {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
     
-    def _build_context_prompt(self, message: str, subject: Optional[str] = None, grade: Optional[int] = None) -> str:
+    def _build_context_prompt(
+        self,
+        message: str,
+        subject: Optional[str] = None,
+        grade: Optional[int] = None,
+        passages: Sequence[Passage] = ()
+    ) -> str:
         """
-        Build a context-aware prompt for educational responses
+        Build a context-aware prompt for educational responses, grounded in
+        the retrieved course material when there is any
         """
         base_prompt = """You are CeynovX, an AI educational assistant for Sri Lankan students. 
         You help students understand their school subjects and provide clear, accurate explanations.
@@ -84,6 +198,11 @@ class GeminiAIService:
         if grade:
             base_prompt += f"\nGrade level: {grade}"
         
+        if passages:
+            base_prompt += "\n\nAnswer from the course material below where it is relevant:"
+            for number, passage in enumerate(passages, start=1):
+                base_prompt += f"\n[{number}] {passage.source}\n{passage.text}"
+        
         base_prompt += f"\n\nQuestion: {message}\n\nPlease provide a helpful response:"
         
         return base_prompt
@@ -134,30 +253,123 @@ class GeminiAIService:
                 }
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}?key={self.api_key}",
-                    json=payload,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if "candidates" in result and len(result["candidates"]) > 0:
-                        content = result["candidates"][0]["content"]
-                        if "parts" in content and len(content["parts"]) > 0:
-                            # Try to parse the response as JSON
-                            import json
-                            try:
-                                return json.loads(content["parts"][0]["text"])
-                            except json.JSONDecodeError:
-                                return None
-                
-                return None
-                
-        except Exception as e:
-            print(f"Error generating quiz question: {e}")
+            response = await ai_gateway.post(
+                "quiz_question",
+                self.client,
+                f"{self.base_url}?key={self.api_key}",
+                payload
+            )
+            
+            result = response.json()
+            if "candidates" in result and len(result["candidates"]) > 0:
+                content = result["candidates"][0]["content"]
+                if "parts" in content and len(content["parts"]) > 0:
+                    # Try to parse the response as JSON
+                    try:
+                        return json.loads(content["parts"][0]["text"])
+                    except json.JSONDecodeError:
+                        return None
+            
+            return None
+        
+        except AIGatewayError:
+            # Upstream unavailable: let the caller report it rather than a bad answer
+            raise
+        except Exception:
+            logger.exception("Error generating quiz question")
             return None
+    
+    async def generate_quiz_questions(
+        self,
+        subject: str,
+        topic: str,
+        grade: int,
+        difficulty: str = "medium",
+        count: int = 10
+    ) -> List[dict]:
+        """
+        Generate several quiz questions in one request using Gemini's JSON output mode
+        """
+        try:
+            prompt = f"""Generate {count} different multiple choice questions for a {grade}th grade {subject} student about {topic}.
+            
+            Difficulty level: {difficulty}
+            
+            Each question must have four options labelled A-D, exactly one correct answer and a brief explanation.
+            Do not repeat questions. Make sure the questions are appropriate for {grade}th grade level and follow the Sri Lankan curriculum."""
+            
+            payload = {
+                "contents": [
+                    {
+                        "parts": [
+                            {
+                                "text": prompt
+                            }
+                        ]
+                    }
+                ],
+                "generationConfig": {
+                    "temperature": 0.9,
+                    "maxOutputTokens": 512 * count,
+                    "responseMimeType": "application/json",
+                    "responseSchema": QUIZ_QUESTIONS_SCHEMA,
+                }
+            }
+            
+            response = await ai_gateway.post(
+                "quiz_questions",
+                self.client,
+                f"{self.base_url}?key={self.api_key}",
+                payload
+            )
+            
+            text = self._extract_text(response.json())
+            if text:
+                try:
+                    questions = json.loads(text)
+                except json.JSONDecodeError:
+                    return []
+                if isinstance(questions, list):
+                    return questions
+            
+            return []
+        
+        except AIGatewayError:
+            # Upstream unavailable: let the job fail instead of storing nothing silently
+            raise
+        except Exception:
+            logger.exception("Error generating quiz questions")
+            return []
+
+# Gemini structured-output schema for a batch of multiple choice questions
+QUIZ_QUESTIONS_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "question": {"type": "STRING"},
+            "options": {
+                "type": "OBJECT",
+                "properties": {
+                    "A": {"type": "STRING"},
+                    "B": {"type": "STRING"},
+                    "C": {"type": "STRING"},
+                    "D": {"type": "STRING"},
+                },
+                "required": ["A", "B", "C", "D"],
+            },
+            "correct_answer": {"type": "STRING", "enum": ["A", "B", "C", "D"]},
+            "explanation": {"type": "STRING"},
+        },
+        "required": ["question", "options", "correct_answer"],
+    },
+}
+
+# Global instance, built on first use rather than at import
+_ai_service: Optional[GeminiAIService] = None
 
-# Global instance
-ai_service = GeminiAIService() 
\ No newline at end of file
+def get_ai_service() -> GeminiAIService:
+    global _ai_service
+    if _ai_service is None:
+        _ai_service = GeminiAIService()
+    return _ai_service 
\ No newline at end of file
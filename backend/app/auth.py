@@ -1,32 +1,148 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from .database import get_db
-from .models import User
-from .schemas import TokenData
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+from .database import get_db, SessionLocal, replica_router
+from .models import User, Profile
+from .schemas import TokenData, TokenClaims
 from .config import settings
+from .ttl_cache import TTLCache
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+# Password hashing. Hashes made with a different cost factor are flagged by
+# verify_and_update so they can be upgraded transparently on login.
+_pwd_context: Optional["CryptContext"] = None
+
+def password_context() -> "CryptContext":
+    """
+    The bcrypt CryptContext, built on first use: importing passlib loads its
+    handler registry and bcrypt backend, which only login and registration need
+    """
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
+    return _pwd_context
+
+# bcrypt releases the GIL, so a small thread pool runs hashes in parallel while
+# capping how many can run at once; excess requests queue here, not on the event loop
+password_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="password-hash"
+)
 
 # JWT token configuration
 SECRET_KEY = settings.jwt_secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
+
+# "typ" claim values; tokens issued before the claim existed are access tokens
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
 
 # Security scheme
 security = HTTPBearer()
 
+# Detached User (with Profile loaded) objects keyed by user id.
+# Cached objects are read-only: handlers that write a profile load their own copy
+# and call invalidate_identity afterwards.
+identity_cache: TTLCache[User] = TTLCache(
+    ttl_seconds=settings.identity_cache_ttl_seconds,
+    max_entries=settings.identity_cache_max_entries
+)
+
+def invalidate_identity(user_id: int) -> None:
+    identity_cache.invalidate(user_id)
+
+class TokenRevocationList:
+    """
+    Current token version of users whose tokens were revoked recently.
+
+    Access tokens carrying an older version are rejected without a database
+    lookup. Revocations older than the access-token lifetime cannot matter
+    (those tokens have expired), so only recent ones are kept and the set
+    stays tiny. It is reloaded every `refresh_seconds` to pick up revocations
+    made by other workers; revocations made in this process apply at once.
+    """
+
+    def __init__(self, window_seconds: float, refresh_seconds: float):
+        self.window_seconds = window_seconds
+        self.refresh_seconds = refresh_seconds
+        self._versions: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def revoke(self, user_id: int, version: int) -> None:
+        self._versions[user_id] = max(version, self._versions.get(user_id, 0))
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        return version < self._versions.get(user_id, 0)
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    async def load(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.window_seconds)
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(User.id, User.token_version).where(User.tokens_revoked_at >= cutoff)
+            )
+            self._versions = {user_id: version for user_id, version in result.all()}
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self.load()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"Error refreshing token revocation list: {e}")
+
+# Global instance
+token_revocations = TokenRevocationList(
+    window_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    refresh_seconds=settings.token_revocation_refresh_seconds
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_context().hash(password)
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the password-hash thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hash_executor, get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the password-hash thread pool.
+
+    Returns (verified, new_hash); new_hash is set when the stored hash uses
+    outdated parameters and should be replaced.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_hash_executor, password_context().verify_and_update, plain_password, hashed_password
+    )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -35,47 +151,156 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    # python-jose is imported on first use; it loads RSA/EC backends HS256 never needs
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
+def create_user_tokens(user: User, grade: Optional[int]) -> dict:
+    """
+    Issue an access/refresh token pair for a user.
+
+    The access token carries enough identity (id, grade, active flag and token
+    version) for most endpoints to authenticate without touching the database.
+    """
+    claims = {"sub": user.email, "uid": user.id, "ver": user.token_version or 0}
+    access_token = create_access_token(
+        data={**claims, "typ": ACCESS_TOKEN_TYPE, "grade": grade, "act": bool(user.is_active)},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = create_access_token(
+        data={**claims, "typ": REFRESH_TOKEN_TYPE},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+def decode_token(token: str) -> Optional[dict]:
+    from jose import JWTError, jwt
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
+def verify_token(token: str) -> Optional[str]:
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    return payload.get("sub")
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int) -> Optional[int]:
+    """
+    Invalidate every access and refresh token issued to a user so far.
+
+    Bumps the user's token version inside the caller's transaction and returns
+    the new version (None if the user does not exist). Once committed, pass it
+    to token_revocations.revoke. Deactivating a user must go through this too.
+    """
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(token_version=User.token_version + 1, tokens_revoked_at=datetime.utcnow())
+        .returning(User.token_version)
+    )
+    return result.scalar_one_or_none()
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    try:
-        token = credentials.credentials
-        email = verify_token(token)
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    # Get user from database
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
-    
-    if user is None:
-        raise credentials_exception
-    
+
+async def _load_user(db: AsyncSession, condition) -> Optional[User]:
+    # Get user and profile from database in one query
+    result = await db.execute(select(User).options(joinedload(User.profile)).where(condition))
+    return result.scalar_one_or_none()
+
+def _decode_access_token(credentials: HTTPAuthorizationCredentials) -> dict:
+    payload = decode_token(credentials.credentials)
+    if payload is None or payload.get("sub") is None:
+        raise _credentials_exception()
+    if payload.get("typ", ACCESS_TOKEN_TYPE) != ACCESS_TOKEN_TYPE:
+        raise _credentials_exception()
+    if "uid" in payload and token_revocations.is_revoked(payload["uid"], payload.get("ver", 0)):
+        raise _credentials_exception()
+    return payload
+
+async def get_current_claims(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> TokenClaims:
+    """
+    Identity of an active user taken from the access token alone.
+
+    For endpoints that only need the user id: no database round trip unless
+    the token predates the uid claim.
+    """
+    payload = _decode_access_token(credentials)
+
+    if "uid" not in payload:
+        user = await get_current_user(credentials, db)
+        claims = TokenClaims(
+            user_id=user.id,
+            email=user.email,
+            grade=user.profile.grade if user.profile else None,
+            is_active=bool(user.is_active),
+            version=user.token_version or 0
+        )
+    else:
+        claims = TokenClaims(
+            user_id=payload["uid"],
+            email=payload["sub"],
+            grade=payload.get("grade"),
+            is_active=payload.get("act", True),
+            version=payload.get("ver", 0)
+        )
+
+    if not claims.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return claims
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    payload = _decode_access_token(credentials)
+    user_id = payload.get("uid")
+
+    if user_id is not None:
+        user = identity_cache.get(user_id)
+        if user is not None:
+            return user
+        user = await _load_user(db, User.id == user_id)
+    else:
+        user = await _load_user(db, User.email == payload["sub"])
+
+    # The version check also catches revocations this worker has not loaded yet
+    if user is None or payload.get("ver", 0) < (user.token_version or 0):
+        raise _credentials_exception()
+
+    # Detach so the cached objects never expire or lazy-load through this session
+    if user.profile is not None:
+        db.expunge(user.profile)
+    db.expunge(user)
+    identity_cache.set(user.id, user)
+
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user 
\ No newline at end of file
+    return current_user
+
+async def get_current_profile(current_user: User = Depends(get_current_active_user)) -> Profile:
+    """Profile of the current user, loaded together with the user (read-only)"""
+    if current_user.profile is None:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    return current_user.profile
+
+async def get_user_read_db(request: Request, claims: TokenClaims = Depends(get_current_claims)):
+    """
+    Session for read-only endpoints showing the current user's data: the
+    replica, except right after this user wrote (read-your-writes)
+    """
+    async with replica_router.session(claims.user_id, pinned=replica_router.pinned(request)) as session:
+        yield session
@@ -1,11 +1,152 @@
+from typing import Optional
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
+# Leaderboard, XP and question pool writes are INSERT ... ON CONFLICT upserts
+# (app/leaderboard.py), which SQLAlchemy provides for these databases only
+SUPPORTED_DATABASES = ("postgresql", "sqlite")
+
 class Settings(BaseSettings):
     database_url: str
     jwt_secret_key: str
     gemini_api_key: str
 
+    gemini_model: str = "gemini-pro"
+
+    # Database engine profile (pool sizing and server settings apply to PostgreSQL)
+    db_echo: bool = False
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout_seconds: float = 10.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 256  # prepared statements cached per connection
+    db_application_name: str = "ceyquest-api"
+    db_statement_timeout_ms: int = 30000
+    db_jit: bool = False
+    db_pgbouncer: bool = False  # PgBouncer transaction pooling: no prepared statement caching
+
+    # Startup: migrations are applied out of band unless auto_migrate is set;
+    # workers check the schema revision, open a few connections and build
+    # in-process indexes in the background
+    auto_migrate: bool = False
+    schema_check_enabled: bool = True
+    startup_warm_connections: int = 2
+    startup_warm_caches: bool = True
+
+    # Read replica for read-only endpoints (unset: all reads use the primary)
+    database_replica_url: Optional[str] = None
+    replica_health_check_seconds: float = 5.0
+    replica_max_lag_seconds: float = 5.0
+    replica_read_your_writes_seconds: float = 10.0
+
+    # Gemini HTTP client (shared, long-lived connection pool)
+    gemini_http2: bool = True
+    gemini_max_connections: int = 100
+    gemini_max_keepalive_connections: int = 20
+    gemini_keepalive_expiry: float = 30.0
+    gemini_connect_timeout: float = 5.0
+    gemini_read_timeout: float = 30.0
+    gemini_write_timeout: float = 10.0
+    gemini_pool_timeout: float = 5.0
+
+    # Gemini gateway: quota, concurrency, retries, circuit breaker and hedging
+    gemini_requests_per_minute: float = 300
+    gemini_burst: int = 20
+    gemini_max_concurrent_requests: int = 50
+    gemini_queue_timeout_seconds: float = 5.0
+    gemini_max_retries: int = 2
+    gemini_backoff_base_seconds: float = 0.25
+    gemini_backoff_max_seconds: float = 4.0
+    gemini_circuit_failure_threshold: int = 5
+    gemini_circuit_reset_seconds: float = 30.0
+    gemini_hedge_after_seconds: float = 0.0  # 0 disables hedged requests
+
+    # CeynovX response cache (exact + semantic)
+    chat_cache_enabled: bool = True
+    chat_cache_ttl_seconds: float = 6 * 60 * 60
+    chat_cache_max_entries: int = 10000
+    chat_cache_max_bytes: int = 64 * 1024 * 1024
+    chat_cache_similarity_threshold: float = 0.9
+    # Candidates compared per semantic lookup (the newest in the subject and grade)
+    chat_cache_max_scope_entries: int = 500
+
+    # CeynovX grounding: resource passages retrieved into the prompt
+    rag_enabled: bool = True
+    rag_top_k: int = 4
+    rag_context_token_budget: int = 1200
+    rag_min_score: float = 0.1
+    rag_chunk_tokens: int = 200
+    rag_chunk_overlap_tokens: int = 40
+    rag_index_refresh_seconds: float = 300.0
+
+    # AI quiz question pool
+    quiz_pool_workers: int = 4
+    quiz_pool_requests_per_minute: float = 30
+    quiz_pool_questions_per_request: int = 10
+    quiz_pool_queue_size: int = 1000
+    quiz_pool_refill_threshold: int = 5
+    quiz_pool_refill_count: int = 20
+    # Refill jobs a single user can trigger per hour
+    quiz_pool_user_refills_per_hour: float = 6
+
+    # Password hashing (bcrypt runs on a bounded thread pool off the event loop)
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+
+    # Authenticated user + profile cache (0 disables)
+    identity_cache_ttl_seconds: float = 15.0
+    identity_cache_max_entries: int = 10000
+
+    # JWT sessions: long-lived refresh tokens and the in-memory revocation list
+    refresh_token_expire_days: int = 14
+    token_revocation_refresh_seconds: float = 30.0
+
+    # Write-behind XP event bus (batched flushes of XP records, profile totals and leaderboard)
+    xp_event_bus_enabled: bool = True
+    xp_event_flush_size: int = 500
+    xp_event_flush_interval_seconds: float = 0.5
+    xp_event_queue_size: int = 10000
+    # Pending XP records older than this are applied by the sweep (crashed workers)
+    xp_event_sweep_interval_seconds: float = 60
+
+    # Serialized quiz question payloads (invalidated on writes in this process; TTL bounds staleness elsewhere)
+    quiz_cache_ttl_seconds: float = 300.0
+    quiz_cache_max_entries: int = 1000
+
+    # HTTP caching of catalog endpoints (ETag/Cache-Control + in-process response cache)
+    http_cache_enabled: bool = True
+    http_cache_ttl_seconds: float = 60.0
+    http_cache_max_entries: int = 2000
+    http_cache_max_body_bytes: int = 1024 * 1024
+    catalog_max_age_seconds: int = 300
+
+    # Resource bodies: stored pre-compressed when at least this large; streamed in chunks
+    resource_compression_min_bytes: int = 1024
+    resource_chunk_bytes: int = 64 * 1024
+
+    # Search: "auto" uses PostgreSQL full-text search on PostgreSQL and the in-memory index otherwise
+    search_backend: str = "auto"
+    search_index_refresh_seconds: float = 300.0
+
+    # In-process per-grade rank index
+    rank_index_refresh_seconds: float = 300.0
+
+    # Quiz streak days start at local midnight in Sri Lanka (UTC+5:30)
+    streak_utc_offset_minutes: int = 330
+
+    @field_validator("database_url")
+    @classmethod
+    def check_database_backend(cls, value: str) -> str:
+        backend = value.split(":", 1)[0].split("+", 1)[0]
+        if backend not in SUPPORTED_DATABASES:
+            raise ValueError(
+                f"unsupported database {backend!r}; CeyQuest runs on {' or '.join(SUPPORTED_DATABASES)} "
+                "(e.g. postgresql+asyncpg://... or sqlite+aiosqlite:///...)"
+            )
+        return value
+
     class Config:
         env_file = ".env"
 
-settings = Settings() 
\ No newline at end of file
+settings = Settings()
@@ -1,14 +1,268 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import asyncio
+import math
+import time
+from typing import Optional
+from uuid import uuid4
+from fastapi import Request, Response
+from sqlalchemy import event, literal, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from .config import settings
+from .config import Settings, settings
+from .ttl_cache import TTLCache
 
-engine = create_async_engine(settings.database_url, echo=True)
+# Users remembered as recent writers, per process
+MAX_RECENT_WRITERS = 100000
+
+# Unix time until which the client's reads stay on the primary; lets every
+# worker honour read-your-writes, not just the one that took the write
+READ_YOUR_WRITES_COOKIE = "ceyquest_primary_until"
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+# (an idle primary would otherwise look like growing lag)
+PG_REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+def engine_options(profile: Settings) -> dict:
+    """create_async_engine arguments for a database engine profile"""
+    options = {
+        "echo": profile.db_echo,
+        "pool_pre_ping": profile.db_pool_pre_ping,
+    }
+    if make_url(profile.database_url).get_backend_name() != "postgresql":
+        # SQLite picks its own pool; the sizing below only applies to PostgreSQL
+        return options
+
+    options.update(
+        pool_size=profile.db_pool_size,
+        max_overflow=profile.db_max_overflow,
+        pool_timeout=profile.db_pool_timeout_seconds,
+        pool_recycle=profile.db_pool_recycle_seconds,
+    )
+    if profile.db_pgbouncer:
+        # Transaction pooling hands each transaction a different server
+        # connection: prepared statements cannot be cached or reused by name,
+        # and PgBouncer only forwards application_name as a startup parameter
+        connect_args = {
+            "prepared_statement_cache_size": 0,
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            "server_settings": {"application_name": profile.db_application_name},
+        }
+    else:
+        connect_args = {
+            "prepared_statement_cache_size": profile.db_statement_cache_size,
+            "server_settings": {
+                "application_name": profile.db_application_name,
+                "statement_timeout": str(profile.db_statement_timeout_ms),
+                # Short OLTP queries never benefit from JIT but pay its compile time
+                "jit": "on" if profile.db_jit else "off",
+            },
+        }
+    options["connect_args"] = connect_args
+    return options
+
+class PoolMetrics:
+    """Connection pool occupancy plus connect/checkout/invalidation counters for an engine"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        event.listen(engine.sync_engine, "connect", self._on_connect)
+        event.listen(engine.sync_engine, "checkout", self._on_checkout)
+        event.listen(engine.sync_engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        self.checkouts += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        pool = self.engine.pool
+        stats = {
+            "pool": type(pool).__name__,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "invalidations": self.invalidations,
+        }
+        if hasattr(pool, "checkedout"):
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return stats
+
+engine = create_async_engine(settings.database_url, **engine_options(settings))
+pool_metrics = PoolMetrics(engine)
 SessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+class ReplicaRouter:
+    """
+    Routes read-only sessions to a read replica.
+
+    Reads go to the primary when no replica is configured, while the replica
+    is unhealthy (failed health check, dropped connection, or lagging more
+    than `max_lag_seconds`), and for a user who wrote within the last
+    `read_your_writes_seconds`, so they see their own changes. Recent
+    writers are tracked per process and, through a short-lived cookie set on
+    the write's response, across workers.
+    """
+
+    def __init__(self, engine: Optional[AsyncEngine], check_interval: float, max_lag_seconds: float, read_your_writes_seconds: float):
+        self.engine = engine
+        self.check_interval = check_interval
+        self.max_lag_seconds = max_lag_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.healthy = engine is not None
+        self.lag_seconds: Optional[float] = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self._recent_writers: TTLCache[bool] = TTLCache(ttl_seconds=read_your_writes_seconds, max_entries=MAX_RECENT_WRITERS)
+        self._task: Optional[asyncio.Task] = None
+        self._sessions = None
+        self.pool_metrics: Optional[PoolMetrics] = None
+        if engine is not None:
+            self._sessions = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+            self.pool_metrics = PoolMetrics(engine)
+            event.listen(engine.sync_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        # Fail over at once on a dropped connection rather than at the next check
+        if context.is_disconnect and self.healthy:
+            print("Read replica connection lost; reading from the primary")
+            self.healthy = False
+
+    def mark_write(self, user_id: int, response: Optional[Response] = None) -> None:
+        """
+        Keep this user's reads on the primary until the replica has caught up.
+        Pass the write's response to pin the client on every worker.
+        """
+        self._recent_writers.set(user_id, True)
+        if response is not None and self.engine is not None and self.read_your_writes_seconds > 0:
+            response.set_cookie(
+                READ_YOUR_WRITES_COOKIE,
+                str(math.ceil(time.time() + self.read_your_writes_seconds)),
+                max_age=math.ceil(self.read_your_writes_seconds),
+                httponly=True,
+                samesite="lax"
+            )
+
+    def pinned(self, request: Request) -> bool:
+        """Whether the request carries an unexpired read-your-writes cookie"""
+        value = request.cookies.get(READ_YOUR_WRITES_COOKIE)
+        if value is None:
+            return False
+        try:
+            return float(value) > time.time()
+        except ValueError:
+            return False
+
+    def session(self, user_id: Optional[int] = None, pinned: bool = False) -> AsyncSession:
+        if (
+            self._sessions is None
+            or not self.healthy
+            or pinned
+            or (user_id is not None and self._recent_writers.get(user_id))
+        ):
+            self.primary_reads += 1
+            return SessionLocal()
+        self.replica_reads += 1
+        return self._sessions()
+
+    async def start(self) -> None:
+        if self.engine is not None and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def check(self) -> None:
+        """Probe the replica and update its health and lag"""
+        query = PG_REPLICA_LAG_QUERY if self.engine.dialect.name == "postgresql" else select(literal(0))
+        try:
+            async with self.engine.connect() as conn:
+                lag = await asyncio.wait_for(conn.scalar(query), self.check_interval)
+        except Exception as e:
+            lag = None
+            if self.healthy:
+                print(f"Read replica health check failed; reading from the primary: {e}")
+
+        self.lag_seconds = float(lag) if lag is not None else None
+        healthy = self.lag_seconds is not None and self.lag_seconds <= self.max_lag_seconds
+        if healthy and not self.healthy:
+            print("Read replica healthy again; routing reads to it")
+        elif self.lag_seconds is not None and not healthy and self.healthy:
+            print(f"Read replica is {self.lag_seconds:.1f}s behind; reading from the primary")
+        self.healthy = healthy
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    def stats(self) -> Optional[dict]:
+        if self.engine is None:
+            return None
+        return {
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "pool": self.pool_metrics.stats(),
+        }
+
+def _create_replica_engine() -> Optional[AsyncEngine]:
+    if not settings.database_replica_url:
+        return None
+    profile = settings.model_copy(update={
+        "database_url": settings.database_replica_url,
+        "db_application_name": f"{settings.db_application_name}-replica",
+    })
+    return create_async_engine(profile.database_url, **engine_options(profile))
+
+replica_router = ReplicaRouter(
+    engine=_create_replica_engine(),
+    check_interval=settings.replica_health_check_seconds,
+    max_lag_seconds=settings.replica_max_lag_seconds,
+    read_your_writes_seconds=settings.replica_read_your_writes_seconds
+)
+
+async def warm_pool(engine: AsyncEngine, connections: int) -> None:
+    """Open pooled connections up front so first requests skip the connect handshake"""
+    async def connect() -> None:
+        async with engine.connect() as conn:
+            await conn.scalar(select(literal(1)))
+
+    await asyncio.gather(*(connect() for _ in range(connections)))
+
 async def get_db():
     async with SessionLocal() as session:
-        yield session 
\ No newline at end of file
+        yield session
+
+async def get_read_db(request: Request):
+    """Session for read-only endpoints: the replica when one is configured and healthy"""
+    async with replica_router.session(pinned=replica_router.pinned(request)) as session:
+        yield session
@@ -0,0 +1,59 @@
+import math
+import re
+import zlib
+from typing import Dict, List
+
+# Sparse vector: feature index -> weight
+SparseVector = Dict[int, float]
+
+# Word characters plus combining marks: \w alone excludes marks such as
+# Sinhala and Tamil vowel signs and virama, and would split those words
+# apart (the Indic blocks, minus the danda full stops). The zero-width
+# (non-)joiners shape Sinhala conjuncts.
+WORD_CHARS = r"\w\u0300-\u036f\u0900-\u0963\u0966-\u0dff\u200c\u200d"
+_TOKEN_RE = re.compile(f"[{WORD_CHARS}]+")
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "can", "do", "does", "for", "how", "i", "in", "is",
+    "it", "me", "of", "on", "please", "the", "to", "what", "why", "with", "you",
+})
+
+def word_tokens(text: str) -> List[str]:
+    """Casefolded words of `text`, with Sinhala and Tamil words kept whole"""
+    return _TOKEN_RE.findall(text.casefold())
+
+class HashingEmbedder:
+    """
+    Local, dependency-free text embedder using the hashing trick.
+
+    Words and word bigrams are hashed into a fixed feature space and the
+    resulting vector is L2-normalised, so the dot product of two embeddings
+    is their cosine similarity. crc32 is used instead of hash() so vectors
+    are stable across processes.
+    """
+
+    def __init__(self, dimensions: int = 2 ** 18):
+        self.dimensions = dimensions
+
+    def tokenize(self, text: str) -> List[str]:
+        return [token for token in word_tokens(text) if token not in _STOPWORDS]
+
+    def embed(self, text: str) -> SparseVector:
+        tokens = self.tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+        vector: SparseVector = {}
+        for feature in features:
+            index = zlib.crc32(feature.encode("utf-8")) % self.dimensions
+            vector[index] = vector.get(index, 0.0) + 1.0
+
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if norm == 0:
+            return {}
+        return {index: weight / norm for index, weight in vector.items()}
+
+def cosine_similarity(a: SparseVector, b: SparseVector) -> float:
+    """Cosine similarity of two normalised sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(index, 0.0) for index, weight in a.items())
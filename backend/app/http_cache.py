@@ -0,0 +1,184 @@
+import hashlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .ttl_cache import TTLCache
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+_CHANGED_TABLES_KEY = "changed_tables"
+
+class TableVersions:
+    """
+    Per-table change counters for this process.
+
+    A counter is bumped after any session commits a change to a mapped row of
+    that table, so cache keys that include the versions of the tables behind a
+    response stop matching as soon as the data changes.
+    """
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+
+    def get(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, table: str) -> None:
+        self._versions[table] = self._versions.get(table, 0) + 1
+
+    def track(self, session_class=Session) -> None:
+        """Bump versions for rows changed through sessions of `session_class`"""
+        event.listen(session_class, "after_flush", self._collect_changes)
+        event.listen(session_class, "after_commit", self._apply_changes)
+        event.listen(session_class, "after_rollback", self._discard_changes)
+
+    @staticmethod
+    def _collect_changes(session: Session, flush_context) -> None:
+        tables = {
+            obj.__table__.name
+            for obj in (*session.new, *session.dirty, *session.deleted)
+            if hasattr(obj, "__table__")
+        }
+        if tables:
+            session.info.setdefault(_CHANGED_TABLES_KEY, set()).update(tables)
+
+    def _apply_changes(self, session: Session) -> None:
+        for table in session.info.pop(_CHANGED_TABLES_KEY, ()):
+            self.bump(table)
+
+    @staticmethod
+    def _discard_changes(session: Session) -> None:
+        session.info.pop(_CHANGED_TABLES_KEY, None)
+
+# Global instance
+table_versions = TableVersions()
+table_versions.track()
+
+class CacheRule(NamedTuple):
+    # Matched against the full request path
+    path: Pattern[str]
+    cache_control: str
+    # Tables the response is built from; a change to any of them invalidates it
+    tables: Tuple[str, ...]
+
+class _CachedResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+
+class HTTPCacheMiddleware:
+    """
+    ASGI middleware adding ETag/Cache-Control to GET routes matched by a rule
+    and caching their 200 responses in process.
+
+    Cache keys combine the path, query string and versions of the rule's
+    tables, so a committed change makes old entries unreachable; the TTL
+    bounds staleness for changes made by other workers. Conditional requests
+    matching the cached ETag get a 304 without running the handler.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rules: Sequence[CacheRule],
+        ttl_seconds: float,
+        max_entries: int,
+        max_body_bytes: int,
+        versions: TableVersions = table_versions
+    ):
+        self.app = app
+        self.rules = rules
+        self.versions = versions
+        self.max_body_bytes = max_body_bytes
+        self.cache: TTLCache[_CachedResponse] = TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+    def _match(self, path: str) -> Optional[CacheRule]:
+        for rule in self.rules:
+            if rule.path.fullmatch(path):
+                return rule
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self._match(scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Versions are read before the handler runs, so a response built while
+        # a change commits is stored under the old (already stale) key
+        key = (scope["path"], scope["query_string"], self.versions.get(rule.tables))
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = await self._run_handler(scope, receive, send, rule)
+            if cached is None:
+                return
+            if len(cached.body) <= self.max_body_bytes:
+                self.cache.set(key, cached)
+
+        if etag_matches(Headers(scope=scope).get("if-none-match"), cached.etag):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", cached.etag.encode("latin-1")), (b"cache-control", rule.cache_control.encode("latin-1"))],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({"type": "http.response.start", "status": cached.status, "headers": cached.headers})
+        await send({"type": "http.response.body", "body": cached.body})
+
+    async def _run_handler(self, scope: Scope, receive: Receive, send: Send, rule: CacheRule) -> Optional[_CachedResponse]:
+        """
+        Run the handler and capture a cacheable response. Anything else is
+        passed through to the client and None is returned.
+        """
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def capture(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start = message
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        if passthrough or start is None:
+            return None
+
+        body = b"".join(chunks)
+        etag = make_etag(body)
+        headers = MutableHeaders(raw=list(start.get("headers", [])))
+        headers["etag"] = etag
+        headers["cache-control"] = rule.cache_control
+        return _CachedResponse(status=start["status"], headers=headers.raw, body=body, etag=etag)
@@ -0,0 +1,205 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, update, delete, func, literal, case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from .config import settings
+from .models import Leaderboard, Profile, QuizAttempt, XPRecord
+
+def upsert(db: AsyncSession):
+    """Dialect-specific INSERT construct that supports ON CONFLICT"""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    # Settings rejects other databases at startup (config.SUPPORTED_DATABASES)
+    raise NotImplementedError(f"INSERT ... ON CONFLICT is not supported on {dialect}")
+
+def quiz_percentage(score: int, total_questions: int) -> float:
+    """
+    Quiz score as a percentage. Average scores are averages of these, so a
+    short quiz and a long one weigh the same.
+    """
+    return 100.0 * score / total_questions if total_questions else 0.0
+
+# quiz_percentage() of each attempt, for set-based recomputation
+QUIZ_PERCENTAGE_SQL = case(
+    (QuizAttempt.total_questions > 0, 100.0 * QuizAttempt.score / QuizAttempt.total_questions),
+    else_=0.0
+)
+
+# (minimum percentage, XP) from the best tier down; below them a quiz earns
+# participation XP
+QUIZ_XP_TIERS = ((90, 100), (80, 75), (70, 50), (60, 25))
+QUIZ_PARTICIPATION_XP = 10
+
+def calculate_quiz_xp(score: int, total_questions: int) -> int:
+    """Calculate XP earned from quiz performance"""
+    if total_questions == 0:
+        return 0
+    for percentage, xp in QUIZ_XP_TIERS:
+        if score * 100 >= total_questions * percentage:
+            return xp
+    return QUIZ_PARTICIPATION_XP
+
+def quiz_xp_sql(score, total_questions):
+    """calculate_quiz_xp() as a SQL expression over attempt columns, from the same tiers"""
+    return case(
+        (total_questions == 0, 0),
+        *((score * 100 >= total_questions * percentage, xp) for percentage, xp in QUIZ_XP_TIERS),
+        else_=QUIZ_PARTICIPATION_XP
+    )
+
+def activity_day(moment: datetime) -> date:
+    """Students' calendar day (UTC offset streak_utc_offset_minutes) of a UTC timestamp"""
+    return (moment + timedelta(minutes=settings.streak_utc_offset_minutes)).date()
+
+async def record_activity_day(db: AsyncSession, user_id: int, day: date) -> None:
+    """
+    Advance the user's streak for activity on `day`, inside the caller's transaction.
+
+    The streak grows when the last active day was the day before, restarts
+    at 1 after a gap and is unchanged for a day already counted (or an
+    older one). A single conditional UPDATE, so concurrent writers cannot
+    lose a day.
+    """
+    last_day = Profile.last_activity_date
+    current = func.coalesce(Profile.current_streak, 0)
+    longest = func.coalesce(Profile.longest_streak, 0)
+    streak = case(
+        (last_day == day - timedelta(days=1), current + 1),
+        (last_day >= day, current),
+        else_=1
+    )
+    await db.execute(
+        update(Profile)
+        .where(Profile.user_id == user_id)
+        .values(
+            current_streak=streak,
+            longest_streak=case((streak > longest, streak), else_=longest),
+            last_activity_date=case((last_day >= day, last_day), else_=day)
+        )
+    )
+
+def create_entry(db: AsyncSession, user_id: int, grade: int) -> None:
+    """Add an empty leaderboard row for a new user (committed by the caller)"""
+    db.add(Leaderboard(
+        user_id=user_id,
+        grade=grade,
+        total_xp=0,
+        current_streak=0,
+        quizzes_completed=0,
+        average_score=0.0,
+        last_updated=datetime.utcnow()
+    ))
+
+async def record_xp_event(
+    db: AsyncSession,
+    user_id: int,
+    grade: int,
+    xp_amount: int,
+    quiz_percentage: Optional[float] = None,
+    current_streak: Optional[int] = None,
+    quiz_count: int = 1
+) -> int:
+    """
+    Apply one XP event to the user's leaderboard row and return the new total XP.
+
+    Runs as a single upsert inside the caller's transaction; the caller commits.
+    Quiz events also bump quizzes_completed and fold the score (a
+    quiz_percentage()) into the running average. Several events can be
+    applied at once by summing their XP and passing quiz_percentage as the
+    total of `quiz_count` quiz percentages.
+    """
+    insert = upsert(db)
+    stmt = insert(Leaderboard).values(
+        user_id=user_id,
+        grade=grade,
+        total_xp=xp_amount,
+        current_streak=current_streak or 0,
+        quizzes_completed=quiz_count if quiz_percentage is not None else 0,
+        average_score=quiz_percentage / quiz_count if quiz_percentage is not None else 0.0,
+        last_updated=datetime.utcnow()
+    )
+
+    values = {
+        "grade": stmt.excluded.grade,
+        "total_xp": Leaderboard.total_xp + stmt.excluded.total_xp,
+        "last_updated": stmt.excluded.last_updated,
+    }
+    if current_streak is not None:
+        values["current_streak"] = stmt.excluded.current_streak
+    if quiz_percentage is not None:
+        values["quizzes_completed"] = Leaderboard.quizzes_completed + quiz_count
+        values["average_score"] = (
+            (Leaderboard.average_score * Leaderboard.quizzes_completed + quiz_percentage)
+            / (Leaderboard.quizzes_completed + quiz_count)
+        )
+
+    result = await db.execute(
+        stmt.on_conflict_do_update(index_elements=[Leaderboard.user_id], set_=values)
+        .returning(Leaderboard.total_xp)
+    )
+    return result.scalar_one()
+
+async def update_grade(db: AsyncSession, user_id: int, grade: int) -> Optional[int]:
+    """
+    Move a user's leaderboard row to a new grade (committed by the caller).
+
+    Returns the row's total XP, or None if the user has no leaderboard row.
+    """
+    result = await db.execute(
+        update(Leaderboard)
+        .where(Leaderboard.user_id == user_id)
+        .values(grade=grade, last_updated=datetime.utcnow())
+        .returning(Leaderboard.total_xp)
+    )
+    return result.scalar_one_or_none()
+
+async def rebuild_leaderboard(conn: AsyncConnection) -> int:
+    """
+    Recompute every leaderboard row from profiles, xp_records and quiz_attempts.
+
+    One set-based INSERT ... SELECT over pre-aggregated XP and attempt totals,
+    run inside the caller's transaction. Returns the number of rows written.
+    """
+    xp_totals = (
+        select(XPRecord.user_id, func.sum(XPRecord.xp_amount).label("total_xp"))
+        # Pending records are added by the XP event bus sweep
+        .where(XPRecord.totals_applied == True)
+        .group_by(XPRecord.user_id)
+        .subquery()
+    )
+    attempt_totals = (
+        select(
+            QuizAttempt.user_id,
+            func.count(QuizAttempt.id).label("quizzes_completed"),
+            func.avg(QUIZ_PERCENTAGE_SQL).label("average_score")
+        )
+        .group_by(QuizAttempt.user_id)
+        .subquery()
+    )
+
+    rows = (
+        select(
+            Profile.user_id,
+            Profile.grade,
+            func.coalesce(xp_totals.c.total_xp, 0),
+            func.coalesce(Profile.current_streak, 0),
+            func.coalesce(attempt_totals.c.quizzes_completed, 0),
+            func.coalesce(attempt_totals.c.average_score, 0.0),
+            literal(datetime.utcnow())
+        )
+        .outerjoin(xp_totals, xp_totals.c.user_id == Profile.user_id)
+        .outerjoin(attempt_totals, attempt_totals.c.user_id == Profile.user_id)
+    )
+
+    await conn.execute(delete(Leaderboard))
+    result = await conn.execute(
+        Leaderboard.__table__.insert().from_select(
+            ["user_id", "grade", "total_xp", "current_streak", "quizzes_completed", "average_score", "last_updated"],
+            rows
+        )
+    )
+    return result.rowcount
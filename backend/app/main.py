@@ -1,20 +1,64 @@
-from fastapi import FastAPI
+import asyncio
+import re
+from typing import Optional
+from fastapi import FastAPI, status
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import auth, subjects, ai_chat, quizzes, dashboard
-from .database import engine
-from .models import Base
+from sqlalchemy import text
+from .routers import auth, subjects, ai_chat, quizzes, dashboard, search
+from .database import engine, pool_metrics, replica_router, warm_pool
+from .schema import check_schema, upgrade_schema
+from .search import search_engine
+from .rag import passage_retriever
+from .ai_service import get_ai_service
+from .quiz_generation import question_pool
+from .pagination import NEXT_CURSOR_HEADER
+from .auth import token_revocations
+from .xp_events import xp_events
+from .http_cache import HTTPCacheMiddleware, CacheRule
+from .config import settings
 
-# Create database tables
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+# Background build of in-process indexes, so a worker serves as soon as the database is reachable
+cache_warm_task: Optional[asyncio.Task] = None
+
+async def warm_caches():
+    try:
+        async with replica_router.session() as db:
+            await search_engine.warm(db)
+            await passage_retriever.warm(db)
+    except Exception as e:
+        # Indexes are built on first use anyway
+        print(f"Cache warm-up failed: {e}")
 
 app = FastAPI(
     title="CeyQuest API",
     description="AI-powered educational platform for Sri Lankan students",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson encodes several times faster than the standard library json module
+    default_response_class=ORJSONResponse
 )
 
+# Curriculum catalog routes are public and change rarely: let browsers and
+# CDNs cache them and revalidate with ETags. Added before CORS so the CORS
+# headers are applied per request, outside the cache.
+CATALOG_CACHE_CONTROL = f"public, max-age={settings.catalog_max_age_seconds}"
+CATALOG_CACHE_RULES = [
+    CacheRule(re.compile(r"/subjects/"), CATALOG_CACHE_CONTROL, ("subjects",)),
+    CacheRule(re.compile(r"/subjects/resources/\d+"), CATALOG_CACHE_CONTROL, ("resources",)),
+    CacheRule(re.compile(r"/subjects/\d+"), CATALOG_CACHE_CONTROL, ("subjects",)),
+    CacheRule(re.compile(r"/subjects/\d+/resources"), CATALOG_CACHE_CONTROL, ("subjects", "resources")),
+    CacheRule(re.compile(r"/quizzes/"), CATALOG_CACHE_CONTROL, ("quizzes",)),
+]
+
+if settings.http_cache_enabled:
+    app.add_middleware(
+        HTTPCacheMiddleware,
+        rules=CATALOG_CACHE_RULES,
+        ttl_seconds=settings.http_cache_ttl_seconds,
+        max_entries=settings.http_cache_max_entries,
+        max_body_bytes=settings.http_cache_max_body_bytes
+    )
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +66,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Include routers
@@ -30,11 +75,52 @@ app.include_router(subjects.router)
 app.include_router(ai_chat.router)
 app.include_router(quizzes.router)
 app.include_router(dashboard.router)
+app.include_router(search.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the CeyQuest Backend API!"}
 
+# A health check fails rather than waiting longer than this for a connection
+HEALTH_CHECK_TIMEOUT_SECONDS = 5.0
+
+@app.get("/health/db")
+async def database_health():
+    """Whether the primary database answers; pool and replica details stay in the server log"""
+    try:
+        async with engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), HEALTH_CHECK_TIMEOUT_SECONDS)
+    except Exception as e:
+        print(f"Database health check failed: {e}; pool {pool_metrics.stats()}, replica {replica_router.stats()}")
+        return ORJSONResponse({"status": "down"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "up"}
+
 @app.on_event("startup")
 async def startup_event():
-    await create_tables() 
\ No newline at end of file
+    global cache_warm_task
+    # The schema is managed by Alembic migrations; workers only verify it
+    if settings.auto_migrate:
+        await upgrade_schema()
+    if settings.schema_check_enabled:
+        await check_schema(engine)
+    await warm_pool(engine, settings.startup_warm_connections)
+    await replica_router.start()
+    await token_revocations.start()
+    await xp_events.start()
+    await get_ai_service().start()
+    await question_pool.start()
+    if settings.startup_warm_caches:
+        cache_warm_task = asyncio.create_task(warm_caches())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if cache_warm_task is not None:
+        cache_warm_task.cancel()
+    await search_engine.stop()
+    await passage_retriever.stop()
+    await xp_events.stop()
+    await question_pool.stop()
+    await get_ai_service().close()
+    await token_revocations.stop()
+    await replica_router.stop()
+ 
\ No newline at end of file
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Float
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Boolean, Text, Float, Index, LargeBinary, true
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 
 Base = declarative_base()
@@ -13,6 +13,9 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped to revoke every token issued so far (logout, deactivation)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
+    tokens_revoked_at = Column(DateTime, index=True)
     
     # Relationships
     profile = relationship("Profile", back_populates="user", uselist=False)
@@ -31,6 +34,8 @@ class Profile(Base):
     total_xp = Column(Integer, default=0)
     current_streak = Column(Integer, default=0)
     longest_streak = Column(Integer, default=0)
+    # Last day (streak_utc_offset_minutes) with a completed quiz; drives current_streak
+    last_activity_date = Column(Date)
     last_login = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -52,12 +57,19 @@ class Resource(Base):
     id = Column(Integer, primary_key=True, index=True)
     subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
     title = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
+    # Bodies can be large: deferred, so only loaded when asked for (undefer)
+    content = deferred(Column(Text, nullable=False))
     resource_type = Column(String)  # "textbook", "note", "summary"
     chapter = Column(String)
     page_number = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Derived from content on write (see app/resource_content.py)
+    content_size = Column(Integer)  # UTF-8 bytes
+    content_hash = Column(String)
+    content_gzip = deferred(Column(LargeBinary))
+    content_br = deferred(Column(LargeBinary))
+    
     # Relationships
     subject = relationship("Subject")
 
@@ -79,9 +91,12 @@ class Quiz(Base):
 
 class QuizQuestion(Base):
     __tablename__ = "quiz_questions"
+    __table_args__ = (
+        Index("ix_quiz_questions_pool", "subject", "topic", "grade", "difficulty", "times_served"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=True)  # None for AI question-pool entries
     question_text = Column(Text, nullable=False)
     option_a = Column(String, nullable=False)
     option_b = Column(String, nullable=False)
@@ -90,6 +105,14 @@ class QuizQuestion(Base):
     correct_answer = Column(String, nullable=False)  # "A", "B", "C", "D"
     explanation = Column(Text)
     
+    # AI question pool (normalised lookup keys, see app/quiz_generation.py)
+    subject = Column(String)
+    topic = Column(String)
+    grade = Column(Integer)
+    difficulty = Column(String)
+    content_hash = Column(String, unique=True)  # dedup key for generated questions
+    times_served = Column(Integer, default=0)
+    
     # Relationships
     quiz = relationship("Quiz", back_populates="questions")
 
@@ -118,6 +141,11 @@ class XPRecord(Base):
     source = Column(String, nullable=False)  # "quiz", "streak", "achievement"
     description = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set by the XP event bus so a replayed event is recorded only once
+    idempotency_key = Column(String, unique=True, index=True)
+    # False while the XP is not yet added to the profile and leaderboard
+    # totals (quiz XP is recorded with its attempt, the totals written behind)
+    totals_applied = Column(Boolean, nullable=False, default=True, server_default=true())
     
     # Relationships
     user = relationship("User", back_populates="xp_records")
@@ -126,7 +154,7 @@ class Leaderboard(Base):
     __tablename__ = "leaderboards"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
     grade = Column(Integer, nullable=False)
     total_xp = Column(Integer, default=0)
     current_streak = Column(Integer, default=0)
@@ -135,4 +163,20 @@ class Leaderboard(Base):
     last_updated = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    user = relationship("User") 
\ No newline at end of file
+    user = relationship("User") 
+
+# Composite indexes for the router query patterns (see migrations/versions)
+Index("ix_profiles_user_id", Profile.user_id)
+Index("ix_subjects_grade_is_active", Subject.grade, Subject.is_active)
+Index("ix_resources_subject_id_resource_type", Resource.subject_id, Resource.resource_type)
+Index("ix_quizzes_subject_id_is_active", Quiz.subject_id, Quiz.is_active)
+Index("ix_quiz_questions_quiz_id", QuizQuestion.quiz_id)
+Index("ix_quiz_attempts_user_id_completed_at", QuizAttempt.user_id, QuizAttempt.completed_at.desc())
+Index("ix_xp_records_user_id_created_at", XPRecord.user_id, XPRecord.created_at.desc())
+Index("ix_leaderboards_grade_total_xp", Leaderboard.grade, Leaderboard.total_xp.desc())
+# Pending XP records, swept up by the XP event bus (app/xp_events.py)
+Index(
+    "ix_xp_records_pending_created_at", XPRecord.created_at,
+    postgresql_where=XPRecord.totals_applied == False,
+    sqlite_where=XPRecord.totals_applied == False
+)
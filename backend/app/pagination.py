@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import DateTime, Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# Response header carrying the opaque cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class PageParams:
+    """Query parameters shared by every cursor-paginated endpoint"""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's X-Next-Cursor header"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, columns: Sequence) -> Tuple[Any, ...]:
+    """Decode a cursor back into typed key values for the given columns"""
+    invalid = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeDecodeError):
+        raise invalid
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise invalid
+
+    try:
+        return tuple(
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) and value is not None else value
+            for column, value in zip(columns, values)
+        )
+    except (TypeError, ValueError):
+        raise invalid
+
+def keyset_filter(query: Select, columns: Sequence, cursor: Optional[str], descending: bool) -> Select:
+    """Restrict a query to rows strictly after the cursor position in (columns) order"""
+    if not cursor:
+        return query
+    key = tuple_(*columns)
+    values = tuple_(*decode_cursor(cursor, columns))
+    return query.where(key < values if descending else key > values)
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    columns: Sequence,
+    page: PageParams,
+    response: Response,
+    descending: bool = False
+) -> List[Any]:
+    """
+    Run a keyset-paginated query and return one page of ORM rows.
+
+    `columns` is the unique sort key, e.g. (created_at, id). The next page
+    cursor is set on the response's X-Next-Cursor header when more rows exist.
+    """
+    query = keyset_filter(query, columns, page.cursor, descending)
+    query = query.order_by(*(column.desc() if descending else column.asc() for column in columns))
+
+    result = await db.execute(query.limit(page.limit + 1))
+    rows = result.scalars().all()
+
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return rows
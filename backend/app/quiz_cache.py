@@ -0,0 +1,143 @@
+import asyncio
+from typing import Dict, List, NamedTuple, Optional, Set
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from .config import settings
+from .http_cache import make_etag
+from .models import Quiz, QuizQuestion
+from .schemas import QuizQuestionPublic
+from .ttl_cache import TTLCache
+
+_questions_adapter = TypeAdapter(List[QuizQuestionPublic])
+
+class QuizPayload(NamedTuple):
+    body: bytes
+    etag: str
+
+class _Flight:
+    """Lock shared by the requests loading one quiz, and how many hold or await it"""
+    __slots__ = ("lock", "requests")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.requests = 0
+
+class QuizPayloadCache:
+    """
+    Per-quiz question lists, serialized to JSON once and served as bytes.
+
+    Entries are dropped when this process commits a change to the quiz or
+    its questions; the TTL bounds how long other workers can serve stale
+    content. Concurrent misses for the same quiz share one database query.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self._cache: TTLCache[QuizPayload] = TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._flights: Dict[int, _Flight] = {}
+
+    async def get(self, db: AsyncSession, quiz_id: int) -> Optional[QuizPayload]:
+        """Payload for a quiz, or None if the quiz does not exist"""
+        payload = self._cache.get(quiz_id)
+        if payload is not None:
+            return payload
+
+        flight = self._flights.get(quiz_id)
+        if flight is None:
+            flight = self._flights[quiz_id] = _Flight()
+        # Counted until this request is done with the lock: a released lock can
+        # still have queued waiters, and a fresh lock for a new request would
+        # let it load alongside them
+        flight.requests += 1
+        try:
+            async with flight.lock:
+                # Another request may have loaded the quiz while we waited
+                payload = self._cache.get(quiz_id)
+                if payload is None:
+                    payload = await self._load(db, quiz_id)
+                    if payload is not None:
+                        self._cache.set(quiz_id, payload)
+                return payload
+        finally:
+            flight.requests -= 1
+            if flight.requests == 0:
+                del self._flights[quiz_id]
+
+    async def _load(self, db: AsyncSession, quiz_id: int) -> Optional[QuizPayload]:
+        # Quiz existence and its questions in one query
+        result = await db.execute(
+            select(
+                Quiz.id.label("quiz_id"),
+                QuizQuestion.id,
+                QuizQuestion.question_text,
+                QuizQuestion.option_a,
+                QuizQuestion.option_b,
+                QuizQuestion.option_c,
+                QuizQuestion.option_d
+            )
+            .outerjoin(QuizQuestion, QuizQuestion.quiz_id == Quiz.id)
+            .where(Quiz.id == quiz_id)
+            .order_by(QuizQuestion.id)
+        )
+        rows = result.all()
+        if not rows:
+            return None
+
+        # Explanations are left out so they don't give the answers away
+        body = _questions_adapter.dump_json([
+            QuizQuestionPublic(
+                id=row.id,
+                quiz_id=row.quiz_id,
+                question_text=row.question_text,
+                option_a=row.option_a,
+                option_b=row.option_b,
+                option_c=row.option_c,
+                option_d=row.option_d,
+                explanation=None
+            )
+            for row in rows if row.id is not None
+        ])
+        return QuizPayload(body=body, etag=make_etag(body))
+
+    def invalidate(self, quiz_id: int) -> None:
+        self._cache.invalidate(quiz_id)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+# Global instance
+quiz_payloads = QuizPayloadCache(
+    ttl_seconds=settings.quiz_cache_ttl_seconds,
+    max_entries=settings.quiz_cache_max_entries
+)
+
+_CHANGED_QUIZZES_KEY = "changed_quiz_ids"
+
+def _changed_quiz_ids(session: Session) -> Set[int]:
+    quiz_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Quiz) and obj.id is not None:
+            quiz_ids.add(obj.id)
+        elif isinstance(obj, QuizQuestion):
+            # Include the previous quiz when a question is moved between quizzes
+            history = inspect(obj).attrs.quiz_id.history
+            quiz_ids.update(value for value in (obj.quiz_id, *history.deleted) if value is not None)
+    return quiz_ids
+
+@event.listens_for(Session, "after_flush")
+def _collect_quiz_changes(session: Session, flush_context) -> None:
+    # Objects are inspected here (their history is reset after the flush), but
+    # the cache is only cleared once the change is committed and visible
+    quiz_ids = _changed_quiz_ids(session)
+    if quiz_ids:
+        session.info.setdefault(_CHANGED_QUIZZES_KEY, set()).update(quiz_ids)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_quizzes(session: Session) -> None:
+    for quiz_id in session.info.pop(_CHANGED_QUIZZES_KEY, ()):
+        quiz_payloads.invalidate(quiz_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_quiz_changes(session: Session) -> None:
+    session.info.pop(_CHANGED_QUIZZES_KEY, None)
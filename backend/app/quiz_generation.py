@@ -0,0 +1,278 @@
+import asyncio
+import hashlib
+import logging
+import re
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from .ai_gateway import AIGatewayError
+from .ai_service import get_ai_service
+from .config import settings
+from .database import SessionLocal
+from .leaderboard import upsert
+from .models import QuizQuestion
+from .rate_limit import KeyedRateLimiter, TokenBucket
+from .schemas import QuizGenerationJob
+
+logger = logging.getLogger(__name__)
+
+OPTION_KEYS = ("A", "B", "C", "D")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_key(value: str) -> str:
+    """Normalise subject/topic/difficulty strings used as pool lookup keys"""
+    return _WHITESPACE_RE.sub(" ", value).strip().lower()
+
+def question_hash(subject: str, grade: int, question_text: str) -> str:
+    normalized = normalize_key(re.sub(r"[^\w\s]", "", question_text))
+    return hashlib.sha256(f"{normalize_key(subject)}|{grade}|{normalized}".encode("utf-8")).hexdigest()
+
+def validate_question(raw: dict) -> Optional[dict]:
+    """
+    Validate a generated question, returning a cleaned copy or None if it is unusable
+    """
+    if not isinstance(raw, dict):
+        return None
+
+    question = raw.get("question")
+    options = raw.get("options")
+    correct_answer = raw.get("correct_answer")
+    if not isinstance(question, str) or not question.strip() or not isinstance(options, dict):
+        return None
+
+    cleaned_options = {}
+    for key in OPTION_KEYS:
+        value = options.get(key)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        cleaned_options[key] = value.strip()
+
+    # Duplicate options make the question ambiguous
+    if len({value.lower() for value in cleaned_options.values()}) != len(OPTION_KEYS):
+        return None
+
+    if not isinstance(correct_answer, str) or correct_answer.strip().upper() not in OPTION_KEYS:
+        return None
+
+    explanation = raw.get("explanation")
+    return {
+        "question": question.strip(),
+        "options": cleaned_options,
+        "correct_answer": correct_answer.strip().upper(),
+        "explanation": explanation.strip() if isinstance(explanation, str) else None,
+    }
+
+def question_to_dict(question: QuizQuestion) -> dict:
+    """Shape a pool row like the response of GeminiAIService.generate_quiz_question"""
+    return {
+        "question": question.question_text,
+        "options": {
+            "A": question.option_a,
+            "B": question.option_b,
+            "C": question.option_c,
+            "D": question.option_d,
+        },
+        "correct_answer": question.correct_answer,
+        "explanation": question.explanation,
+    }
+
+async def take_pool_question(
+    db: AsyncSession,
+    subject: str,
+    topic: str,
+    grade: int,
+    difficulty: str
+) -> Optional[dict]:
+    """
+    Serve the least-served pooled question for the given key, or None if the pool is empty
+    """
+    result = await db.execute(
+        select(QuizQuestion)
+        .where(
+            QuizQuestion.subject == normalize_key(subject),
+            QuizQuestion.topic == normalize_key(topic),
+            QuizQuestion.grade == grade,
+            QuizQuestion.difficulty == normalize_key(difficulty)
+        )
+        .order_by(QuizQuestion.times_served, QuizQuestion.id)
+        .limit(1)
+    )
+    question = result.scalar_one_or_none()
+    if question is None:
+        return None
+
+    await db.execute(
+        update(QuizQuestion)
+        .where(QuizQuestion.id == question.id)
+        .values(times_served=QuizQuestion.times_served + 1)
+    )
+    await db.commit()
+    return question_to_dict(question)
+
+async def count_fresh_questions(db: AsyncSession, subject: str, topic: str, grade: int, difficulty: str) -> int:
+    """Number of pooled questions for the key that have never been served"""
+    result = await db.execute(
+        select(func.count(QuizQuestion.id)).where(
+            QuizQuestion.subject == normalize_key(subject),
+            QuizQuestion.topic == normalize_key(topic),
+            QuizQuestion.grade == grade,
+            QuizQuestion.difficulty == normalize_key(difficulty),
+            QuizQuestion.times_served == 0
+        )
+    )
+    return result.scalar() or 0
+
+async def is_known_topic(db: AsyncSession, subject: str, topic: str, grade: int) -> bool:
+    """
+    Whether the pool has ever held questions for this subject and topic.
+    Pools are seeded by operators (`python -m app.cli generate-questions`);
+    requests only top up topics that were seeded.
+    """
+    result = await db.execute(
+        select(QuizQuestion.id).where(
+            QuizQuestion.subject == normalize_key(subject),
+            QuizQuestion.topic == normalize_key(topic),
+            QuizQuestion.grade == grade
+        ).limit(1)
+    )
+    return result.first() is not None
+
+class QuestionPoolPipeline:
+    """
+    Background pipeline that fills the AI question pool.
+
+    Jobs are queued and processed by a fixed number of workers. Each job is
+    split into Gemini requests of several questions each, all sharing one
+    token-bucket rate limiter. Generated questions are validated,
+    deduplicated by content hash and stored as QuizQuestion rows.
+    """
+
+    def __init__(self, workers: int, requests_per_minute: float, questions_per_request: int, queue_size: int):
+        self.workers = workers
+        self.questions_per_request = questions_per_request
+        self.rate_limiter = TokenBucket(rate=requests_per_minute / 60.0, capacity=max(1.0, float(workers)))
+        self.queue_size = queue_size
+        self._queue: Optional["asyncio.Queue[QuizGenerationJob]"] = None
+        self._pending: Set[Tuple[str, str, int, str]] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def _job_key(job: QuizGenerationJob) -> Tuple[str, str, int, str]:
+        return (normalize_key(job.subject), normalize_key(job.topic), job.grade, normalize_key(job.difficulty))
+
+    async def start(self) -> None:
+        if not self._tasks:
+            # Created here so the queue belongs to the running event loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._pending.clear()
+
+    def submit(self, job: QuizGenerationJob) -> bool:
+        """
+        Queue a generation job; returns False if the pipeline is not running,
+        an identical job is pending or the queue is full
+        """
+        key = self._job_key(job)
+        if self._queue is None or key in self._pending:
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        self._pending.add(key)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self.run_job(job)
+            except AIGatewayError as e:
+                logger.warning("Quiz generation job for %s/%s failed: %s", job.subject, job.topic, e)
+            except Exception:
+                logger.exception("Error running quiz generation job")
+            finally:
+                self._pending.discard(self._job_key(job))
+                self._queue.task_done()
+
+    async def run_job(self, job: QuizGenerationJob) -> int:
+        """Generate and store questions for a job, returning how many new questions were stored"""
+        batch_sizes = [self.questions_per_request] * (job.count // self.questions_per_request)
+        if job.count % self.questions_per_request:
+            batch_sizes.append(job.count % self.questions_per_request)
+
+        batches = await asyncio.gather(*(self._generate_batch(job, size) for size in batch_sizes))
+        questions = [question for batch in batches for question in batch]
+        return await self._store(job, questions)
+
+    async def _generate_batch(self, job: QuizGenerationJob, count: int) -> List[dict]:
+        await self.rate_limiter.acquire()
+        raw_questions = await get_ai_service().generate_quiz_questions(
+            subject=job.subject,
+            topic=job.topic,
+            grade=job.grade,
+            difficulty=job.difficulty,
+            count=count
+        )
+        return [question for question in map(validate_question, raw_questions) if question]
+
+    async def _store(self, job: QuizGenerationJob, questions: List[dict]) -> int:
+        # Deduplicate within the batch; the unique content_hash skips questions
+        # already stored, including ones another worker stores concurrently
+        unique = {}
+        for question in questions:
+            unique.setdefault(question_hash(job.subject, job.grade, question["question"]), question)
+        if not unique:
+            return 0
+
+        async with SessionLocal() as db:
+            insert = upsert(db)
+            result = await db.execute(
+                insert(QuizQuestion)
+                .values([
+                    {
+                        "question_text": question["question"],
+                        "option_a": question["options"]["A"],
+                        "option_b": question["options"]["B"],
+                        "option_c": question["options"]["C"],
+                        "option_d": question["options"]["D"],
+                        "correct_answer": question["correct_answer"],
+                        "explanation": question["explanation"],
+                        "subject": normalize_key(job.subject),
+                        "topic": normalize_key(job.topic),
+                        "grade": job.grade,
+                        "difficulty": normalize_key(job.difficulty),
+                        "content_hash": content_hash,
+                        "times_served": 0,
+                    }
+                    for content_hash, question in unique.items()
+                ])
+                .on_conflict_do_nothing(index_elements=[QuizQuestion.content_hash])
+                .returning(QuizQuestion.id)
+            )
+            stored = len(result.scalars().all())
+            await db.commit()
+
+        return stored
+
+# Global instance
+question_pool = QuestionPoolPipeline(
+    workers=settings.quiz_pool_workers,
+    requests_per_minute=settings.quiz_pool_requests_per_minute,
+    questions_per_request=settings.quiz_pool_questions_per_request,
+    queue_size=settings.quiz_pool_queue_size
+)
+
+# Per-user budget for refills triggered by generate-quiz-question
+refill_limiter = KeyedRateLimiter(
+    rate=settings.quiz_pool_user_refills_per_hour / 3600.0,
+    capacity=max(1.0, settings.quiz_pool_user_refills_per_hour)
+)
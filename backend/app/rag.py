@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Protocol, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .embeddings import HashingEmbedder, SparseVector
+from .models import Resource, Subject
+from .refreshing_index import RefreshingIndex
+
+# Tables passages are built from; a change to either makes the index stale
+RAG_TABLES = ("resources", "subjects")
+
+class Embedder(Protocol):
+    def embed(self, text: str) -> SparseVector:
+        ...
+
+class Passage(NamedTuple):
+    resource_id: int
+    title: str
+    chapter: Optional[str]
+    text: str
+    tokens: int
+
+    @property
+    def source(self) -> str:
+        return f"{self.title} ({self.chapter})" if self.chapter else self.title
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about 3 words to 4 tokens)"""
+    return (len(text.split()) * 4 + 2) // 3
+
+def chunk_text(text: str, chunk_tokens: int, overlap_tokens: int) -> List[str]:
+    """Split text into overlapping windows of about `chunk_tokens` tokens"""
+    words = text.split()
+    chunk_words = max(1, chunk_tokens * 3 // 4)
+    step = max(1, chunk_words - overlap_tokens * 3 // 4)
+
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+class PassageIndex:
+    """
+    Embedded resource passages, partitioned by subject.
+
+    Embeddings are sparse, so retrieval is an exact dot product computed
+    through per-subject posting lists: only passages sharing a feature with
+    the question are scored.
+    """
+
+    def __init__(self):
+        self.passages: List[Passage] = []
+        self._postings: Dict[int, Dict[int, List[Tuple[int, float]]]] = defaultdict(lambda: defaultdict(list))
+        self._subjects_by_grade: Dict[int, List[int]] = defaultdict(list)
+
+    def add(self, subject_id: int, grade: int, passage: Passage, embedding: SparseVector) -> None:
+        if subject_id not in self._postings:
+            self._subjects_by_grade[grade].append(subject_id)
+        position = len(self.passages)
+        self.passages.append(passage)
+        postings = self._postings[subject_id]
+        for feature, weight in embedding.items():
+            postings[feature].append((position, weight))
+
+    def search(
+        self,
+        embedding: SparseVector,
+        subject_id: Optional[int],
+        grade: Optional[int],
+        top_k: int,
+        min_score: float
+    ) -> List[Tuple[float, Passage]]:
+        if subject_id is not None:
+            subject_ids = [subject_id]
+        elif grade is not None:
+            subject_ids = self._subjects_by_grade.get(grade, [])
+        else:
+            subject_ids = list(self._postings)
+
+        scores: Dict[int, float] = defaultdict(float)
+        for sid in subject_ids:
+            postings = self._postings.get(sid)
+            if postings is None:
+                continue
+            for feature, weight in embedding.items():
+                for position, passage_weight in postings.get(feature, ()):
+                    scores[position] += weight * passage_weight
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, self.passages[position]) for position, score in best if score >= min_score]
+
+class PassageRetriever:
+    """
+    Retrieves curriculum passages to ground CeynovX answers.
+
+    Resource bodies are chunked and embedded into an in-process index, built
+    on first use off the event loop, then rebuilt in the background after
+    this process commits a change to resources or subjects and every
+    `refresh_seconds` (changes from other workers); chats keep retrieving
+    from the previous index meanwhile. The embedder is pluggable; the
+    default is the local hashing embedder also used by the response cache.
+    """
+
+    def __init__(
+        self,
+        top_k: int,
+        token_budget: int,
+        min_score: float,
+        chunk_tokens: int,
+        overlap_tokens: int,
+        refresh_seconds: float,
+        embedder: Optional[Embedder] = None,
+        enabled: bool = True
+    ):
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.min_score = min_score
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.refresh_seconds = refresh_seconds
+        self.embedder = embedder or HashingEmbedder()
+        self.enabled = enabled
+        self._index = RefreshingIndex("passage", RAG_TABLES, refresh_seconds, self._build)
+
+        self.retrievals = 0
+        self.retrieval_seconds = 0.0
+        self.max_retrieval_seconds = 0.0
+
+    async def _build(self, db: AsyncSession) -> PassageIndex:
+        resources = (await db.execute(
+            select(Resource.id, Resource.subject_id, Subject.grade, Resource.title, Resource.chapter, Resource.content)
+            .join(Subject, Subject.id == Resource.subject_id)
+            .where(Subject.is_active == True)
+            .order_by(Resource.id)
+        )).all()
+
+        def build() -> PassageIndex:
+            index = PassageIndex()
+            for row in resources:
+                heading = f"{row.title} {row.chapter or ''}"
+                for text in chunk_text(row.content or "", self.chunk_tokens, self.overlap_tokens):
+                    passage = Passage(row.id, row.title, row.chapter, text, estimate_tokens(text))
+                    # The heading is embedded with every chunk so passages match on topic names
+                    index.add(row.subject_id, row.grade, passage, self.embedder.embed(f"{heading} {text}"))
+            return index
+
+        # Chunking and embedding textbook bodies is CPU-bound; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, build)
+
+    async def warm(self, db: AsyncSession) -> None:
+        """Build the passage index ahead of the first chat, or wait for a stale one to be rebuilt"""
+        if self.enabled:
+            await self._index.ensure_fresh(db)
+
+    async def stop(self) -> None:
+        await self._index.stop()
+
+    async def retrieve(
+        self,
+        db: AsyncSession,
+        question: str,
+        subject_id: Optional[int] = None,
+        grade: Optional[int] = None
+    ) -> List[Passage]:
+        """
+        Best-matching passages for a question within a subject (or, without
+        one, a grade), highest score first and within `token_budget` tokens
+        """
+        if not self.enabled:
+            return []
+        index = await self._index.get(db)
+
+        started = time.perf_counter()
+        embedding = self.embedder.embed(question)
+        matches = index.search(embedding, subject_id, grade, self.top_k, self.min_score) if embedding else []
+
+        passages = []
+        budget = self.token_budget
+        for _, passage in matches:
+            if passage.tokens <= budget:
+                passages.append(passage)
+                budget -= passage.tokens
+
+        elapsed = time.perf_counter() - started
+        self.retrievals += 1
+        self.retrieval_seconds += elapsed
+        self.max_retrieval_seconds = max(self.max_retrieval_seconds, elapsed)
+        return passages
+
+    def stats(self) -> dict:
+        return {
+            "passages": len(self._index.index.passages) if self._index.index is not None else 0,
+            "retrievals": self.retrievals,
+            "avg_retrieval_ms": 1000 * self.retrieval_seconds / self.retrievals if self.retrievals else 0.0,
+            "max_retrieval_ms": 1000 * self.max_retrieval_seconds,
+        }
+
+def passage_sources(passages: List[Passage]) -> Optional[List[str]]:
+    """Distinct source labels for a chat response, in retrieval order"""
+    sources = list(dict.fromkeys(passage.source for passage in passages))
+    return sources or None
+
+# Global instance
+passage_retriever = PassageRetriever(
+    top_k=settings.rag_top_k,
+    token_budget=settings.rag_context_token_budget,
+    min_score=settings.rag_min_score,
+    chunk_tokens=settings.rag_chunk_tokens,
+    overlap_tokens=settings.rag_chunk_overlap_tokens,
+    refresh_seconds=settings.rag_index_refresh_seconds,
+    enabled=settings.rag_enabled
+)
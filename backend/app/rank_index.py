@@ -0,0 +1,299 @@
+import asyncio
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .models import Leaderboard
+from .refreshing_index import RefreshingIndex
+
+_MAX_LEVEL = 32
+_P = 0.25
+
+class _Node:
+    __slots__ = ("key", "forward", "span")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.forward: List[Optional["_Node"]] = [None] * level
+        self.span = [0] * level
+
+class SortedSet:
+    """
+    In-memory sorted set with the Redis ZSET interface we need.
+
+    Backed by an indexable skip list (the structure Redis uses), so add,
+    remove, rank and range-by-rank are all O(log n) expected. Members are
+    ordered by score descending, then member ascending.
+    """
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._scores: Dict[int, int] = {}
+
+    @classmethod
+    def from_sorted(cls, items: Iterable[Tuple[int, int]]) -> "SortedSet":
+        """
+        Bulk-load (member, score) pairs already ordered by score desc, member asc.
+
+        Appends at the tail of every level in O(n) instead of n searches.
+        """
+        zset = cls()
+        tails = [zset._head] * _MAX_LEVEL
+        tail_positions = [0] * _MAX_LEVEL
+        position = 0
+        for member, score in items:
+            position += 1
+            level = zset._random_level()
+            node = _Node((-score, member), level)
+            for i in range(level):
+                tails[i].forward[i] = node
+                tails[i].span[i] = position - tail_positions[i]
+                tails[i] = node
+                tail_positions[i] = position
+            zset._level = max(zset._level, level)
+            zset._scores[member] = score
+        return zset
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __iter__(self):
+        return iter(self._scores)
+
+    def __contains__(self, member: int) -> bool:
+        return member in self._scores
+
+    def score(self, member: int) -> Optional[int]:
+        return self._scores.get(member)
+
+    def add(self, member: int, score: int) -> None:
+        current = self._scores.get(member)
+        if current == score:
+            return
+        if current is not None:
+            self._delete((-current, member))
+        self._insert((-score, member))
+        self._scores[member] = score
+
+    def remove(self, member: int) -> None:
+        score = self._scores.pop(member, None)
+        if score is not None:
+            self._delete((-score, member))
+
+    def count_greater(self, score: int) -> int:
+        """Number of members with a strictly higher score"""
+        return self._count_less((-score, float("-inf")))
+
+    def count_at_least(self, score: int) -> int:
+        """Number of members with a score greater than or equal to `score`"""
+        return self._count_less((-score, float("inf")))
+
+    def position(self, member: int) -> Optional[int]:
+        """0-based position of a member in descending score order"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return self._count_less((-score, member))
+
+    def range(self, start: int, stop: int) -> List[Tuple[int, int]]:
+        """(member, score) pairs for positions start..stop-1 in descending score order"""
+        if start >= stop or start >= len(self):
+            return []
+        node = self._node_at(start + 1)
+        items = []
+        while node is not None and len(items) < stop - start:
+            items.append((node.key[1], -node.key[0]))
+            node = node.forward[0]
+        return items
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < _MAX_LEVEL and random.random() < _P:
+            level += 1
+        return level
+
+    def _count_less(self, key) -> int:
+        node = self._head
+        count = 0
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                count += node.span[i]
+                node = node.forward[i]
+        return count
+
+    def _node_at(self, rank: int) -> Optional[_Node]:
+        # rank is 1-based
+        node = self._head
+        traversed = 0
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and traversed + node.span[i] <= rank:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if traversed == rank:
+                return node
+        return None
+
+    def _insert(self, key) -> None:
+        update = [self._head] * _MAX_LEVEL
+        rank = [0] * _MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.span[i] = len(self._scores)
+            self._level = level
+
+        new_node = _Node(key, level)
+        for i in range(level):
+            new_node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new_node
+            new_node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = (rank[0] - rank[i]) + 1
+
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+
+    def _delete(self, key) -> None:
+        update = [self._head] * _MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        node = node.forward[0]
+        if node is None or node.key != key:
+            return
+
+        for i in range(self._level):
+            if update[i].forward[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].span[i] -= 1
+
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+
+class GradeRankIndex:
+    """
+    Per-grade rank index over leaderboard XP.
+
+    Each grade is loaded from the leaderboards table on first use and
+    reloaded every `refresh_seconds` to pick up writes from other workers;
+    reloads run in the background while requests keep ranking against the
+    previous snapshot. Writes in this process are applied immediately via
+    `update`, and replayed onto a snapshot loaded while they happened.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._grades: Dict[int, RefreshingIndex[SortedSet]] = {}
+        self._member_grades: Dict[int, int] = {}
+        # grade -> {user_id: total_xp, or None when the user left the grade},
+        # for updates made while the grade is being reloaded
+        self._reloading: Dict[int, Dict[int, Optional[int]]] = {}
+
+    def _snapshot(self, grade: int) -> Optional[SortedSet]:
+        index = self._grades.get(grade)
+        return index.index if index is not None else None
+
+    async def ensure_loaded(self, db: AsyncSession, grade: int) -> SortedSet:
+        index = self._grades.get(grade)
+        if index is None:
+            index = self._grades[grade] = RefreshingIndex(
+                f"grade {grade} rank", (), self.refresh_seconds, lambda db: self._load(db, grade)
+            )
+        return await index.get(db)
+
+    async def _load(self, db: AsyncSession, grade: int) -> SortedSet:
+        updates = self._reloading[grade] = {}
+        try:
+            # Rows come back in index order, so the skip list is bulk-loaded without searches
+            result = await db.execute(
+                select(Leaderboard.user_id, Leaderboard.total_xp)
+                .where(Leaderboard.grade == grade)
+                .order_by(desc(Leaderboard.total_xp), Leaderboard.user_id)
+            )
+            rows = [(user_id, total_xp or 0) for user_id, total_xp in result.all()]
+            # Building a large grade is CPU-bound; keep it off the event loop
+            zset = await asyncio.get_running_loop().run_in_executor(None, SortedSet.from_sorted, rows)
+        finally:
+            del self._reloading[grade]
+
+        # The rows may predate writes this process made during the load
+        for member, total_xp in updates.items():
+            if total_xp is None:
+                zset.remove(member)
+            else:
+                zset.add(member, total_xp)
+
+        previous = self._snapshot(grade)
+        if previous is not None:
+            for member in previous:
+                if self._member_grades.get(member) == grade:
+                    del self._member_grades[member]
+        for member in zset:
+            self._member_grades[member] = grade
+        return zset
+
+    def update(self, user_id: int, grade: int, total_xp: int) -> None:
+        """Apply a committed XP or grade change to grades already held in memory"""
+        previous_grade = self._member_grades.get(user_id)
+        if previous_grade is not None and previous_grade != grade:
+            previous = self._snapshot(previous_grade)
+            if previous is not None:
+                previous.remove(user_id)
+            if previous_grade in self._reloading:
+                self._reloading[previous_grade][user_id] = None
+        if grade in self._reloading:
+            self._reloading[grade][user_id] = total_xp
+
+        zset = self._snapshot(grade)
+        if zset is not None:
+            zset.add(user_id, total_xp)
+            self._member_grades[user_id] = grade
+        elif previous_grade is not None:
+            del self._member_grades[user_id]
+
+    async def rank(self, db: AsyncSession, grade: int, total_xp: int) -> int:
+        """1-based rank for an XP total; users tied on XP share a rank"""
+        zset = await self.ensure_loaded(db, grade)
+        return zset.count_greater(total_xp) + 1
+
+    async def percentile(self, db: AsyncSession, grade: int, total_xp: int) -> float:
+        """Percentile rank of an XP total within the grade (ties count half)"""
+        zset = await self.ensure_loaded(db, grade)
+        if not len(zset):
+            return 100.0
+        greater = zset.count_greater(total_xp)
+        equal = zset.count_at_least(total_xp) - greater
+        lower = len(zset) - greater - equal
+        return 100.0 * (lower + 0.5 * equal) / len(zset)
+
+    async def around(self, db: AsyncSession, grade: int, user_id: int, radius: int) -> List[Tuple[int, int, int]]:
+        """(user_id, total_xp, rank) for up to `radius` users either side of the user"""
+        zset = await self.ensure_loaded(db, grade)
+        position = zset.position(user_id)
+        if position is None:
+            return []
+        neighbours = zset.range(max(0, position - radius), position + radius + 1)
+        return [(member, score, zset.count_greater(score) + 1) for member, score in neighbours]
+
+    async def total(self, db: AsyncSession, grade: int) -> int:
+        zset = await self.ensure_loaded(db, grade)
+        return len(zset)
+
+# Global instance
+rank_index = GradeRankIndex(refresh_seconds=settings.rank_index_refresh_seconds)
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import Hashable, Optional
+from .ttl_cache import TTLCache
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`;
+    `acquire` waits until enough tokens are available.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens without waiting; returns False if the bucket is short"""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        # The lock keeps waiters in FIFO order so a burst cannot starve earlier callers
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class KeyedRateLimiter:
+    """
+    One token bucket per key (e.g. user id), checked without waiting.
+
+    Buckets idle long enough to have refilled completely are forgotten, so
+    memory is bounded by the keys active within that window (and max_keys).
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: TTLCache[TokenBucket] = TTLCache(ttl_seconds=capacity / rate, max_entries=max_keys)
+
+    def try_acquire(self, key: Hashable, tokens: float = 1.0) -> bool:
+        bucket = self._buckets.get(key) or TokenBucket(rate=self.rate, capacity=self.capacity)
+        # Re-set on every use to push back the bucket's expiry
+        self._buckets.set(key, bucket)
+        return bucket.try_acquire(tokens)
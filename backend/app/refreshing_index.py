@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Generic, Optional, Tuple, TypeVar
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import replica_router
+from .http_cache import table_versions
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class RefreshingIndex(Generic[T]):
+    """
+    In-process index built from database tables, served stale while it is
+    rebuilt.
+
+    The index is built on first use (the caller waits), then goes stale
+    after this process commits a change to one of `tables`, or after
+    `refresh_seconds` to pick up changes from other workers. A stale index
+    keeps being served while a single background task rebuilds it with its
+    own session, so requests never wait on a rebuild. `build` loads the rows
+    and should run its CPU work off the event loop.
+    """
+
+    # Delay before retrying a failed background rebuild
+    RETRY_SECONDS = 5.0
+
+    def __init__(self, name: str, tables: Tuple[str, ...], refresh_seconds: float, build: Callable[[AsyncSession], Awaitable[T]]):
+        self.name = name
+        self.tables = tables
+        self.refresh_seconds = refresh_seconds
+        self._build = build
+        self.index: Optional[T] = None
+        self._built_at = 0.0
+        self._versions: Optional[Tuple[int, ...]] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh: Optional[asyncio.Task] = None
+        self._retry_at = 0.0
+
+    def is_fresh(self) -> bool:
+        return (
+            self.index is not None
+            and self._versions == table_versions.get(self.tables)
+            and time.monotonic() - self._built_at < self.refresh_seconds
+        )
+
+    async def get(self, db: AsyncSession) -> T:
+        """The current index, built with `db` if there is none yet"""
+        if self.index is None:
+            return await self.ensure_fresh(db)
+        if not self.is_fresh() and (self._refresh is None or self._refresh.done()) and time.monotonic() >= self._retry_at:
+            self._refresh = asyncio.create_task(self._refresh_in_background())
+        return self.index
+
+    async def ensure_fresh(self, db: AsyncSession) -> T:
+        """Wait for an up-to-date index, building it with `db` if needed"""
+        if self._lock is None:
+            # Created here so the lock belongs to the running event loop
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.is_fresh():
+                versions = table_versions.get(self.tables)
+                self.index = await self._build(db)
+                self._versions = versions
+                self._built_at = time.monotonic()
+        return self.index
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            async with replica_router.session() as db:
+                await self.ensure_fresh(db)
+        except Exception:
+            self._retry_at = time.monotonic() + self.RETRY_SECONDS
+            logger.exception("Error rebuilding the %s index; serving the previous one", self.name)
+
+    async def stop(self) -> None:
+        """Cancel a background rebuild in progress"""
+        if self._refresh is not None and not self._refresh.done():
+            self._refresh.cancel()
+            try:
+                await self._refresh
+            except asyncio.CancelledError:
+                pass
+        self._refresh = None
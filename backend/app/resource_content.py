@@ -0,0 +1,194 @@
+import asyncio
+import gzip
+import hashlib
+from typing import AsyncIterator, Callable, Optional, Sequence, Tuple
+from sqlalchemy import LargeBinary, cast, event, func, inspect, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .models import Resource
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+# Preferred first when the client accepts several
+ENCODINGS = ("br", "gzip")
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+# Compression effort: online writes favour speed, the backfill command size
+GZIP_LEVEL = 6
+GZIP_LEVEL_BEST = 9
+BROTLI_QUALITY = 5
+BROTLI_QUALITY_BEST = 11
+
+def body_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+def content_fields(content: str, best: bool = False) -> dict:
+    """Size, hash and pre-compressed copies of a resource body (best: maximum compression)"""
+    raw = content.encode("utf-8")
+    fields = {
+        "content_size": len(raw),
+        "content_hash": body_hash(raw),
+        "content_gzip": None,
+        "content_br": None,
+    }
+    # Small bodies are not worth a compressed copy
+    if len(raw) >= settings.resource_compression_min_bytes:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL_BEST if best else GZIP_LEVEL, mtime=0)
+        if len(compressed) < len(raw):
+            fields["content_gzip"] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(raw, quality=BROTLI_QUALITY_BEST if best else BROTLI_QUALITY)
+            if len(compressed) < len(raw):
+                fields["content_br"] = compressed
+    return fields
+
+async def apply_content_fields(resource: Resource, best: bool = False) -> None:
+    """
+    Fill a resource's content fields from its body; writers await this
+    before flushing a new or changed body. Compression runs in the executor,
+    as a large body takes long enough to stall the event loop.
+    """
+    fields = await asyncio.get_running_loop().run_in_executor(None, content_fields, resource.content, best)
+    for field, value in fields.items():
+        setattr(resource, field, value)
+
+def _check_content_fields(resource: Resource) -> None:
+    # Flush events run on the event loop, so nothing is compressed here: a
+    # body written without apply_content_fields() gets its size and hash
+    # (cheap) and no compressed copies until backfill-resource-content
+    raw = resource.content.encode("utf-8")
+    digest = body_hash(raw)
+    if resource.content_hash == digest:
+        return
+    resource.content_size = len(raw)
+    resource.content_hash = digest
+    resource.content_gzip = None
+    resource.content_br = None
+
+@event.listens_for(Resource, "before_insert")
+def _fill_content_fields_on_insert(mapper, connection, target: Resource) -> None:
+    if target.content is not None:
+        _check_content_fields(target)
+
+@event.listens_for(Resource, "before_update")
+def _fill_content_fields_on_update(mapper, connection, target: Resource) -> None:
+    # Checked via history so an unloaded (deferred) body is never loaded here
+    if inspect(target).attrs.content.history.added and target.content is not None:
+        _check_content_fields(target)
+
+def choose_encoding(accept_encoding: Optional[str], available: Sequence[str]) -> Optional[str]:
+    """Best stored encoding the client accepts, or None for the identity body"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    for coding in ENCODINGS:
+        if coding in available and (coding in accepted or "*" in accepted):
+            return coding
+    return None
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) byte offsets, end inclusive, for a single "bytes=" range.
+
+    Returns None when the whole body should be sent (no header, multiple or
+    malformed ranges, which RFC 9110 allows us to ignore) and raises
+    RangeNotSatisfiable when the range lies outside the body.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, _, last = spec.partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes (none exist in an empty body)
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+async def iter_chunks(body: bytes, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Yield body[start:end + 1] in resource_chunk_bytes pieces"""
+    view = memoryview(body)
+    stop = len(body) if end is None else end + 1
+    chunk_size = settings.resource_chunk_bytes
+    for offset in range(start, stop, chunk_size):
+        yield bytes(view[offset:min(offset + chunk_size, stop)])
+
+def _stored_bytes(encoding: Optional[str], dialect: str):
+    """SQL expression for a stored body as bytes (the text body as UTF-8)"""
+    if encoding == "br":
+        return Resource.content_br
+    if encoding == "gzip":
+        return Resource.content_gzip
+    if dialect == "postgresql":
+        return func.convert_to(Resource.content, literal_column("'UTF8'"))
+    return cast(Resource.content, LargeBinary)
+
+async def read_body(
+    sessions: Callable[[], AsyncSession],
+    resource_id: int,
+    encoding: Optional[str],
+    content_hash: str,
+    start: int,
+    end: int
+) -> AsyncIterator[bytes]:
+    """
+    Yield bytes start..end (inclusive) of a stored body in resource_chunk_bytes
+    pieces, each read with substr() in its own short session: neither the
+    body nor a connection is held while the client reads. Stops early when
+    the resource is deleted, or its content replaced, mid-stream.
+    """
+    chunk_size = settings.resource_chunk_bytes
+    for offset in range(start, end + 1, chunk_size):
+        length = min(chunk_size, end + 1 - offset)
+        async with sessions() as db:
+            body = _stored_bytes(encoding, db.bind.dialect.name)
+            chunk = await db.scalar(
+                select(func.substr(body, offset + 1, length, type_=LargeBinary))
+                .where(Resource.id == resource_id, Resource.content_hash == content_hash)
+            )
+        if chunk is None:
+            return
+        yield chunk
+
+async def peek(chunks: AsyncIterator[bytes]) -> Tuple[Optional[bytes], AsyncIterator[bytes]]:
+    """First chunk (None if there is none) and an iterator that still yields it"""
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        return None, chunks
+
+    async def replay() -> AsyncIterator[bytes]:
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return first, replay()
@@ -0,0 +1,178 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from .config import settings
+from .embeddings import HashingEmbedder, SparseVector, cosine_similarity
+
+# Semantic lookups only compare questions asked in the same subject and grade
+Scope = Tuple[Optional[str], Optional[int]]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+class _CacheEntry:
+    __slots__ = ("key", "scope", "response", "embedding", "expires_at", "size")
+
+    def __init__(self, key: str, scope: Scope, response: str, embedding: SparseVector, expires_at: float):
+        self.key = key
+        self.scope = scope
+        self.response = response
+        self.embedding = embedding
+        self.expires_at = expires_at
+        # Rough footprint: response text plus the sparse embedding
+        self.size = len(response.encode("utf-8")) + 64 * len(embedding) + 256
+
+class ResponseCache:
+    """
+    Two-tier cache for CeynovX chat responses.
+
+    The exact tier is keyed by a hash of the normalised prompt. The semantic
+    tier compares the student's question against cached questions from the
+    same subject and grade and reuses an answer above a similarity threshold.
+    That comparison is a linear scan, so each scope keeps only its newest
+    `max_scope_entries` questions as candidates; older ones remain
+    reachable by exact key. Questions without any tokens (an empty
+    embedding) never match and skip the semantic tier. Entries expire after
+    a TTL and are evicted least-recently-used first when the entry or memory
+    cap is reached.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        max_bytes: int,
+        similarity_threshold: float,
+        max_scope_entries: int = 500,
+        embedder: Optional[HashingEmbedder] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+        self.max_scope_entries = max_scope_entries
+        self.embedder = embedder or HashingEmbedder()
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._scopes: Dict[Scope, Dict[str, _CacheEntry]] = {}
+        self._bytes = 0
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(prompt: str) -> str:
+        normalized = _WHITESPACE_RE.sub(" ", prompt).strip().casefold()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get(self, prompt: str, message: str, subject: Optional[str], grade: Optional[int]) -> Optional[str]:
+        now = time.monotonic()
+        key = self.make_key(prompt)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.response
+            self._remove(entry)
+            self.expirations += 1
+
+        embedding = self.embedder.embed(message) if self.similarity_threshold < 1.0 else {}
+        if embedding:
+            entry = self._find_similar((subject, grade), embedding, now)
+            if entry is not None:
+                self._entries.move_to_end(entry.key)
+                self.semantic_hits += 1
+                return entry.response
+
+        self.misses += 1
+        return None
+
+    def set(self, prompt: str, message: str, subject: Optional[str], grade: Optional[int], response: str) -> None:
+        key = self.make_key(prompt)
+        existing = self._entries.get(key)
+        if existing is not None:
+            self._remove(existing)
+
+        entry = _CacheEntry(
+            key=key,
+            scope=(subject, grade),
+            response=response,
+            embedding=self.embedder.embed(message),
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        if entry.size > self.max_bytes:
+            return
+
+        self._entries[key] = entry
+        self._bytes += entry.size
+        if entry.embedding:
+            scope_entries = self._scopes.setdefault(entry.scope, {})
+            scope_entries[key] = entry
+            if len(scope_entries) > self.max_scope_entries:
+                # Drop the oldest candidate from the semantic tier only
+                del scope_entries[next(iter(scope_entries))]
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, oldest = next(iter(self._entries.items()))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._scopes.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _find_similar(self, scope: Scope, embedding: SparseVector, now: float) -> Optional[_CacheEntry]:
+        best_entry = None
+        best_score = self.similarity_threshold
+        expired = []
+        for entry in self._scopes.get(scope, {}).values():
+            if entry.expires_at <= now:
+                expired.append(entry)
+                continue
+            score = cosine_similarity(embedding, entry.embedding)
+            if score >= best_score:
+                best_entry, best_score = entry, score
+
+        for entry in expired:
+            self._remove(entry)
+            self.expirations += 1
+
+        return best_entry
+
+    def _remove(self, entry: _CacheEntry) -> None:
+        self._entries.pop(entry.key, None)
+        scope_entries = self._scopes.get(entry.scope)
+        if scope_entries is not None:
+            scope_entries.pop(entry.key, None)
+            if not scope_entries:
+                del self._scopes[entry.scope]
+        self._bytes -= entry.size
+
+# Global instance
+response_cache = ResponseCache(
+    ttl_seconds=settings.chat_cache_ttl_seconds,
+    max_entries=settings.chat_cache_max_entries,
+    max_bytes=settings.chat_cache_max_bytes,
+    similarity_threshold=settings.chat_cache_similarity_threshold,
+    max_scope_entries=settings.chat_cache_max_scope_entries
+)
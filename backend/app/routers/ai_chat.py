@@ -1,65 +1,179 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import logging
+import math
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from ..database import get_db
-from ..models import User, Profile, Subject
-from ..schemas import ChatMessage, ChatResponse
-from ..auth import get_current_active_user
-from ..ai_service import ai_service
+from ..models import Profile, Subject
+from ..schemas import ChatMessage, ChatResponse, QuizGenerationJob, TokenClaims
+from ..auth import get_current_claims, get_current_profile
+from ..ai_service import get_ai_service
+from ..ai_gateway import ai_gateway, AIGatewayError
+from ..response_cache import response_cache
+from ..rag import passage_retriever, passage_sources
+from ..quiz_generation import question_pool, refill_limiter, take_pool_question, count_fresh_questions, is_known_topic
+from ..config import settings
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ai", tags=["ai-chat"])
 
+def ai_unavailable(error: AIGatewayError) -> HTTPException:
+    headers = {"Retry-After": str(math.ceil(error.retry_after))} if error.retry_after else None
+    return HTTPException(
+        status_code=503,
+        detail="CeynovX is temporarily unavailable. Please try again shortly.",
+        headers=headers
+    )
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_ceynovx(
     message: ChatMessage,
-    current_user: User = Depends(get_current_active_user),
+    profile: Profile = Depends(get_current_profile),
     db: AsyncSession = Depends(get_db)
 ):
     """Chat with CeynovX AI assistant"""
     
-    # Get user profile for context
-    profile_result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
-    profile = profile_result.scalar_one_or_none()
-    
-    if not profile:
-        raise HTTPException(status_code=404, detail="User profile not found")
-    
     # Get subject context if provided
     subject_context = None
+    subject_id = None
     if message.subject_id:
         subject_result = await db.execute(select(Subject).where(Subject.id == message.subject_id))
         subject = subject_result.scalar_one_or_none()
         if subject:
             subject_context = subject.name
+            subject_id = subject.id
+    
+    grade = message.grade or profile.grade
+    
+    # Ground the answer in the curriculum resources for this subject (or grade)
+    passages = await passage_retriever.retrieve(db, message.message, subject_id=subject_id, grade=grade)
     
     # Generate AI response
-    response = await ai_service.generate_response(
-        message=message.message,
-        subject_context=subject_context,
-        grade=message.grade or profile.grade
-    )
+    try:
+        response = await get_ai_service().generate_response(
+            message=message.message,
+            subject_context=subject_context,
+            grade=grade,
+            passages=passages
+        )
+    except AIGatewayError as e:
+        raise ai_unavailable(e)
     
     return ChatResponse(
         response=response,
-        sources=None  # Could be enhanced to include source references
+        sources=passage_sources(passages)
     )
 
+@router.post("/chat/stream")
+async def stream_chat_with_ceynovx(
+    message: ChatMessage,
+    request: Request,
+    profile: Profile = Depends(get_current_profile),
+    db: AsyncSession = Depends(get_db)
+):
+    """Chat with CeynovX AI assistant, streaming the answer as Server-Sent Events"""
+    
+    # Resolve all database context up front so the session is not held while streaming
+    subject_context = None
+    subject_id = None
+    if message.subject_id:
+        subject_result = await db.execute(select(Subject).where(Subject.id == message.subject_id))
+        subject = subject_result.scalar_one_or_none()
+        if subject:
+            subject_context = subject.name
+            subject_id = subject.id
+    
+    grade = message.grade or profile.grade
+    passages = await passage_retriever.retrieve(db, message.message, subject_id=subject_id, grade=grade)
+    
+    async def event_stream():
+        # Each chunk is pulled from Gemini only after the previous one was sent, so a
+        # slow client applies backpressure to the upstream read. Leaving this generator
+        # (disconnect or cancellation) closes the upstream request.
+        chunks = get_ai_service().stream_response(
+            message=message.message,
+            subject_context=subject_context,
+            grade=grade,
+            passages=passages
+        )
+        try:
+            async for chunk in chunks:
+                if await request.is_disconnected():
+                    return
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        except Exception:
+            logger.exception("Error streaming Gemini response")
+            yield f"event: error\ndata: {json.dumps({'detail': 'AI response stream failed'})}\n\n"
+            return
+        finally:
+            await chunks.aclose()
+        yield f"event: done\ndata: {json.dumps({'sources': passage_sources(passages)})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/cache/stats")
+async def get_chat_cache_stats(claims: TokenClaims = Depends(get_current_claims)):
+    """Get hit/miss metrics for the CeynovX response cache"""
+    return response_cache.stats()
+
+@router.get("/rag/stats")
+async def get_rag_stats(claims: TokenClaims = Depends(get_current_claims)):
+    """Get index size and retrieval latency for CeynovX grounding"""
+    return passage_retriever.stats()
+
+@router.get("/gateway/stats")
+async def get_gateway_stats(claims: TokenClaims = Depends(get_current_claims)):
+    """Get circuit state and per-call latency and error metrics for Gemini requests"""
+    return ai_gateway.stats()
+
 @router.post("/generate-quiz-question")
 async def generate_quiz_question(
     subject: str,
     topic: str,
     grade: int,
     difficulty: str = "medium",
-    current_user: User = Depends(get_current_active_user)
+    claims: TokenClaims = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Generate a quiz question using AI"""
+    """Generate a quiz question using AI, served from the pre-generated pool when possible"""
     
-    question = await ai_service.generate_quiz_question(
-        subject=subject,
-        topic=topic,
-        grade=grade,
-        difficulty=difficulty
-    )
+    # Top up the pool in the background when it is running low. Only seeded
+    # topics are refilled, and each user can trigger a few refills per hour,
+    # so arbitrary subject/topic strings cannot queue Gemini work.
+    if (
+        await count_fresh_questions(db, subject, topic, grade, difficulty) < settings.quiz_pool_refill_threshold
+        and await is_known_topic(db, subject, topic, grade)
+        and refill_limiter.try_acquire(claims.user_id)
+    ):
+        question_pool.submit(QuizGenerationJob(
+            subject=subject,
+            topic=topic,
+            grade=grade,
+            difficulty=difficulty,
+            count=settings.quiz_pool_refill_count
+        ))
+    
+    question = await take_pool_question(db, subject, topic, grade, difficulty)
+    if question:
+        return question
+    
+    # Pool is empty for this topic: fall back to generating one question directly
+    try:
+        question = await get_ai_service().generate_quiz_question(
+            subject=subject,
+            topic=topic,
+            grade=grade,
+            difficulty=difficulty
+        )
+    except AIGatewayError as e:
+        raise ai_unavailable(e)
     
     if not question:
         raise HTTPException(
@@ -67,4 +181,4 @@ async def generate_quiz_question(
             detail="Failed to generate quiz question"
         )
     
-    return question 
\ No newline at end of file
+    return question
@@ -1,16 +1,22 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from ..database import get_db
+from sqlalchemy.orm import joinedload
+from ..database import get_db, replica_router
 from ..models import User, Profile
-from ..schemas import UserCreate, UserLogin, Token, Profile as ProfileSchema, ProfileUpdate
-from ..auth import get_password_hash, verify_password, create_access_token, get_current_active_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..schemas import UserCreate, UserLogin, Token, TokenRefresh, TokenClaims, Profile as ProfileSchema, ProfileUpdate
+from ..leaderboard import create_entry, update_grade
+from ..rank_index import rank_index
+from ..auth import (
+    hash_password, verify_and_update_password, create_user_tokens, decode_token, revoke_user_tokens,
+    get_current_active_user, get_current_claims, get_current_profile, invalidate_identity,
+    token_revocations, REFRESH_TOKEN_TYPE
+)
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/register", response_model=Token)
-async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
+async def register(user_data: UserCreate, response: Response, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
     result = await db.execute(select(User).where(User.email == user_data.email))
@@ -23,7 +29,7 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     user = User(
         email=user_data.email,
         hashed_password=hashed_password
@@ -42,55 +48,86 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     )
     
     db.add(profile)
+    create_entry(db, user_id=user.id, grade=user_data.grade)
     await db.commit()
+    rank_index.update(user.id, user_data.grade, 0)
+    replica_router.mark_write(user.id, response)
     
-    # Generate access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return create_user_tokens(user, grade=user_data.grade)
 
 @router.post("/login", response_model=Token)
 async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_db)):
-    """Login user and return access token"""
-    # Find user by email
-    result = await db.execute(select(User).where(User.email == user_credentials.email))
+    """Login user and return access and refresh tokens"""
+    # Find user by email (with the profile, whose grade goes into the token)
+    result = await db.execute(
+        select(User).options(joinedload(User.profile)).where(User.email == user_credentials.email)
+    )
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    verified, new_hash = (False, None)
+    if user:
+        verified, new_hash = await verify_and_update_password(user_credentials.password, user.hashed_password)
+    
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Generate access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+    # Upgrade hashes made with an old cost factor while we have the plain password
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    return create_user_tokens(user, grade=user.profile.grade if user.profile else None)
+
+@router.post("/refresh", response_model=Token)
+async def refresh_tokens(token_data: TokenRefresh, db: AsyncSession = Depends(get_db)):
+    """Exchange a refresh token for a new access/refresh token pair"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
     )
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    payload = decode_token(token_data.refresh_token)
+    if payload is None or payload.get("typ") != REFRESH_TOKEN_TYPE or "uid" not in payload:
+        raise credentials_exception
+    
+    # Always checked against the database: this is where deactivation and
+    # logout take effect for long-lived sessions
+    result = await db.execute(
+        select(User).options(joinedload(User.profile)).where(User.id == payload["uid"])
+    )
+    user = result.scalar_one_or_none()
+    
+    if user is None or payload.get("ver", 0) != user.token_version:
+        raise credentials_exception
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    
+    return create_user_tokens(user, grade=user.profile.grade if user.profile else None)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(claims: TokenClaims = Depends(get_current_claims), db: AsyncSession = Depends(get_db)):
+    """Revoke every access and refresh token issued to the current user"""
+    version = await revoke_user_tokens(db, claims.user_id)
+    await db.commit()
+    
+    if version is not None:
+        token_revocations.revoke(claims.user_id, version)
+    invalidate_identity(claims.user_id)
 
 @router.get("/me", response_model=ProfileSchema)
-async def get_current_user_profile(current_user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
+async def get_current_user_profile(profile: Profile = Depends(get_current_profile)):
     """Get current user's profile"""
-    result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
-    profile = result.scalar_one_or_none()
-    
-    if not profile:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Profile not found"
-        )
-    
     return profile
 
 @router.put("/me", response_model=ProfileSchema)
 async def update_profile(
     profile_update: ProfileUpdate,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -109,7 +146,16 @@ async def update_profile(
     for field, value in update_data.items():
         setattr(profile, field, value)
     
+    leaderboard_xp = None
+    if "grade" in update_data:
+        leaderboard_xp = await update_grade(db, user_id=current_user.id, grade=profile.grade)
+    
     await db.commit()
     await db.refresh(profile)
+    invalidate_identity(current_user.id)
+    replica_router.mark_write(current_user.id, response)
+    
+    if leaderboard_xp is not None:
+        rank_index.update(current_user.id, profile.grade, leaderboard_xp)
     
     return profile 
\ No newline at end of file
@@ -1,65 +1,81 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc
-from ..database import get_db
-from ..models import User, Profile, QuizAttempt, Leaderboard, XPRecord
-from ..schemas import DashboardStats, Leaderboard as LeaderboardSchema
-from ..auth import get_current_active_user
+from sqlalchemy import select, func, desc, literal, tuple_, union_all, Integer, String
+from ..database import get_read_db
+from ..models import Profile, QuizAttempt, Leaderboard, XPRecord
+from ..schemas import DashboardStats, Leaderboard as LeaderboardSchema, RankInfo, RankNeighbour, TokenClaims
+from ..auth import get_current_claims, get_current_profile, get_user_read_db
+from ..rank_index import rank_index
+from ..leaderboard import quiz_xp_sql
+from ..pagination import PageParams, paginate, decode_cursor, encode_cursor, NEXT_CURSOR_HEADER, MAX_PAGE_SIZE
+from ..serialization import schema_fields, dump_rows, json_bytes_response
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+LEADERBOARD_FIELDS = schema_fields(LeaderboardSchema)
+XP_HISTORY_FIELDS = ("id", "xp_amount", "source", "description", "created_at")
+
 @router.get("/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
-    current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    profile: Profile = Depends(get_current_profile),
+    db: AsyncSession = Depends(get_user_read_db)
 ):
     """Get current user's dashboard statistics"""
     
-    # Get user profile
-    profile_result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
-    profile = profile_result.scalar_one_or_none()
-    
-    if not profile:
-        raise HTTPException(status_code=404, detail="User profile not found")
+    # Quiz statistics are maintained incrementally on the leaderboard row
+    leaderboard_result = await db.execute(select(Leaderboard).where(Leaderboard.user_id == profile.user_id))
+    entry = leaderboard_result.scalar_one_or_none()
     
-    # Get quiz statistics
-    quiz_stats_result = await db.execute(
-        select(
-            func.count(QuizAttempt.id).label("total_attempts"),
-            func.avg(QuizAttempt.score).label("avg_score")
-        ).where(QuizAttempt.user_id == current_user.id)
-    )
-    quiz_stats = quiz_stats_result.first()
-    
-    # Calculate rank in grade
-    rank_result = await db.execute(
-        select(func.count(Leaderboard.id) + 1)
-        .where(
-            Leaderboard.grade == profile.grade,
-            Leaderboard.total_xp > profile.total_xp
-        )
-    )
-    rank = rank_result.scalar()
+    # Rank in grade from the in-memory rank index (O(log n))
+    rank = await rank_index.rank(db, profile.grade, profile.total_xp)
     
     return DashboardStats(
         total_xp=profile.total_xp,
         current_streak=profile.current_streak,
         longest_streak=profile.longest_streak,
-        quizzes_completed=quiz_stats.total_attempts or 0,
-        average_score=float(quiz_stats.avg_score or 0),
+        quizzes_completed=entry.quizzes_completed if entry else 0,
+        average_score=float(entry.average_score) if entry else 0.0,
         rank_in_grade=rank
     )
 
+@router.get("/rank", response_model=RankInfo)
+async def get_my_rank(
+    radius: int = Query(5, ge=0, le=50),
+    claims: TokenClaims = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_user_read_db)
+):
+    """Get current user's rank, percentile and the users ranked around them in their grade"""
+    
+    result = await db.execute(select(Leaderboard).where(Leaderboard.user_id == claims.user_id))
+    entry = result.scalar_one_or_none()
+    
+    if not entry:
+        raise HTTPException(status_code=404, detail="Leaderboard entry not found")
+    
+    around = await rank_index.around(db, entry.grade, claims.user_id, radius)
+    
+    return RankInfo(
+        grade=entry.grade,
+        rank=await rank_index.rank(db, entry.grade, entry.total_xp),
+        total_users=await rank_index.total(db, entry.grade),
+        percentile=await rank_index.percentile(db, entry.grade, entry.total_xp),
+        around=[
+            RankNeighbour(user_id=user_id, total_xp=total_xp, rank=rank)
+            for user_id, total_xp, rank in around
+        ]
+    )
+
 @router.get("/leaderboard", response_model=List[LeaderboardSchema])
 async def get_leaderboard(
     grade: int = None,
     limit: int = 20,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get leaderboard for a specific grade or overall"""
     
-    query = select(Leaderboard).order_by(desc(Leaderboard.total_xp))
+    # Plain columns, serialized straight to JSON: no ORM objects or response model validation
+    query = select(*(getattr(Leaderboard, field) for field in LEADERBOARD_FIELDS)).order_by(desc(Leaderboard.total_xp))
     
     if grade:
         query = query.where(Leaderboard.grade == grade)
@@ -67,105 +83,119 @@ async def get_leaderboard(
     query = query.limit(limit)
     
     result = await db.execute(query)
-    leaderboard = result.scalars().all()
     
-    return leaderboard
+    return json_bytes_response(dump_rows(result.all(), LEADERBOARD_FIELDS))
 
 @router.get("/xp-history")
 async def get_xp_history(
-    current_user: User = Depends(get_current_active_user),
-    limit: int = 50,
-    db: AsyncSession = Depends(get_db)
+    response: Response,
+    page: PageParams = Depends(),
+    claims: TokenClaims = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    """Get user's XP history"""
-    
-    result = await db.execute(
-        select(XPRecord)
-        .where(XPRecord.user_id == current_user.id)
-        .order_by(desc(XPRecord.created_at))
-        .limit(limit)
-    )
+    """Get user's XP history (cursor-paginated, newest first)"""
     
-    xp_records = result.scalars().all()
+    query = select(XPRecord).where(XPRecord.user_id == claims.user_id)
+    xp_records = await paginate(db, query, (XPRecord.created_at, XPRecord.id), page, response, descending=True)
     
-    return [
-        {
-            "id": record.id,
-            "xp_amount": record.xp_amount,
-            "source": record.source,
-            "description": record.description,
-            "created_at": record.created_at
-        }
-        for record in xp_records
-    ]
+    return json_bytes_response(dump_rows(xp_records, XP_HISTORY_FIELDS), response)
+
+# Activity types in the merged feed; also the tie-breaker between rows with equal timestamps
+QUIZ_ATTEMPT_ACTIVITY = "quiz_attempt"
+XP_EARNED_ACTIVITY = "xp_earned"
 
 @router.get("/recent-activity")
 async def get_recent_activity(
-    current_user: User = Depends(get_current_active_user),
-    limit: int = 10,
-    db: AsyncSession = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    claims: TokenClaims = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    """Get user's recent activity (quiz attempts, XP earned)"""
-    
-    # Get recent quiz attempts
-    quiz_attempts_result = await db.execute(
-        select(QuizAttempt)
-        .where(QuizAttempt.user_id == current_user.id)
-        .order_by(desc(QuizAttempt.completed_at))
-        .limit(limit)
-    )
+    """Get user's recent activity (quiz attempts, XP earned), cursor-paginated, newest first"""
     
-    quiz_attempts = quiz_attempts_result.scalars().all()
+    # Feed order is (timestamp, type, id) descending; the cursor is the last row's key
+    cursor_key = None
+    if cursor:
+        cursor_key = decode_cursor(cursor, (XPRecord.created_at, literal("", String), XPRecord.id))
+        if cursor_key[1] not in (QUIZ_ATTEMPT_ACTIVITY, XP_EARNED_ACTIVITY):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
+    attempts = _activity_branch(
+        QUIZ_ATTEMPT_ACTIVITY,
+        select(
+            QuizAttempt.id.label("id"),
+            QuizAttempt.completed_at.label("timestamp"),
+            QuizAttempt.score.label("score"),
+            QuizAttempt.total_questions.label("total_questions"),
+            quiz_xp_sql(QuizAttempt.score, QuizAttempt.total_questions).label("xp_earned"),
+            literal(None, String).label("description")
+        ).where(QuizAttempt.user_id == claims.user_id),
+        QuizAttempt.completed_at,
+        QuizAttempt.id,
+        cursor_key,
+        limit
+    )
+    xp_records = _activity_branch(
+        XP_EARNED_ACTIVITY,
+        select(
+            XPRecord.id.label("id"),
+            XPRecord.created_at.label("timestamp"),
+            literal(None, Integer).label("score"),
+            literal(None, Integer).label("total_questions"),
+            XPRecord.xp_amount.label("xp_earned"),
+            XPRecord.description.label("description")
+        ).where(XPRecord.user_id == claims.user_id),
+        XPRecord.created_at,
+        XPRecord.id,
+        cursor_key,
+        limit
+    )
     
-    # Get recent XP records
-    xp_records_result = await db.execute(
-        select(XPRecord)
-        .where(XPRecord.user_id == current_user.id)
-        .order_by(desc(XPRecord.created_at))
-        .limit(limit)
+    # One statement: each branch is an index-ordered top-N scan, merged by UNION ALL
+    feed = union_all(attempts, xp_records).subquery()
+    result = await db.execute(
+        select(feed)
+        .order_by(desc(feed.c.timestamp), desc(feed.c.type), desc(feed.c.id))
+        .limit(limit + 1)
     )
+    rows = result.all()
     
-    xp_records = xp_records_result.scalars().all()
-    
-    # Combine and sort by date
-    activities = []
-    
-    for attempt in quiz_attempts:
-        activities.append({
-            "type": "quiz_attempt",
-            "id": attempt.id,
-            "title": f"Completed quiz (Score: {attempt.score}/{attempt.total_questions})",
-            "timestamp": attempt.completed_at,
-            "xp_earned": calculate_quiz_xp(attempt.score, attempt.total_questions)
-        })
-    
-    for record in xp_records:
-        activities.append({
-            "type": "xp_earned",
-            "id": record.id,
-            "title": f"Earned {record.xp_amount} XP - {record.description}",
-            "timestamp": record.created_at,
-            "xp_earned": record.xp_amount
-        })
-    
-    # Sort by timestamp and return top results
-    activities.sort(key=lambda x: x["timestamp"], reverse=True)
-    return activities[:limit]
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([last.timestamp, last.type, last.id])
+    
+    return [
+        {
+            "type": row.type,
+            "id": row.id,
+            "title": (
+                f"Completed quiz (Score: {row.score}/{row.total_questions})"
+                if row.type == QUIZ_ATTEMPT_ACTIVITY
+                else f"Earned {row.xp_earned} XP - {row.description}"
+            ),
+            "timestamp": row.timestamp,
+            "xp_earned": row.xp_earned
+        }
+        for row in rows
+    ]
 
-def calculate_quiz_xp(score: int, total_questions: int) -> int:
-    """Calculate XP earned from quiz performance"""
-    if total_questions == 0:
-        return 0
-    
-    percentage = (score / total_questions) * 100
-    
-    if percentage >= 90:
-        return 100
-    elif percentage >= 80:
-        return 75
-    elif percentage >= 70:
-        return 50
-    elif percentage >= 60:
-        return 25
-    else:
-        return 10 
\ No newline at end of file
+def _activity_branch(activity_type: str, query, timestamp_column, id_column, cursor_key, limit: int):
+    """One source of the activity feed, limited to rows after the cursor"""
+    if cursor_key is not None:
+        cursor_timestamp, cursor_type, cursor_id = cursor_key
+        if activity_type < cursor_type:
+            query = query.where(timestamp_column <= cursor_timestamp)
+        elif activity_type == cursor_type:
+            query = query.where(tuple_(timestamp_column, id_column) < tuple_(cursor_timestamp, cursor_id))
+        else:
+            query = query.where(timestamp_column < cursor_timestamp)
+    
+    branch = (
+        query.add_columns(literal(activity_type, String).label("type"))
+        .order_by(desc(timestamp_column), desc(id_column))
+        .limit(limit + 1)
+        .subquery()
+    )
+    return select(branch)
@@ -1,32 +1,39 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from ..database import get_db
-from ..models import Quiz, QuizQuestion, QuizAttempt, User, Profile, XPRecord
-from ..schemas import Quiz as QuizSchema, QuizQuestion as QuizQuestionSchema, QuizAttempt as QuizAttemptSchema, QuizAttemptCreate
-from ..auth import get_current_active_user
+from sqlalchemy import select, insert
+from ..database import get_db, get_read_db, replica_router
+from ..models import Quiz, QuizQuestion, QuizAttempt
+from ..schemas import Quiz as QuizSchema, QuizQuestionPublic as QuizQuestionPublicSchema, QuizAttempt as QuizAttemptSchema, QuizAttemptCreate, TokenClaims
+from ..auth import get_current_claims, get_user_read_db
+from ..pagination import PageParams, paginate
+from ..xp_events import xp_events, XPEvent, quiz_attempt_key, record_xp
+from ..quiz_cache import quiz_payloads
+from ..leaderboard import calculate_quiz_xp, quiz_percentage
+from ..http_cache import etag_matches
+from ..serialization import schema_fields, dump_rows, json_bytes_response
 
 router = APIRouter(prefix="/quizzes", tags=["quizzes"])
 
+QUIZ_ATTEMPT_FIELDS = schema_fields(QuizAttemptSchema)
+
 @router.get("/", response_model=List[QuizSchema])
 async def get_quizzes(
+    response: Response,
     subject_id: int = None,
-    db: AsyncSession = Depends(get_db)
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all quizzes, optionally filtered by subject"""
+    """Get all quizzes, optionally filtered by subject (cursor-paginated, newest first)"""
     query = select(Quiz).where(Quiz.is_active == True)
     
     if subject_id:
         query = query.where(Quiz.subject_id == subject_id)
     
-    result = await db.execute(query)
-    quizzes = result.scalars().all()
-    
-    return quizzes
+    return await paginate(db, query, (Quiz.created_at, Quiz.id), page, response, descending=True)
 
 @router.get("/{quiz_id}", response_model=QuizSchema)
-async def get_quiz(quiz_id: int, db: AsyncSession = Depends(get_db)):
+async def get_quiz(quiz_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a specific quiz by ID"""
     result = await db.execute(select(Quiz).where(Quiz.id == quiz_id))
     quiz = result.scalar_one_or_none()
@@ -39,137 +46,104 @@ async def get_quiz(quiz_id: int, db: AsyncSession = Depends(get_db)):
     
     return quiz
 
-@router.get("/{quiz_id}/questions", response_model=List[QuizQuestionSchema])
+@router.get("/{quiz_id}/questions", response_model=List[QuizQuestionPublicSchema])
 async def get_quiz_questions(
     quiz_id: int,
-    db: AsyncSession = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all questions for a specific quiz (without correct answers)"""
-    # First check if quiz exists
-    quiz_result = await db.execute(select(Quiz).where(Quiz.id == quiz_id))
-    quiz = quiz_result.scalar_one_or_none()
+    payload = await quiz_payloads.get(db, quiz_id)
     
-    if not quiz:
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Quiz not found"
         )
     
-    # Get questions without correct answers
-    result = await db.execute(
-        select(
-            QuizQuestion.id,
-            QuizQuestion.quiz_id,
-            QuizQuestion.question_text,
-            QuizQuestion.option_a,
-            QuizQuestion.option_b,
-            QuizQuestion.option_c,
-            QuizQuestion.option_d
-        ).where(QuizQuestion.quiz_id == quiz_id)
-    )
+    # Clients may keep the list but must revalidate it with If-None-Match
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, payload.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
     
-    questions = result.all()
-    return [
-        QuizQuestionSchema(
-            id=q.id,
-            quiz_id=q.quiz_id,
-            question_text=q.question_text,
-            option_a=q.option_a,
-            option_b=q.option_b,
-            option_c=q.option_c,
-            option_d=q.option_d,
-            explanation=None  # Don't include explanation in questions
-        )
-        for q in questions
-    ]
+    return Response(content=payload.body, media_type="application/json", headers=headers)
 
 @router.post("/{quiz_id}/submit", response_model=QuizAttemptSchema)
 async def submit_quiz_attempt(
     quiz_id: int,
     attempt_data: QuizAttemptCreate,
-    current_user: User = Depends(get_current_active_user),
+    response: Response,
+    claims: TokenClaims = Depends(get_current_claims),
     db: AsyncSession = Depends(get_db)
 ):
-    """Submit a quiz attempt and calculate score"""
+    """Submit a quiz attempt, grade it and record its XP"""
     
-    # Verify quiz exists
-    quiz_result = await db.execute(select(Quiz).where(Quiz.id == quiz_id))
-    quiz = quiz_result.scalar_one_or_none()
+    # Quiz title and answer key in one query
+    result = await db.execute(
+        select(Quiz.title, QuizQuestion.id, QuizQuestion.correct_answer)
+        .outerjoin(QuizQuestion, QuizQuestion.quiz_id == Quiz.id)
+        .where(Quiz.id == quiz_id)
+    )
+    rows = result.all()
     
-    if not quiz:
+    if not rows:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Quiz not found"
         )
     
-    # Create quiz attempt
-    quiz_attempt = QuizAttempt(
-        user_id=current_user.id,
-        quiz_id=quiz_id,
-        score=attempt_data.score,
-        total_questions=attempt_data.total_questions,
-        correct_answers=attempt_data.correct_answers,
-        time_taken=attempt_data.time_taken
+    quiz_title = rows[0].title
+    answer_key = {row.id: row.correct_answer for row in rows if row.id is not None}
+    correct_answers = grade_answers(answer_key, attempt_data.answers)
+    score, total_questions = correct_answers, len(answer_key)
+    
+    attempt_result = await db.execute(
+        insert(QuizAttempt)
+        .values(
+            user_id=claims.user_id,
+            quiz_id=quiz_id,
+            score=score,
+            total_questions=total_questions,
+            correct_answers=correct_answers,
+            time_taken=attempt_data.time_taken
+        )
+        .returning(QuizAttempt)
     )
+    quiz_attempt = attempt_result.scalar_one()
     
-    db.add(quiz_attempt)
-    await db.commit()
-    await db.refresh(quiz_attempt)
-    
-    # Calculate and award XP
-    xp_earned = calculate_quiz_xp(attempt_data.score, attempt_data.total_questions)
-    
-    # Add XP record
-    xp_record = XPRecord(
-        user_id=current_user.id,
-        xp_amount=xp_earned,
+    # The XP record commits with the attempt; profile and leaderboard totals are written behind
+    xp_event = XPEvent(
+        user_id=claims.user_id,
+        xp_amount=calculate_quiz_xp(score, total_questions),
         source="quiz",
-        description=f"Completed quiz: {quiz.title}"
+        idempotency_key=quiz_attempt_key(quiz_attempt.id),
+        description=f"Completed quiz: {quiz_title}",
+        quiz_percentage=quiz_percentage(score, total_questions),
+        created_at=quiz_attempt.completed_at
     )
-    
-    db.add(xp_record)
-    
-    # Update user profile
-    profile_result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
-    profile = profile_result.scalar_one_or_none()
-    
-    if profile:
-        profile.total_xp += xp_earned
-        # Update streak logic could be added here
-    
+    await record_xp(db, xp_event)
     await db.commit()
+    replica_router.mark_write(claims.user_id, response)
+    await xp_events.publish(xp_event)
     
     return quiz_attempt
 
 @router.get("/attempts/my", response_model=List[QuizAttemptSchema])
 async def get_my_quiz_attempts(
-    current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    response: Response,
+    page: PageParams = Depends(),
+    claims: TokenClaims = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    """Get current user's quiz attempts"""
-    result = await db.execute(
-        select(QuizAttempt).where(QuizAttempt.user_id == current_user.id)
-        .order_by(QuizAttempt.completed_at.desc())
-    )
-    attempts = result.scalars().all()
+    """Get current user's quiz attempts (cursor-paginated, newest first)"""
+    query = select(QuizAttempt).where(QuizAttempt.user_id == claims.user_id)
+    attempts = await paginate(db, query, (QuizAttempt.completed_at, QuizAttempt.id), page, response, descending=True)
     
-    return attempts
+    return json_bytes_response(dump_rows(attempts, QUIZ_ATTEMPT_FIELDS), response)
 
-def calculate_quiz_xp(score: int, total_questions: int) -> int:
-    """Calculate XP earned from quiz performance"""
-    if total_questions == 0:
-        return 0
-    
-    percentage = (score / total_questions) * 100
-    
-    # Base XP calculation
-    if percentage >= 90:
-        return 100  # Excellent
-    elif percentage >= 80:
-        return 75   # Good
-    elif percentage >= 70:
-        return 50   # Average
-    elif percentage >= 60:
-        return 25   # Below average
-    else:
-        return 10   # Poor (participation points) 
\ No newline at end of file
+def grade_answers(answer_key: Dict[int, str], answers: Dict[int, str]) -> int:
+    """Count answers matching the key; answers to questions not in the quiz are ignored"""
+    return sum(
+        1 for question_id, answer in answers.items()
+        if question_id in answer_key and answer.strip().upper() == (answer_key[question_id] or "").strip().upper()
+    )
@@ -0,0 +1,43 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import literal, Integer
+from ..database import get_read_db
+from ..schemas import SearchHit
+from ..pagination import PageParams, decode_cursor, encode_cursor, NEXT_CURSOR_HEADER
+from ..search import search_engine, search_terms, SearchQuery, RESOURCE, QUESTION, MAX_SEARCH_OFFSET
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+@router.get("/", response_model=List[SearchHit])
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    grade: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    type: Optional[str] = Query(None, pattern=f"^({RESOURCE}|{QUESTION})$"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Search resources and quiz questions, best matches first (cursor-paginated)"""
+    # Results are ranked, not keyed, so the cursor carries the offset
+    offset = decode_cursor(page.cursor, (literal(0, Integer),))[0] if page.cursor else 0
+    if not isinstance(offset, int) or not 0 <= offset < MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
+    query = SearchQuery(
+        text=q,
+        terms=tuple(search_terms(q)),
+        grade=grade,
+        subject_id=subject_id,
+        types=(type,) if type else (RESOURCE, QUESTION)
+    )
+    
+    hits = await search_engine.search(db, query, offset, page.limit + 1)
+    
+    if len(hits) > page.limit:
+        hits = hits[:page.limit]
+        if offset + page.limit < MAX_SEARCH_OFFSET:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor([offset + page.limit])
+    
+    return hits
@@ -1,32 +1,36 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from ..database import get_db
+from sqlalchemy import select, func
+from sqlalchemy.orm import undefer
+from ..database import get_read_db, replica_router
 from ..models import Subject, Resource
-from ..schemas import Subject as SubjectSchema, Resource as ResourceSchema
+from ..schemas import Subject as SubjectSchema, Resource as ResourceSchema, ResourceSummary
 from ..auth import get_current_active_user
+from ..pagination import PageParams, paginate
+from ..http_cache import etag_matches
+from ..resource_content import body_hash, choose_encoding, parse_range, iter_chunks, read_body, peek, RangeNotSatisfiable
 
 router = APIRouter(prefix="/subjects", tags=["subjects"])
 
 @router.get("/", response_model=List[SubjectSchema])
 async def get_subjects(
+    response: Response,
     grade: int = None,
-    db: AsyncSession = Depends(get_db)
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all subjects, optionally filtered by grade"""
+    """Get all subjects, optionally filtered by grade (cursor-paginated)"""
     query = select(Subject).where(Subject.is_active == True)
     
     if grade is not None:
         query = query.where(Subject.grade == grade)
     
-    result = await db.execute(query)
-    subjects = result.scalars().all()
-    
-    return subjects
+    return await paginate(db, query, (Subject.id,), page, response)
 
 @router.get("/{subject_id}", response_model=SubjectSchema)
-async def get_subject(subject_id: int, db: AsyncSession = Depends(get_db)):
+async def get_subject(subject_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a specific subject by ID"""
     result = await db.execute(select(Subject).where(Subject.id == subject_id))
     subject = result.scalar_one_or_none()
@@ -39,13 +43,15 @@ async def get_subject(subject_id: int, db: AsyncSession = Depends(get_db)):
     
     return subject
 
-@router.get("/{subject_id}/resources", response_model=List[ResourceSchema])
+@router.get("/{subject_id}/resources", response_model=List[ResourceSummary])
 async def get_subject_resources(
     subject_id: int,
+    response: Response,
     resource_type: str = None,
-    db: AsyncSession = Depends(get_db)
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get resources for a specific subject"""
+    """Get resource metadata for a specific subject (cursor-paginated); bodies come from the content endpoint"""
     # First check if subject exists
     subject_result = await db.execute(select(Subject).where(Subject.id == subject_id))
     subject = subject_result.scalar_one_or_none()
@@ -56,21 +62,20 @@ async def get_subject_resources(
             detail="Subject not found"
         )
     
-    # Get resources
+    # Get resources (content columns are deferred, so no bodies are loaded)
     query = select(Resource).where(Resource.subject_id == subject_id)
     
     if resource_type:
         query = query.where(Resource.resource_type == resource_type)
     
-    result = await db.execute(query)
-    resources = result.scalars().all()
-    
-    return resources
+    return await paginate(db, query, (Resource.created_at, Resource.id), page, response)
 
 @router.get("/resources/{resource_id}", response_model=ResourceSchema)
-async def get_resource(resource_id: int, db: AsyncSession = Depends(get_db)):
+async def get_resource(resource_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a specific resource by ID"""
-    result = await db.execute(select(Resource).where(Resource.id == resource_id))
+    result = await db.execute(
+        select(Resource).options(undefer(Resource.content)).where(Resource.id == resource_id)
+    )
     resource = result.scalar_one_or_none()
     
     if not resource:
@@ -79,4 +84,93 @@ async def get_resource(resource_id: int, db: AsyncSession = Depends(get_db)):
             detail="Resource not found"
         )
     
-    return resource 
\ No newline at end of file
+    return resource
+
+@router.get("/resources/{resource_id}/content")
+async def get_resource_content(
+    resource_id: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Stream a resource body, pre-compressed when the client accepts it, with byte Range support"""
+    result = await db.execute(
+        select(
+            Resource.content_hash,
+            Resource.content_size,
+            func.length(Resource.content_gzip).label("gzip_size"),
+            func.length(Resource.content_br).label("br_size")
+        ).where(Resource.id == resource_id)
+    )
+    meta = result.one_or_none()
+    
+    if meta is None:
+        raise not_found()
+    
+    # Ranges are served from the identity body only
+    sizes = {"br": meta.br_size, "gzip": meta.gzip_size, None: meta.content_size}
+    available = [coding for coding in ("br", "gzip") if sizes[coding] is not None]
+    encoding = None if range_header else choose_encoding(accept_encoding, available)
+    
+    content_hash = meta.content_hash
+    body = None
+    if content_hash is None:
+        # Row written before content fields existed (see the backfill-resource-content
+        # command): the body is needed whole to hash it
+        content = await db.scalar(select(Resource.content).where(Resource.id == resource_id))
+        if content is None:
+            raise not_found()
+        body = content.encode("utf-8")
+        content_hash = body_hash(body)
+    size = len(body) if body is not None else sizes[encoding]
+    
+    etag = f'"{content_hash}-{encoding}"' if encoding else f'"{content_hash}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    
+    byte_range = None
+    if range_header and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"}
+            )
+    start, end = byte_range or (0, size - 1)
+    
+    if body is not None:
+        chunks = iter_chunks(body, start, end)
+    else:
+        # The body is read in ranges as it is sent, never loaded whole. The
+        # first chunk is read now so a resource deleted (or replaced) since
+        # the metadata query is still a clean error rather than a cut stream.
+        chunks = read_body(replica_router.session, resource_id, encoding, content_hash, start, end)
+        first, chunks = await peek(chunks)
+        if first is None and size > 0:
+            if await db.scalar(select(Resource.id).where(Resource.id == resource_id)) is None:
+                raise not_found()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Resource changed; retry")
+    
+    media_type = "text/plain; charset=utf-8"
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range is None:
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
+    
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        chunks,
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
+
+def not_found() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found")
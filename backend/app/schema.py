@@ -0,0 +1,140 @@
+"""
+Schema versioning: migration lock, online index helpers and the startup check.
+
+Schema changes are Alembic migrations (migrations/versions); workers never
+create tables themselves. At startup they only compare the database's
+revision with the migration head, unless AUTO_MIGRATE is set.
+
+Alembic is imported inside the functions that use it, so importing the app
+(scripts, the CLI, test runs) does not load it.
+"""
+import asyncio
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Set
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+if TYPE_CHECKING:
+    from alembic.config import Config
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# pg_advisory_lock key held while migrations run ("ceyquest" in ASCII)
+MIGRATION_LOCK_KEY = 0x6365797175657374
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+def alembic_config() -> "Config":
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    # Leave the application's logging alone when migrating from a worker
+    config.attributes["configure_logger"] = False
+    return config
+
+@contextmanager
+def migration_lock(connection: Connection) -> Iterator[None]:
+    """
+    Let only one migrator run at a time. On PostgreSQL a session-level
+    advisory lock makes concurrent migrators wait, then find the schema
+    already at head; SQLite serialises writers itself.
+    """
+    if connection.dialect.name != "postgresql":
+        yield
+        return
+
+    connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    connection.commit()
+    try:
+        yield
+    finally:
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
+
+def create_index_online(index_name: str, table_name: str, columns: List, unique: bool = False, **kw) -> None:
+    """
+    op.create_index without blocking writes: CREATE INDEX CONCURRENTLY on
+    PostgreSQL (outside the migration's transaction), a plain index elsewhere.
+
+    An invalid index left behind by an interrupted concurrent build is
+    dropped first, so a failed migration can simply be re-run.
+    """
+    from alembic import op
+
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.create_index(index_name, table_name, columns, unique=unique, **kw)
+        return
+
+    # Offline (--sql) scripts cannot look; an operator re-running one drops the index by hand
+    invalid = not op.get_context().as_sql and bind.execute(
+        text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": index_name}
+    ).first()
+    with op.get_context().autocommit_block():
+        if invalid:
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+        op.create_index(index_name, table_name, columns, unique=unique, postgresql_concurrently=True, **kw)
+
+def drop_index_online(index_name: str, table_name: str) -> None:
+    """op.drop_index without blocking reads or writes on PostgreSQL"""
+    from alembic import op
+
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(index_name, table_name=table_name)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+
+def add_unique_constraint_online(constraint_name: str, table_name: str, columns: List[str]) -> None:
+    """
+    Unique constraint without blocking writes while it is checked: on
+    PostgreSQL the unique index is built CONCURRENTLY, then attached as the
+    constraint. SQLite cannot add constraints in place, so the table is
+    rebuilt (batch mode).
+    """
+    from alembic import op
+
+    if op.get_bind().dialect.name != "postgresql":
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.create_unique_constraint(constraint_name, columns)
+        return
+
+    create_index_online(constraint_name, table_name, columns, unique=True)
+    op.execute(f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint_name} UNIQUE USING INDEX {constraint_name}")
+
+def expected_revisions() -> Set[str]:
+    """Head revision(s) of the migration scripts shipped with this build"""
+    from alembic.script import ScriptDirectory
+
+    return set(ScriptDirectory.from_config(alembic_config()).get_heads())
+
+async def current_revisions(engine: AsyncEngine) -> Set[str]:
+    from alembic.runtime.migration import MigrationContext
+
+    async with engine.connect() as conn:
+        return set(await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_heads()))
+
+async def check_schema(engine: AsyncEngine) -> None:
+    """Refuse to serve against a database that is not migrated to this build's head"""
+    current = await current_revisions(engine)
+    expected = expected_revisions()
+    if current != expected:
+        raise SchemaVersionError(
+            f"Database schema is at {sorted(current) or 'no revision'}, this build expects {sorted(expected)}. "
+            "Run `alembic upgrade head` (or set AUTO_MIGRATE=true)."
+        )
+
+async def upgrade_schema() -> None:
+    """Migrate to head; concurrent callers wait on the migration lock"""
+    from alembic import command
+
+    # migrations/env.py runs its own event loop, so migrate from a worker thread
+    await asyncio.to_thread(command.upgrade, alembic_config(), "head")
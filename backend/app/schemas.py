@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # User schemas
@@ -84,6 +84,20 @@ class Resource(ResourceBase):
     class Config:
         from_attributes = True
 
+class ResourceSummary(BaseModel):
+    """Resource metadata for listings; the body is served by the content endpoint"""
+    id: int
+    subject_id: int
+    title: str
+    resource_type: Optional[str] = None
+    chapter: Optional[str] = None
+    page_number: Optional[int] = None
+    content_size: Optional[int] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
 # Quiz schemas
 class QuizBase(BaseModel):
     title: str
@@ -124,6 +138,11 @@ class QuizQuestion(QuizQuestionBase):
     class Config:
         from_attributes = True
 
+class QuizQuestionPublic(QuizQuestionBase):
+    """Question as shown to students taking the quiz (no answer)"""
+    id: int
+    quiz_id: int
+
 # Quiz Attempt schemas
 class QuizAttemptBase(BaseModel):
     quiz_id: int
@@ -132,8 +151,11 @@ class QuizAttemptBase(BaseModel):
     correct_answers: int
     time_taken: Optional[int] = None
 
-class QuizAttemptCreate(QuizAttemptBase):
-    pass
+class QuizAttemptCreate(BaseModel):
+    # The quiz is the one in the URL path, so the body does not repeat its id.
+    # Chosen option ("A"-"D") per question id; the attempt is graded on the server
+    answers: Dict[int, str]
+    time_taken: Optional[int] = None
 
 class QuizAttempt(QuizAttemptBase):
     id: int
@@ -185,14 +207,38 @@ class DashboardStats(BaseModel):
     average_score: float
     rank_in_grade: Optional[int] = None
 
+class RankNeighbour(BaseModel):
+    user_id: int
+    total_xp: int
+    rank: int
+
+class RankInfo(BaseModel):
+    grade: int
+    rank: int
+    total_users: int
+    percentile: float
+    around: List[RankNeighbour]
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 class TokenData(BaseModel):
     email: Optional[str] = None
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+class TokenClaims(BaseModel):
+    """Identity carried by an access token; grade is a snapshot from when it was issued"""
+    user_id: int
+    email: str
+    grade: Optional[int] = None
+    is_active: bool = True
+    version: int = 0
+
 # AI Chat schemas
 class ChatMessage(BaseModel):
     message: str
@@ -201,4 +247,25 @@ class ChatMessage(BaseModel):
 
 class ChatResponse(BaseModel):
     response: str
-    sources: Optional[List[str]] = None 
\ No newline at end of file
+    sources: Optional[List[str]] = None 
+
+# AI question pool schemas
+class QuizGenerationJob(BaseModel):
+    subject: str
+    topic: str
+    grade: int
+    difficulty: str = "medium"
+    count: int = Field(default=10, ge=1, le=100)
+
+# Search schemas
+class SearchHit(BaseModel):
+    type: str  # "resource" or "question"
+    id: int
+    title: str
+    # HTML-escaped excerpt with matches wrapped in <mark>
+    snippet: Optional[str] = None
+    subject_id: int
+    grade: int
+    chapter: Optional[str] = None
+    quiz_id: Optional[int] = None
+    score: float
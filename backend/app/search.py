@@ -0,0 +1,446 @@
+import asyncio
+import html
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+from sqlalchemy import select, func, desc, literal, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .embeddings import WORD_CHARS, word_tokens
+from .models import Resource, Subject, Quiz, QuizQuestion
+from .refreshing_index import RefreshingIndex
+from .schemas import SearchHit
+
+RESOURCE = "resource"
+QUESTION = "question"
+
+# Tables a search result is built from; a change to any of them makes the
+# in-memory index stale
+SEARCH_TABLES = ("resources", "quiz_questions", "quizzes", "subjects")
+
+# PostgreSQL-only search columns (filled by triggers) and indexes created by
+# migration 0006. They are not mapped (SQLite has no tsvector), so
+# autogenerate must ignore them.
+UNMANAGED_SCHEMA_OBJECTS = frozenset({
+    "search_vector",
+    "ix_resources_search_vector",
+    "ix_resources_title_trgm",
+    "ix_resources_chapter_trgm",
+    "ix_quiz_questions_search_vector",
+    "ix_quiz_questions_question_text_trgm",
+})
+
+# Curriculum text mixes Sinhala, Tamil and English; the "simple" configuration
+# lowercases without language-specific stemming, so it works for all three
+TEXT_SEARCH_CONFIG = "simple"
+
+# Deepest result offset served; searches are for finding, not browsing
+MAX_SEARCH_OFFSET = 1000
+
+SNIPPET_CHARS = 200
+
+# Highlight markers (private-use characters) used by ts_headline; replaced by
+# <mark> after the headline is HTML-escaped
+_START_SEL = "\ue000"
+_STOP_SEL = "\ue001"
+
+def search_terms(text: str) -> List[str]:
+    """
+    Casefolded word tokens (the chat retriever's tokenizer, which keeps
+    Sinhala and Tamil words whole); also the tokenizer of the in-memory index
+    """
+    return word_tokens(text)
+
+class SearchQuery(NamedTuple):
+    text: str
+    terms: Tuple[str, ...]
+    grade: Optional[int] = None
+    subject_id: Optional[int] = None
+    types: Tuple[str, ...] = (RESOURCE, QUESTION)
+
+class _Match(NamedTuple):
+    type: str
+    id: int
+    score: float
+
+def _merge(matches: Iterable[_Match], offset: int, limit: int) -> List[_Match]:
+    ordered = sorted(matches, key=lambda match: (-match.score, match.type, match.id))
+    return ordered[offset:offset + limit]
+
+def highlight(text: Optional[str], terms: Sequence[str], max_chars: int = SNIPPET_CHARS) -> Optional[str]:
+    """
+    HTML-escaped excerpt of `text` around the first matching word, with words
+    starting with any of the terms wrapped in <mark>
+    """
+    if not text:
+        return None
+    pattern = re.compile(
+        rf"(?<![{WORD_CHARS}])(?:" + "|".join(re.escape(term) for term in terms) + rf")[{WORD_CHARS}]*",
+        re.IGNORECASE
+    ) if terms else None
+    first = pattern.search(text) if pattern else None
+
+    start = 0
+    if first is not None and first.start() > max_chars // 3:
+        start = first.start() - max_chars // 3
+    excerpt = text[start:start + max_chars]
+
+    marked = []
+    position = 0
+    for match in (pattern.finditer(excerpt) if pattern else ()):
+        marked.append(html.escape(excerpt[position:match.start()]))
+        marked.append(f"<mark>{html.escape(match.group())}</mark>")
+        position = match.end()
+    marked.append(html.escape(excerpt[position:]))
+
+    return ("…" if start > 0 else "") + "".join(marked) + ("…" if start + max_chars < len(text) else "")
+
+def _markup_headline(headline: Optional[str]) -> Optional[str]:
+    if headline is None:
+        return None
+    return html.escape(headline).replace(_START_SEL, "<mark>").replace(_STOP_SEL, "</mark>")
+
+def _question_title(text: str) -> str:
+    return text if len(text) <= 120 else text[:117] + "..."
+
+async def _page_hits(
+    db: AsyncSession,
+    page: List[_Match],
+    terms: Sequence[str],
+    resource_snippet: str,
+    headline=None
+) -> List[SearchHit]:
+    """
+    Load and highlight the rows of one result page, in page order.
+
+    resource_snippet picks what resource snippets show: "headline" (the
+    database-built `headline` expression), "content" or "title"
+    (highlighted here).
+    """
+    hits: Dict[Tuple[str, int], dict] = {}
+
+    resource_ids = [match.id for match in page if match.type == RESOURCE]
+    if resource_ids:
+        snippet = {"headline": headline, "content": Resource.content, "title": Resource.title}[resource_snippet]
+        result = await db.execute(
+            select(Resource.id, Resource.title, Resource.chapter, Resource.subject_id, Subject.grade, snippet.label("snippet"))
+            .join(Subject, Subject.id == Resource.subject_id)
+            .where(Resource.id.in_(resource_ids))
+        )
+        for row in result:
+            hits[(RESOURCE, row.id)] = {
+                "title": row.title,
+                "chapter": row.chapter,
+                "subject_id": row.subject_id,
+                "grade": row.grade,
+                "snippet": _markup_headline(row.snippet) if resource_snippet == "headline" else highlight(row.snippet, terms),
+            }
+
+    question_ids = [match.id for match in page if match.type == QUESTION]
+    if question_ids:
+        result = await db.execute(
+            select(QuizQuestion.id, QuizQuestion.question_text, QuizQuestion.quiz_id, Quiz.subject_id, Subject.grade)
+            .join(Quiz, Quiz.id == QuizQuestion.quiz_id)
+            .join(Subject, Subject.id == Quiz.subject_id)
+            .where(QuizQuestion.id.in_(question_ids))
+        )
+        for row in result:
+            hits[(QUESTION, row.id)] = {
+                "title": _question_title(row.question_text),
+                "quiz_id": row.quiz_id,
+                "subject_id": row.subject_id,
+                "grade": row.grade,
+                "snippet": highlight(row.question_text, terms),
+            }
+
+    return [
+        SearchHit(type=match.type, id=match.id, score=match.score, **hits[(match.type, match.id)])
+        for match in page if (match.type, match.id) in hits
+    ]
+
+class PostgresSearchBackend:
+    """
+    Search over the tsvector columns and GIN indexes from migration 0006.
+
+    Words are matched as prefixes and ranked with ts_rank_cd (title, chapter
+    and body weighted A/B/C). When no row matches, titles, chapters and
+    question texts are matched by trigram word similarity instead, which
+    tolerates typos. Only the page being returned is highlighted.
+    """
+
+    HEADLINE_OPTIONS = f'StartSel={_START_SEL}, StopSel={_STOP_SEL}, MaxWords=30, MinWords=10, MaxFragments=2'
+
+    def _tsquery(self, query: SearchQuery):
+        return func.to_tsquery(TEXT_SEARCH_CONFIG, " & ".join(f"{term}:*" for term in query.terms))
+
+    def _resource_filters(self, query: SearchQuery) -> list:
+        filters = [Subject.is_active == True]
+        if query.grade is not None:
+            filters.append(Subject.grade == query.grade)
+        if query.subject_id is not None:
+            filters.append(Resource.subject_id == query.subject_id)
+        return filters
+
+    def _question_filters(self, query: SearchQuery) -> list:
+        filters = [Quiz.is_active == True, Subject.is_active == True]
+        if query.grade is not None:
+            filters.append(Subject.grade == query.grade)
+        if query.subject_id is not None:
+            filters.append(Quiz.subject_id == query.subject_id)
+        return filters
+
+    async def _matches(self, db: AsyncSession, query: SearchQuery, limit: int, fuzzy: bool) -> List[_Match]:
+        matches: List[_Match] = []
+        tsquery = self._tsquery(query)
+
+        if RESOURCE in query.types:
+            if fuzzy:
+                score = func.greatest(
+                    func.word_similarity(query.text, Resource.title),
+                    func.word_similarity(query.text, func.coalesce(Resource.chapter, ""))
+                )
+                condition = literal(query.text).op("<%")(Resource.title) | literal(query.text).op("<%")(Resource.chapter)
+            else:
+                vector = literal_column("resources.search_vector")
+                score = func.ts_rank_cd(vector, tsquery)
+                condition = vector.op("@@")(tsquery)
+            result = await db.execute(
+                select(Resource.id, score.label("score"))
+                .join(Subject, Subject.id == Resource.subject_id)
+                .where(condition, *self._resource_filters(query))
+                .order_by(desc("score"), Resource.id)
+                .limit(limit)
+            )
+            matches.extend(_Match(RESOURCE, row.id, float(row.score)) for row in result)
+
+        if QUESTION in query.types:
+            if fuzzy:
+                score = func.word_similarity(query.text, QuizQuestion.question_text)
+                condition = literal(query.text).op("<%")(QuizQuestion.question_text)
+            else:
+                vector = literal_column("quiz_questions.search_vector")
+                score = func.ts_rank_cd(vector, tsquery)
+                condition = vector.op("@@")(tsquery)
+            result = await db.execute(
+                select(QuizQuestion.id, score.label("score"))
+                .join(Quiz, Quiz.id == QuizQuestion.quiz_id)
+                .join(Subject, Subject.id == Quiz.subject_id)
+                .where(condition, *self._question_filters(query))
+                .order_by(desc("score"), QuizQuestion.id)
+                .limit(limit)
+            )
+            matches.extend(_Match(QUESTION, row.id, float(row.score)) for row in result)
+
+        return matches
+
+    async def search(self, db: AsyncSession, query: SearchQuery, offset: int, limit: int) -> List[SearchHit]:
+        # Each type contributes at most offset + limit rows to the merged ranking
+        matches = await self._matches(db, query, offset + limit, fuzzy=False)
+        fuzzy = not matches
+        if fuzzy:
+            matches = await self._matches(db, query, offset + limit, fuzzy=True)
+        page = _merge(matches, offset, limit)
+        if fuzzy:
+            # Nothing matched the body text, so there is nothing to highlight in it
+            return await _page_hits(db, page, query.terms, resource_snippet="title")
+        headline = func.ts_headline(TEXT_SEARCH_CONFIG, Resource.content, self._tsquery(query), self.HEADLINE_OPTIONS)
+        return await _page_hits(db, page, query.terms, resource_snippet="headline", headline=headline)
+
+class _Document(NamedTuple):
+    type: str
+    id: int
+    subject_id: int
+    grade: int
+    length: float
+
+class InvertedIndex:
+    """
+    In-memory inverted index with BM25 ranking.
+
+    Terms from resource titles, chapters and bodies (weighted 3/2/1) and
+    question texts are posted per document. Query terms match as prefixes
+    via a sorted vocabulary; when a term matches nothing, vocabulary terms
+    with similar character trigrams are used instead.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    FIELD_WEIGHTS = {"title": 3.0, "chapter": 2.0, "body": 1.0}
+    FUZZY_THRESHOLD = 0.4
+
+    def __init__(self):
+        self._documents: List[_Document] = []
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._vocabulary: List[str] = []
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._average_length = 1.0
+
+    @staticmethod
+    def _term_trigrams(term: str) -> Set[str]:
+        padded = f"  {term} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, doc_type: str, doc_id: int, subject_id: int, grade: int, fields: Dict[str, Optional[str]]) -> None:
+        doc = len(self._documents)
+        length = 0.0
+        for field, text in fields.items():
+            if not text:
+                continue
+            weight = self.FIELD_WEIGHTS[field]
+            for term in search_terms(text):
+                postings = self._postings[term]
+                postings[doc] = postings.get(doc, 0.0) + weight
+                length += weight
+        self._documents.append(_Document(doc_type, doc_id, subject_id, grade, length))
+
+    def finish(self) -> None:
+        """Build the vocabulary structures once all documents are added"""
+        self._vocabulary = sorted(self._postings)
+        for term in self._vocabulary:
+            for trigram in self._term_trigrams(term):
+                self._trigrams[trigram].add(term)
+        if self._documents:
+            self._average_length = max(1.0, sum(doc.length for doc in self._documents) / len(self._documents))
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        terms = []
+        for i in range(bisect_left(self._vocabulary, prefix), len(self._vocabulary)):
+            if not self._vocabulary[i].startswith(prefix):
+                break
+            terms.append(self._vocabulary[i])
+        return terms
+
+    def _similar_terms(self, term: str) -> List[str]:
+        trigrams = self._term_trigrams(term)
+        counts: Dict[str, int] = defaultdict(int)
+        for trigram in trigrams:
+            for candidate in self._trigrams.get(trigram, ()):
+                counts[candidate] += 1
+        return [
+            candidate for candidate, shared in counts.items()
+            if shared / len(trigrams | self._term_trigrams(candidate)) >= self.FUZZY_THRESHOLD
+        ]
+
+    def expand(self, term: str) -> List[str]:
+        return self._prefix_terms(term) or self._similar_terms(term)
+
+    def search(self, query: SearchQuery) -> List[_Match]:
+        """Documents matching every query term (after expansion), best first"""
+        scores: Optional[Dict[int, float]] = None
+        total = len(self._documents)
+        for term in query.terms:
+            term_scores: Dict[int, float] = defaultdict(float)
+            for expanded in self.expand(term):
+                postings = self._postings[expanded]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc, frequency in postings.items():
+                    norm = self.K1 * (1 - self.B + self.B * self._documents[doc].length / self._average_length)
+                    term_scores[doc] = max(term_scores[doc], idf * frequency * (self.K1 + 1) / (frequency + norm))
+            if scores is None:
+                scores = dict(term_scores)
+            else:
+                scores = {doc: score + term_scores[doc] for doc, score in scores.items() if doc in term_scores}
+            if not scores:
+                return []
+
+        matches = []
+        for doc, score in (scores or {}).items():
+            document = self._documents[doc]
+            if document.type not in query.types:
+                continue
+            if query.grade is not None and document.grade != query.grade:
+                continue
+            if query.subject_id is not None and document.subject_id != query.subject_id:
+                continue
+            matches.append(_Match(document.type, document.id, score))
+        return matches
+
+class InMemorySearchBackend:
+    """
+    Pure-Python search for SQLite and test setups.
+
+    The index is built from the database on first use, then rebuilt in the
+    background after this process commits a change to a searched table and
+    every `refresh_seconds` (changes from other workers), while searches
+    keep using the previous one.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self._index = RefreshingIndex("search", SEARCH_TABLES, refresh_seconds, self._build)
+
+    async def warm(self, db: AsyncSession) -> None:
+        """Wait for an up-to-date index"""
+        await self._index.ensure_fresh(db)
+
+    async def stop(self) -> None:
+        await self._index.stop()
+
+    async def _build(self, db: AsyncSession) -> InvertedIndex:
+        resources = (await db.execute(
+            select(Resource.id, Resource.subject_id, Subject.grade, Resource.title, Resource.chapter, Resource.content)
+            .join(Subject, Subject.id == Resource.subject_id)
+            .where(Subject.is_active == True)
+        )).all()
+        questions = (await db.execute(
+            select(QuizQuestion.id, Quiz.subject_id, Subject.grade, QuizQuestion.question_text)
+            .join(Quiz, Quiz.id == QuizQuestion.quiz_id)
+            .join(Subject, Subject.id == Quiz.subject_id)
+            .where(Quiz.is_active == True, Subject.is_active == True)
+        )).all()
+
+        def build() -> InvertedIndex:
+            index = InvertedIndex()
+            for row in resources:
+                index.add(RESOURCE, row.id, row.subject_id, row.grade, {"title": row.title, "chapter": row.chapter, "body": row.content})
+            for row in questions:
+                index.add(QUESTION, row.id, row.subject_id, row.grade, {"body": row.question_text})
+            index.finish()
+            return index
+
+        # Tokenizing textbook bodies is CPU-bound; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, build)
+
+    async def search(self, db: AsyncSession, query: SearchQuery, offset: int, limit: int) -> List[SearchHit]:
+        index = await self._index.get(db)
+        page = _merge(index.search(query), offset, limit)
+
+        # Highlight with the terms the query actually matched
+        terms = [expanded for term in query.terms for expanded in index.expand(term)]
+        return await _page_hits(db, page, terms, resource_snippet="content")
+
+class SearchEngine:
+    """Picks the search backend for the database dialect (or `search_backend` setting)"""
+
+    def __init__(self, backend: str, refresh_seconds: float):
+        self.backend = backend
+        self.postgres = PostgresSearchBackend()
+        self.memory = InMemorySearchBackend(refresh_seconds=refresh_seconds)
+
+    def _backend_for(self, db: AsyncSession):
+        if self.backend == "postgres":
+            return self.postgres
+        if self.backend == "memory":
+            return self.memory
+        return self.postgres if db.bind.dialect.name == "postgresql" else self.memory
+
+    async def warm(self, db: AsyncSession) -> None:
+        """Build the in-memory index ahead of the first search, when it is the backend in use"""
+        backend = self._backend_for(db)
+        if backend is self.memory:
+            await backend.warm(db)
+
+    async def stop(self) -> None:
+        await self.memory.stop()
+
+    async def search(self, db: AsyncSession, query: SearchQuery, offset: int, limit: int) -> List[SearchHit]:
+        if not query.terms:
+            return []
+        return await self._backend_for(db).search(db, query, offset, limit)
+
+# Global instance
+search_engine = SearchEngine(
+    backend=settings.search_backend,
+    refresh_seconds=settings.search_index_refresh_seconds
+)
@@ -0,0 +1,36 @@
+"""
+JSON serialization for API responses.
+
+Routes render with orjson (the app's default response class). Hot list
+endpoints go further and skip FastAPI's response_model round trip
+(validate into models, dump back to Python, encode): they serialize the
+selected rows straight to bytes with the fields of their response schema.
+"""
+from typing import Any, Iterable, Optional, Sequence, Tuple, Type
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+def schema_fields(schema: Type[BaseModel]) -> Tuple[str, ...]:
+    """Field names of a response schema, in declaration order"""
+    return tuple(schema.model_fields)
+
+def dump_rows(rows: Iterable[Any], fields: Sequence[str]) -> bytes:
+    """
+    JSON array of objects holding `fields` of each row (ORM object or
+    Row). Values are not validated: rows must already have the schema's
+    types, which holds for columns read straight from the database.
+    """
+    return orjson.dumps(
+        [{field: getattr(row, field) for field in fields} for row in rows],
+        option=orjson.OPT_NON_STR_KEYS
+    )
+
+def json_bytes_response(body: bytes, response: Optional[Response] = None) -> Response:
+    """
+    Response for a pre-serialized JSON body. Headers set on the route's
+    injected `response` (e.g. the pagination cursor) are carried over, as
+    FastAPI drops them when a route returns its own Response.
+    """
+    headers = response.headers if response is not None else None
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,324 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import insert, select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from .auth import invalidate_identity
+from .config import settings
+from .database import SessionLocal, replica_router
+from .leaderboard import activity_day, quiz_percentage, record_activity_day, record_xp_event, upsert
+from .models import Profile, QuizAttempt, XPRecord
+from .rank_index import rank_index
+
+logger = logging.getLogger(__name__)
+
+QUIZ_ATTEMPT_KEY_PREFIX = "quiz_attempt:"
+
+class XPEvent(NamedTuple):
+    user_id: int
+    xp_amount: int
+    source: str
+    # Unique per event, e.g. "quiz_attempt:42"; replays with the same key are ignored
+    idempotency_key: str
+    description: Optional[str] = None
+    # quiz_percentage() of a quiz attempt
+    quiz_percentage: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+def quiz_attempt_key(attempt_id: int) -> str:
+    """Idempotency key of the XP awarded for a quiz attempt"""
+    return f"{QUIZ_ATTEMPT_KEY_PREFIX}{attempt_id}"
+
+def _record_values(event: XPEvent) -> dict:
+    return {
+        "user_id": event.user_id,
+        "xp_amount": event.xp_amount,
+        "source": event.source,
+        "description": event.description,
+        "idempotency_key": event.idempotency_key,
+        "created_at": event.created_at or datetime.utcnow(),
+        "totals_applied": False,
+    }
+
+async def record_xp(db: AsyncSession, event: XPEvent) -> None:
+    """
+    Insert the XP record of an event inside the caller's transaction; the
+    caller commits, then publishes the event.
+
+    The record stays pending until the bus adds it to the profile and
+    leaderboard totals, so XP committed with its source (e.g. a quiz
+    attempt) survives a worker stopping before its queue is flushed.
+    """
+    await db.execute(insert(XPRecord).values(_record_values(event)))
+
+async def apply_xp_events(db: AsyncSession, events: List[XPEvent]) -> List[Tuple[int, int, int]]:
+    """
+    Write a batch of XP events inside the caller's transaction; the caller commits.
+
+    One multi-row insert into xp_records adds the events not recorded yet,
+    then one update claims every record whose totals are still pending. Only
+    the claimed events are summed into per-user deltas for profiles and the
+    leaderboard, so replayed and concurrently swept events count once.
+    Returns (user_id, grade, total_xp) for every leaderboard row changed.
+    """
+    if not events:
+        return []
+
+    await db.execute(
+        upsert(db)(XPRecord)
+        .values([_record_values(event) for event in events])
+        .on_conflict_do_nothing(index_elements=[XPRecord.idempotency_key])
+    )
+    result = await db.execute(
+        update(XPRecord)
+        .where(
+            XPRecord.idempotency_key.in_({event.idempotency_key for event in events}),
+            XPRecord.totals_applied == False
+        )
+        .values(totals_applied=True)
+        .returning(XPRecord.idempotency_key)
+    )
+    recorded = set(result.scalars().all())
+
+    deltas: Dict[int, int] = defaultdict(int)
+    quiz_percentages: Dict[int, List[float]] = defaultdict(list)
+    quiz_days: Dict[int, Set[date]] = defaultdict(set)
+    for event in events:
+        # discard, so an event repeated within the batch is only counted once
+        if event.idempotency_key in recorded:
+            recorded.discard(event.idempotency_key)
+            deltas[event.user_id] += event.xp_amount
+            if event.quiz_percentage is not None:
+                quiz_percentages[event.user_id].append(event.quiz_percentage)
+                quiz_days[event.user_id].add(activity_day(event.created_at or datetime.utcnow()))
+
+    leaderboard_updates = []
+    for user_id, xp_amount in deltas.items():
+        for day in sorted(quiz_days.get(user_id, ())):
+            await record_activity_day(db, user_id, day)
+        profile_result = await db.execute(
+            update(Profile)
+            .where(Profile.user_id == user_id)
+            .values(total_xp=func.coalesce(Profile.total_xp, 0) + xp_amount)
+            .returning(Profile.grade, Profile.current_streak)
+        )
+        profile = profile_result.one_or_none()
+        if profile is None:
+            continue
+
+        percentages = quiz_percentages.get(user_id)
+        total_xp = await record_xp_event(
+            db,
+            user_id=user_id,
+            grade=profile.grade,
+            xp_amount=xp_amount,
+            quiz_percentage=sum(percentages) if percentages else None,
+            current_streak=profile.current_streak,
+            quiz_count=len(percentages) if percentages else 1
+        )
+        leaderboard_updates.append((user_id, profile.grade, total_xp))
+
+    return leaderboard_updates
+
+async def pending_events(db: AsyncSession, created_before: datetime, limit: int) -> List[XPEvent]:
+    """Events of the oldest XP records created before `created_before` whose totals are still pending"""
+    records = (await db.execute(
+        select(XPRecord)
+        .where(XPRecord.totals_applied == False, XPRecord.created_at < created_before)
+        .order_by(XPRecord.created_at)
+        .limit(limit)
+    )).scalars().all()
+
+    # Quiz events carry their score for the leaderboard average
+    attempt_ids = [
+        int(record.idempotency_key[len(QUIZ_ATTEMPT_KEY_PREFIX):]) for record in records
+        if record.idempotency_key.startswith(QUIZ_ATTEMPT_KEY_PREFIX)
+    ]
+    percentages = {
+        row.id: quiz_percentage(row.score, row.total_questions)
+        for row in await db.execute(
+            select(QuizAttempt.id, QuizAttempt.score, QuizAttempt.total_questions).where(QuizAttempt.id.in_(attempt_ids))
+        )
+    } if attempt_ids else {}
+
+    events = []
+    for record in records:
+        percentage = None
+        if record.idempotency_key.startswith(QUIZ_ATTEMPT_KEY_PREFIX):
+            percentage = percentages.get(int(record.idempotency_key[len(QUIZ_ATTEMPT_KEY_PREFIX):]))
+        events.append(XPEvent(
+            user_id=record.user_id,
+            xp_amount=record.xp_amount,
+            source=record.source,
+            idempotency_key=record.idempotency_key,
+            description=record.description,
+            quiz_percentage=percentage,
+            created_at=record.created_at
+        ))
+    return events
+
+class XPEventBus:
+    """
+    Write-behind queue for XP events.
+
+    Request handlers publish events and return; a background worker writes
+    them in batches of up to `flush_size` events, or whatever has arrived
+    after `flush_interval` seconds, one transaction per batch. Failed batches
+    are retried (idempotency keys make that safe) and stop() flushes
+    everything still queued. When the bus is not running, events are written
+    immediately instead.
+
+    Events recorded with record_xp() are never lost with the queue: every
+    `sweep_interval` seconds (and at start) records still pending after that
+    long are applied, e.g. those queued by a worker that crashed.
+    """
+
+    def __init__(self, flush_size: int, flush_interval: float, queue_size: int, sweep_interval: float, enabled: bool = True):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.sweep_interval = sweep_interval
+        self.enabled = enabled
+        self._queue: Optional["asyncio.Queue[Optional[XPEvent]]"] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._stopping
+
+    async def start(self) -> None:
+        if self._sweeper is None:
+            # Sweeps run even when the queue is disabled, for direct writes that failed
+            self._sweeper = asyncio.create_task(self._sweep_periodically())
+        if self.enabled and self._task is None:
+            # Created here so the queue belongs to the running event loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._full = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop sweeping, flush every queued event, then stop the worker"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._queue.put(None)
+        self._full.set()
+        await self._task
+        self._task = None
+        self._queue = None
+        self._full = None
+
+    async def publish(self, event: XPEvent) -> None:
+        """Queue an XP event (waits for space when the queue is full)"""
+        if event.created_at is None:
+            event = event._replace(created_at=datetime.utcnow())
+        if not self.running:
+            try:
+                await self.flush([event])
+            except Exception:
+                # The caller's request has committed; a recorded event is applied by the sweep
+                logger.exception("Error writing XP event %s", event.idempotency_key)
+            return
+        await self._queue.put(event)
+        if self._queue.qsize() >= self.flush_size:
+            self._full.set()
+
+    async def flush(self, events: List[XPEvent]) -> None:
+        """Write a batch of events in one transaction"""
+        async with SessionLocal() as db:
+            leaderboard_updates = await apply_xp_events(db, events)
+            await db.commit()
+
+        for user_id in {event.user_id for event in events}:
+            invalidate_identity(user_id)
+            replica_router.mark_write(user_id)
+        for user_id, grade, total_xp in leaderboard_updates:
+            rank_index.update(user_id, grade, total_xp)
+
+    async def sweep(self, min_age: Optional[float] = None) -> int:
+        """
+        Apply XP records pending for longer than `min_age` seconds (default:
+        the sweep interval); younger ones may still be queued. Returns the
+        number of events written.
+        """
+        created_before = datetime.utcnow() - timedelta(seconds=self.sweep_interval if min_age is None else min_age)
+        swept = 0
+        while True:
+            async with SessionLocal() as db:
+                events = await pending_events(db, created_before, self.flush_size)
+            if not events:
+                return swept
+            # Claimed records are no longer pending, so every pass makes progress
+            await self.flush(events)
+            swept += len(events)
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            try:
+                swept = await self.sweep()
+                if swept:
+                    logger.warning("Applied %d pending XP records", swept)
+            except Exception:
+                logger.exception("Error sweeping pending XP records")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if first is not None and self._queue.qsize() + 1 < self.flush_size:
+                # Give a burst the chance to fill the batch
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = [first]
+            while len(batch) < self.flush_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # None is the stop sentinel; it is always the last item queued
+            done = None in batch
+            events = [event for event in batch if event is not None]
+            if events:
+                await self._flush_with_retry(events)
+            if done:
+                return
+
+    async def _flush_with_retry(self, events: List[XPEvent]) -> None:
+        delay = self.flush_interval
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                await self.flush(events)
+                return
+            except Exception:
+                logger.exception("Error flushing %d XP events (attempt %d)", len(events), attempts)
+                if self._stopping and attempts >= 3:
+                    logger.error("Leaving %d XP events to the pending record sweep at shutdown", len(events))
+                    return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+# Global instance
+xp_events = XPEventBus(
+    flush_size=settings.xp_event_flush_size,
+    flush_interval=settings.xp_event_flush_interval_seconds,
+    queue_size=settings.xp_event_queue_size,
+    sweep_interval=settings.xp_event_sweep_interval_seconds,
+    enabled=settings.xp_event_bus_enabled
+)
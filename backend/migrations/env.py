@@ -0,0 +1,70 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.models import Base
+from app.schema import migration_lock
+from app.search import UNMANAGED_SCHEMA_OBJECTS
+
+config = context.config
+
+# Skipped when migrating from inside the app (see app/schema.py)
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def include_object(object, name, type_, reflected, compare_to):
+    # PostgreSQL search columns/indexes are managed by hand in migrations
+    return not (type_ in ("column", "index") and name in UNMANAGED_SCHEMA_OBJECTS)
+
+def run_migrations_offline() -> None:
+    """Emit migration SQL to stdout without connecting (alembic upgrade --sql)"""
+    context.configure(
+        url=settings.database_url,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite cannot ALTER most constraints in place
+        render_as_batch=connection.dialect.name == "sqlite",
+        # Commit each revision on its own, so online index builds
+        # (autocommit blocks) do not commit half of a larger transaction
+        transaction_per_migration=True,
+    )
+
+    with migration_lock(connection):
+        with context.begin_transaction():
+            context.run_migrations()
+
+async def run_async_migrations() -> None:
+    connectable = create_async_engine(settings.database_url, poolclass=pool.NullPool)
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+def run_migrations_online() -> None:
+    asyncio.run(run_async_migrations())
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
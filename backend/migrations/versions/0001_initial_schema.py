@@ -0,0 +1,170 @@
+"""Initial schema
+
+Baseline of the tables created by Base.metadata.create_all before
+migrations were introduced. Databases created that way should be stamped
+with `alembic stamp 0001`; the question pool and leaderboard changes made
+since then are applied by 0001a and 0001b.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table('subjects',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('grade', sa.Integer(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('icon_url', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_subjects_id', 'subjects', ['id'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+
+    op.create_table('leaderboards',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('grade', sa.Integer(), nullable=False),
+    sa.Column('total_xp', sa.Integer(), nullable=True),
+    sa.Column('current_streak', sa.Integer(), nullable=True),
+    sa.Column('quizzes_completed', sa.Integer(), nullable=True),
+    sa.Column('average_score', sa.Float(), nullable=True),
+    sa.Column('last_updated', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_leaderboards_id', 'leaderboards', ['id'], unique=False)
+
+    op.create_table('profiles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('grade', sa.Integer(), nullable=False),
+    sa.Column('school', sa.String(), nullable=True),
+    sa.Column('photo_url', sa.String(), nullable=True),
+    sa.Column('total_xp', sa.Integer(), nullable=True),
+    sa.Column('current_streak', sa.Integer(), nullable=True),
+    sa.Column('longest_streak', sa.Integer(), nullable=True),
+    sa.Column('last_login', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_profiles_id', 'profiles', ['id'], unique=False)
+
+    op.create_table('quizzes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('time_limit', sa.Integer(), nullable=True),
+    sa.Column('total_questions', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_quizzes_id', 'quizzes', ['id'], unique=False)
+
+    op.create_table('resources',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('resource_type', sa.String(), nullable=True),
+    sa.Column('chapter', sa.String(), nullable=True),
+    sa.Column('page_number', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_resources_id', 'resources', ['id'], unique=False)
+
+    op.create_table('xp_records',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('xp_amount', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_xp_records_id', 'xp_records', ['id'], unique=False)
+
+    op.create_table('quiz_attempts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('total_questions', sa.Integer(), nullable=False),
+    sa.Column('correct_answers', sa.Integer(), nullable=False),
+    sa.Column('time_taken', sa.Integer(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_quiz_attempts_id', 'quiz_attempts', ['id'], unique=False)
+
+    op.create_table('quiz_questions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('question_text', sa.Text(), nullable=False),
+    sa.Column('option_a', sa.String(), nullable=False),
+    sa.Column('option_b', sa.String(), nullable=False),
+    sa.Column('option_c', sa.String(), nullable=False),
+    sa.Column('option_d', sa.String(), nullable=False),
+    sa.Column('correct_answer', sa.String(), nullable=False),
+    sa.Column('explanation', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_quiz_questions_id', 'quiz_questions', ['id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_quiz_questions_id', table_name='quiz_questions')
+    op.drop_table('quiz_questions')
+
+    op.drop_index('ix_quiz_attempts_id', table_name='quiz_attempts')
+    op.drop_table('quiz_attempts')
+
+    op.drop_index('ix_xp_records_id', table_name='xp_records')
+    op.drop_table('xp_records')
+
+    op.drop_index('ix_resources_id', table_name='resources')
+    op.drop_table('resources')
+
+    op.drop_index('ix_quizzes_id', table_name='quizzes')
+    op.drop_table('quizzes')
+
+    op.drop_index('ix_profiles_id', table_name='profiles')
+    op.drop_table('profiles')
+
+    op.drop_index('ix_leaderboards_id', table_name='leaderboards')
+    op.drop_table('leaderboards')
+
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_table('users')
+
+    op.drop_index('ix_subjects_id', table_name='subjects')
+    op.drop_table('subjects')
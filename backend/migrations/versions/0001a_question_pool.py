@@ -0,0 +1,57 @@
+"""AI question pool columns on quiz_questions
+
+Pool entries are questions without a quiz, looked up by normalised subject,
+topic, grade and difficulty and deduplicated by content hash.
+
+Kept directly after the baseline: databases created by create_all after the
+pool was added already have these objects, which are then skipped.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.schema import add_unique_constraint_online, create_index_online
+
+revision = '0001a'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+POOL_COLUMNS = {
+    'subject': sa.String,
+    'topic': sa.String,
+    'grade': sa.Integer,
+    'difficulty': sa.String,
+    'content_hash': sa.String,
+    'times_served': sa.Integer,
+}
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    existing = {column['name']: column for column in inspector.get_columns('quiz_questions')}
+
+    with op.batch_alter_table('quiz_questions') as batch_op:
+        if not existing['quiz_id']['nullable']:
+            batch_op.alter_column('quiz_id', existing_type=sa.Integer(), nullable=True)
+        for name, type_ in POOL_COLUMNS.items():
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, type_(), nullable=True))
+
+    unique_columns = [constraint['column_names'] for constraint in inspector.get_unique_constraints('quiz_questions')]
+    if ['content_hash'] not in unique_columns:
+        add_unique_constraint_online('quiz_questions_content_hash_key', 'quiz_questions', ['content_hash'])
+
+    if 'ix_quiz_questions_pool' not in {index['name'] for index in inspector.get_indexes('quiz_questions')}:
+        create_index_online('ix_quiz_questions_pool', 'quiz_questions', ['subject', 'topic', 'grade', 'difficulty', 'times_served'])
+
+def downgrade() -> None:
+    op.drop_index('ix_quiz_questions_pool', table_name='quiz_questions')
+    # Pool entries have no quiz and cannot be kept once quiz_id is required again
+    op.execute("DELETE FROM quiz_questions WHERE quiz_id IS NULL")
+    with op.batch_alter_table('quiz_questions') as batch_op:
+        batch_op.drop_constraint('quiz_questions_content_hash_key', type_='unique')
+        for name in reversed(list(POOL_COLUMNS)):
+            batch_op.drop_column(name)
+        batch_op.alter_column('quiz_id', existing_type=sa.Integer(), nullable=False)
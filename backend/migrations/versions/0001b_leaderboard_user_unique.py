@@ -0,0 +1,41 @@
+"""One leaderboard row per user, and the per-grade ranking index
+
+The unique user_id is the conflict target of the leaderboard upsert
+(app/leaderboard.py). Duplicate rows left by earlier versions are removed
+first, keeping each user's newest row; `python -m app.cli
+rebuild-leaderboard` recomputes the totals afterwards.
+
+Kept directly after the baseline: databases created by create_all after
+these were added already have them, and they are then skipped.
+
+Revision ID: 0001b
+Revises: 0001a
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.schema import add_unique_constraint_online, create_index_online
+
+revision = '0001b'
+down_revision = '0001a'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    unique_columns = [constraint['column_names'] for constraint in inspector.get_unique_constraints('leaderboards')]
+    if ['user_id'] not in unique_columns:
+        op.execute("""
+            DELETE FROM leaderboards
+            WHERE id NOT IN (SELECT max(id) FROM leaderboards GROUP BY user_id)
+        """)
+        add_unique_constraint_online('leaderboards_user_id_key', 'leaderboards', ['user_id'])
+
+    if 'ix_leaderboards_grade_total_xp' not in {index['name'] for index in inspector.get_indexes('leaderboards')}:
+        create_index_online('ix_leaderboards_grade_total_xp', 'leaderboards', ['grade', sa.literal_column('total_xp DESC')])
+
+def downgrade() -> None:
+    op.drop_index('ix_leaderboards_grade_total_xp', table_name='leaderboards')
+    with op.batch_alter_table('leaderboards') as batch_op:
+        batch_op.drop_constraint('leaderboards_user_id_key', type_='unique')
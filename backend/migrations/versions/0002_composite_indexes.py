@@ -0,0 +1,39 @@
+"""Composite indexes for per-user history and catalog queries
+
+Built CONCURRENTLY on PostgreSQL (see app.schema.create_index_online), so
+live tables stay writable while they build.
+
+Revision ID: 0002
+Revises: 0001b
+Create Date: 2026-10-17
+"""
+import sqlalchemy as sa
+from app.schema import create_index_online, drop_index_online
+
+revision = '0002'
+down_revision = '0001b'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Identity/profile lookups on every authenticated request
+    create_index_online('ix_profiles_user_id', 'profiles', ['user_id'])
+
+    # Catalog filters
+    create_index_online('ix_subjects_grade_is_active', 'subjects', ['grade', 'is_active'])
+    create_index_online('ix_resources_subject_id_resource_type', 'resources', ['subject_id', 'resource_type'])
+    create_index_online('ix_quizzes_subject_id_is_active', 'quizzes', ['subject_id', 'is_active'])
+    create_index_online('ix_quiz_questions_quiz_id', 'quiz_questions', ['quiz_id'])
+
+    # Per-user history, newest first
+    create_index_online('ix_quiz_attempts_user_id_completed_at', 'quiz_attempts', ['user_id', sa.text('completed_at DESC')])
+    create_index_online('ix_xp_records_user_id_created_at', 'xp_records', ['user_id', sa.text('created_at DESC')])
+
+def downgrade() -> None:
+    drop_index_online('ix_xp_records_user_id_created_at', 'xp_records')
+    drop_index_online('ix_quiz_attempts_user_id_completed_at', 'quiz_attempts')
+    drop_index_online('ix_quiz_questions_quiz_id', 'quiz_questions')
+    drop_index_online('ix_quizzes_subject_id_is_active', 'quizzes')
+    drop_index_online('ix_resources_subject_id_resource_type', 'resources')
+    drop_index_online('ix_subjects_grade_is_active', 'subjects')
+    drop_index_online('ix_profiles_user_id', 'profiles')
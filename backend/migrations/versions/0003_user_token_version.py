@@ -0,0 +1,25 @@
+"""Token version for revoking issued JWTs
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.schema import create_index_online, drop_index_online
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('tokens_revoked_at', sa.DateTime(), nullable=True))
+    create_index_online('ix_users_tokens_revoked_at', 'users', ['tokens_revoked_at'])
+
+def downgrade() -> None:
+    drop_index_online('ix_users_tokens_revoked_at', 'users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('tokens_revoked_at')
+        batch_op.drop_column('token_version')
@@ -0,0 +1,23 @@
+"""Idempotency key for XP records written by the XP event bus
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.schema import create_index_online, drop_index_online
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('xp_records', sa.Column('idempotency_key', sa.String(), nullable=True))
+    create_index_online('ix_xp_records_idempotency_key', 'xp_records', ['idempotency_key'], unique=True)
+
+def downgrade() -> None:
+    drop_index_online('ix_xp_records_idempotency_key', 'xp_records')
+    with op.batch_alter_table('xp_records') as batch_op:
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,28 @@
+"""Resource content size, hash and pre-compressed copies
+
+Existing rows are filled in by `python -m app.cli backfill-resource-content`.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('resources', sa.Column('content_size', sa.Integer(), nullable=True))
+    op.add_column('resources', sa.Column('content_hash', sa.String(), nullable=True))
+    op.add_column('resources', sa.Column('content_gzip', sa.LargeBinary(), nullable=True))
+    op.add_column('resources', sa.Column('content_br', sa.LargeBinary(), nullable=True))
+
+def downgrade() -> None:
+    with op.batch_alter_table('resources') as batch_op:
+        batch_op.drop_column('content_br')
+        batch_op.drop_column('content_gzip')
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('content_size')
@@ -0,0 +1,122 @@
+"""Full-text and trigram search indexes (PostgreSQL only)
+
+tsvector columns with GIN indexes for resources and quiz questions, plus
+pg_trgm indexes for typo-tolerant fallback matching. Other databases use
+the in-memory search index (app/search.py).
+
+The columns are plain and nullable, kept up to date by triggers: a STORED
+generated column would rewrite the whole table under an ACCESS EXCLUSIVE
+lock. Existing rows are filled in batches of BATCH_SIZE, each committed
+on its own, before the indexes are built CONCURRENTLY.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from typing import Tuple
+from alembic import op
+from app.schema import create_index_online, drop_index_online
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# tsvector values are capped at 1MB, so very long bodies are indexed up to this many characters
+MAX_INDEXED_CHARS = 250000
+
+BATCH_SIZE = 1000
+
+def add_search_vector(table: str, columns: Tuple[str, ...], vector_sql: str) -> None:
+    """search_vector column on `table`, computed by `vector_sql` from the text `columns`"""
+    function = f"{table}_search_vector"
+    arguments = ", ".join(f"{column} text" for column in columns)
+    row_values = ", ".join(f"NEW.{column}" for column in columns)
+    op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector")
+    op.execute(f"CREATE FUNCTION {function}({arguments}) RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$ SELECT {vector_sql} $$")
+    op.execute(f"""
+        CREATE FUNCTION {function}_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := {function}({row_values});
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute(f"""
+        CREATE TRIGGER {function} BEFORE INSERT OR UPDATE OF {', '.join(columns)} ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {function}_trigger()
+    """)
+
+    # Rows written from here on are filled by the trigger; existing ones in
+    # id order, one short transaction per batch
+    with op.get_context().autocommit_block():
+        op.execute(f"""
+            DO $$
+            DECLARE
+                last_id integer := 0;
+                batch_end integer;
+            BEGIN
+                LOOP
+                    SELECT max(id) INTO batch_end FROM (
+                        SELECT id FROM {table} WHERE id > last_id ORDER BY id LIMIT {BATCH_SIZE}
+                    ) AS batch;
+                    EXIT WHEN batch_end IS NULL;
+                    UPDATE {table} SET search_vector = {function}({', '.join(columns)})
+                    WHERE id > last_id AND id <= batch_end AND search_vector IS NULL;
+                    COMMIT;
+                    last_id := batch_end;
+                END LOOP;
+            END
+            $$
+        """)
+
+def drop_search_vector(table: str) -> None:
+    function = f"{table}_search_vector"
+    op.execute(f"DROP TRIGGER IF EXISTS {function} ON {table}")
+    op.execute(f"DROP FUNCTION IF EXISTS {function}_trigger()")
+    op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+    op.execute(f"DROP FUNCTION IF EXISTS {function}")
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    add_search_vector(
+        'resources',
+        ('title', 'chapter', 'content'),
+        f"""
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(chapter, '')), 'B') ||
+            setweight(to_tsvector('simple', left(coalesce(content, ''), {MAX_INDEXED_CHARS})), 'C')
+        """
+    )
+    # GIN builds are slow on large tables: built CONCURRENTLY, after the
+    # column is filled, so the table stays writable meanwhile
+    create_index_online('ix_resources_search_vector', 'resources', ['search_vector'], postgresql_using='gin')
+    create_index_online('ix_resources_title_trgm', 'resources', ['title'], postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    create_index_online('ix_resources_chapter_trgm', 'resources', ['chapter'], postgresql_using='gin', postgresql_ops={'chapter': 'gin_trgm_ops'})
+
+    add_search_vector(
+        'quiz_questions',
+        ('question_text',),
+        "to_tsvector('simple', coalesce(question_text, ''))"
+    )
+    create_index_online('ix_quiz_questions_search_vector', 'quiz_questions', ['search_vector'], postgresql_using='gin')
+    create_index_online(
+        'ix_quiz_questions_question_text_trgm', 'quiz_questions', ['question_text'],
+        postgresql_using='gin', postgresql_ops={'question_text': 'gin_trgm_ops'}
+    )
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    drop_index_online('ix_quiz_questions_question_text_trgm', 'quiz_questions')
+    drop_index_online('ix_quiz_questions_search_vector', 'quiz_questions')
+    drop_search_vector('quiz_questions')
+    drop_index_online('ix_resources_chapter_trgm', 'resources')
+    drop_index_online('ix_resources_title_trgm', 'resources')
+    drop_index_online('ix_resources_search_vector', 'resources')
+    drop_search_vector('resources')
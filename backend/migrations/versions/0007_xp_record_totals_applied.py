@@ -0,0 +1,34 @@
+"""Track which XP records are applied to profile and leaderboard totals
+
+Quiz XP records are written with their attempt; the totals are written
+behind by the XP event bus, which sweeps up records still pending.
+Existing records were written by the bus with their totals, so they
+default to applied.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.schema import create_index_online, drop_index_online
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # A constant default is kept in the catalog (PostgreSQL 11+), so adding
+    # the column does not rewrite the table
+    op.add_column('xp_records', sa.Column('totals_applied', sa.Boolean(), nullable=False, server_default=sa.true()))
+    create_index_online(
+        'ix_xp_records_pending_created_at', 'xp_records', ['created_at'],
+        postgresql_where=sa.text('totals_applied = false'),
+        sqlite_where=sa.text('totals_applied = 0')
+    )
+
+def downgrade() -> None:
+    drop_index_online('ix_xp_records_pending_created_at', 'xp_records')
+    with op.batch_alter_table('xp_records') as batch_op:
+        batch_op.drop_column('totals_applied')
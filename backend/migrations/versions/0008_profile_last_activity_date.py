@@ -0,0 +1,24 @@
+"""Last quiz day per profile, for quiz streaks
+
+Streaks start counting from the first quiz after this migration; run
+`python -m app.cli rebuild-leaderboard` afterwards to recompute average
+scores as percentages.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('profiles', sa.Column('last_activity_date', sa.Date(), nullable=True))
+
+def downgrade() -> None:
+    with op.batch_alter_table('profiles') as batch_op:
+        batch_op.drop_column('last_activity_date')
@@ -0,0 +1,46 @@
+"""
+Shared test setup.
+
+Settings are read from the environment when `app` is imported, so the
+scratch database and test secrets are configured here, before any test
+module imports the app. Tests run against a fresh SQLite file unless
+TEST_DATABASE_URL points at a (disposable) PostgreSQL database.
+"""
+import os
+import tempfile
+from itertools import count
+
+_scratch_dir = tempfile.mkdtemp(prefix="ceyquest-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", f"sqlite+aiosqlite:///{_scratch_dir}/test.db")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ["AUTO_MIGRATE"] = "true"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import pytest
+from fastapi.testclient import TestClient
+
+_user_ids = count(1)
+
+@pytest.fixture(scope="session")
+def client():
+    """App client; startup migrates the scratch database to head"""
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def register_user(client):
+    """Register a new user and return their Authorization headers"""
+
+    def register(grade: int = 8) -> dict:
+        email = f"student{next(_user_ids)}-{os.getpid()}@ceyquest.lk"
+        response = client.post(
+            "/auth/register",
+            json={"email": email, "password": "correct-horse", "name": "Student", "grade": grade}
+        )
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return register
@@ -0,0 +1,167 @@
+import asyncio
+from typing import Callable, List
+import httpx
+import pytest
+from app.ai_gateway import AIGateway, CircuitBreaker, CircuitOpenError, GatewayBusyError, UpstreamError
+
+URL = "https://gemini.test/v1/models/test:generateContent"
+
+def make_gateway(**overrides) -> AIGateway:
+    options = dict(
+        requests_per_minute=6000,
+        burst=100,
+        max_concurrent_requests=10,
+        queue_timeout=0.2,
+        max_retries=2,
+        backoff_base=0.001,
+        backoff_max=0.01,
+        failure_threshold=3,
+        reset_seconds=0.05,
+    )
+    options.update(overrides)
+    return AIGateway(**options)
+
+def mock_client(responses: List[Callable[[httpx.Request], httpx.Response]]) -> httpx.AsyncClient:
+    """Client answering each request with the next handler (the last one repeats)"""
+    calls = iter(responses)
+    last = responses[-1]
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        return next(calls, last)(request)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+def status(code: int, **headers) -> Callable[[httpx.Request], httpx.Response]:
+    return lambda request: httpx.Response(code, headers=headers, json={})
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_half_open_admits_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    breaker._opened_at -= 1
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_retries_server_errors_then_succeeds():
+    gateway = make_gateway()
+    client = mock_client([status(503), status(500), status(200)])
+
+    response = asyncio.run(gateway.post("chat", client, URL, {}))
+
+    assert response.status_code == 200
+    assert gateway.metrics["chat"].retries == 2
+    assert gateway.circuit.state == "closed"
+
+def test_client_errors_are_not_retried():
+    gateway = make_gateway()
+    client = mock_client([status(400)])
+
+    with pytest.raises(UpstreamError) as raised:
+        asyncio.run(gateway.post("chat", client, URL, {}))
+
+    assert raised.value.status_code == 400
+    assert gateway.metrics["chat"].retries == 0
+    # A rejected request says nothing about Gemini's health
+    assert gateway.circuit.state == "closed"
+
+def test_retry_after_is_honoured():
+    gateway = make_gateway(backoff_max=0.2)
+    client = mock_client([status(429, **{"Retry-After": "0.1"}), status(200)])
+
+    async def timed_call() -> float:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await gateway.post("chat", client, URL, {})
+        return loop.time() - started
+
+    assert asyncio.run(timed_call()) >= 0.1
+
+def test_open_circuit_fails_fast_then_recovers():
+    gateway = make_gateway(max_retries=0)
+    client = mock_client([status(503), status(503), status(503), status(200)])
+
+    async def scenario() -> None:
+        for _ in range(3):
+            with pytest.raises(UpstreamError):
+                await gateway.post("chat", client, URL, {})
+        with pytest.raises(CircuitOpenError):
+            await gateway.post("chat", client, URL, {})
+
+        await asyncio.sleep(0.06)
+        response = await gateway.post("chat", client, URL, {})
+        assert response.status_code == 200
+        assert gateway.circuit.state == "closed"
+
+    asyncio.run(scenario())
+
+def test_shed_probe_releases_the_half_open_slot():
+    gateway = make_gateway(failure_threshold=1, reset_seconds=0.01, max_retries=0, requests_per_minute=60, burst=1, queue_timeout=0.01)
+    client = mock_client([status(503), status(200)])
+
+    async def scenario() -> None:
+        with pytest.raises(UpstreamError):
+            await gateway.post("chat", client, URL, {})
+        await asyncio.sleep(0.02)
+
+        # The probe is admitted by the breaker, then shed by the empty quota
+        with pytest.raises(GatewayBusyError):
+            await gateway.post("chat", client, URL, {})
+        assert gateway.circuit.allow()
+
+    asyncio.run(scenario())
+
+def test_cancelled_probe_releases_the_half_open_slot():
+    gateway = make_gateway(failure_threshold=1, reset_seconds=0.01, max_retries=0)
+
+    async def slow(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={})
+
+    async def scenario() -> None:
+        failing = mock_client([status(503)])
+        with pytest.raises(UpstreamError):
+            await gateway.post("chat", failing, URL, {})
+        await asyncio.sleep(0.02)
+
+        slow_client = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+        probe = asyncio.create_task(gateway.post("chat", slow_client, URL, {}))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert gateway.circuit.allow()
+
+    asyncio.run(scenario())
+
+def test_hedged_request_wins_when_primary_is_slow():
+    gateway = make_gateway(hedge_after=0.02)
+    calls = 0
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(1)
+        return httpx.Response(200, json={})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    response = asyncio.run(asyncio.wait_for(gateway.post("chat", client, URL, {}, hedge=True), 0.5))
+
+    assert response.status_code == 200
+    assert gateway.metrics["chat"].hedge_wins == 1
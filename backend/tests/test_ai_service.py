@@ -0,0 +1,26 @@
+import asyncio
+import pytest
+from app import ai_service as ai_service_module
+from app.ai_gateway import CircuitOpenError
+from app.ai_service import get_ai_service
+
+def test_quiz_batch_surfaces_gateway_errors(monkeypatch):
+    async def unavailable(*args, **kwargs):
+        raise CircuitOpenError("Gemini circuit is open")
+
+    monkeypatch.setattr(ai_service_module.ai_gateway, "post", unavailable)
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(get_ai_service().generate_quiz_questions("Science", "Plants", 8))
+
+def test_malformed_quiz_batch_is_empty(monkeypatch):
+    class Reply:
+        def json(self):
+            return {"candidates": [{"content": {"parts": [{"text": "not json"}]}}]}
+
+    async def reply(*args, **kwargs):
+        return Reply()
+
+    monkeypatch.setattr(ai_service_module.ai_gateway, "post", reply)
+
+    assert asyncio.run(get_ai_service().generate_quiz_questions("Science", "Plants", 8)) == []
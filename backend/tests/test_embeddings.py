@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import insert
+from app.database import SessionLocal
+from app.embeddings import HashingEmbedder
+from app.http_cache import table_versions
+from app.models import Resource, Subject
+from app.rag import passage_retriever
+
+embedder = HashingEmbedder()
+
+@pytest.mark.parametrize("text, tokens", [
+    ("ප්‍රභාසංශ්ලේෂණය සිදුවන්නේ කොහේද", ["ප්‍රභාසංශ්ලේෂණය", "සිදුවන්නේ", "කොහේද"]),
+    ("ஒளிச்சேர்க்கை எங்கு நடைபெறுகிறது?", ["ஒளிச்சேர்க்கை", "எங்கு", "நடைபெறுகிறது"]),
+    ("Where does PHOTOSYNTHESIS happen?", ["where", "photosynthesis", "happen"]),
+])
+def test_tokens_keep_whole_words(text, tokens):
+    assert embedder.tokenize(text) == tokens
+
+# Two passages per language; each question names the topic of the first one
+PASSAGES = {
+    "Sinhala": (
+        "ප්‍රභාසංශ්ලේෂණය ශාක පත්‍ර තුළ හරිතප්‍රද මගින් සිදු කෙරේ",
+        "වාෂ්පීකරණය මගින් ජලය වායුගෝලයට එකතු වේ",
+        "ප්‍රභාසංශ්ලේෂණය සිදුවන්නේ කොහේද",
+    ),
+    "Tamil": (
+        "ஒளிச்சேர்க்கை இலைகளில் உள்ள பச்சையவுருமணிகளில் நடைபெறுகிறது",
+        "ஆவியாதல் மூலம் நீர் வளிமண்டலத்தை அடைகிறது",
+        "ஒளிச்சேர்க்கை எங்கு நடைபெறுகிறது",
+    ),
+}
+
+def test_retrieves_non_latin_passages(client):
+    async def seed():
+        subject_ids = {}
+        async with SessionLocal() as db:
+            for language, (relevant, other, _) in PASSAGES.items():
+                subject_id = (await db.execute(
+                    insert(Subject).values(name=f"Science ({language})", grade=9).returning(Subject.id)
+                )).scalar_one()
+                await db.execute(insert(Resource), [
+                    {"subject_id": subject_id, "title": title, "content": content, "resource_type": "textbook"}
+                    for title, content in (("relevant", relevant), ("other", other))
+                ])
+                subject_ids[language] = subject_id
+            await db.commit()
+        table_versions.bump("resources")
+        return subject_ids
+
+    subject_ids = client.portal.call(seed)
+
+    async def retrieve(language: str):
+        async with SessionLocal() as db:
+            # Chats keep the previous index until the rebuild is done
+            await passage_retriever.warm(db)
+            return await passage_retriever.retrieve(db, PASSAGES[language][2], subject_id=subject_ids[language])
+
+    for language in PASSAGES:
+        passages = client.portal.call(retrieve, language)
+        assert [passage.title for passage in passages][:1] == ["relevant"], language
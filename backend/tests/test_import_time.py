@@ -0,0 +1,30 @@
+"""
+Cold import budget for the app.
+
+Each check imports the app in a fresh interpreter (python -X importtime),
+as a worker does at startup. Override the budget with IMPORT_TIME_BUDGET_MS
+on slow CI machines.
+"""
+import os
+import pytest
+from app.cli import _import_times
+
+BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "1500"))
+
+# Imported on first use (see the lazy imports in ai_service, auth and schema)
+DEFERRED = ("httpx", "passlib", "jose", "alembic")
+
+@pytest.fixture(scope="module")
+def import_times():
+    # The environment from conftest (database URL, secrets) is inherited
+    runs = [_import_times("app.main") for _ in range(3)]
+    # Best of three: import time is noisy
+    return min(runs, key=lambda run: run["app.main"][1])
+
+def test_app_imports_within_budget(import_times):
+    total_ms = import_times["app.main"][1] / 1000
+    assert total_ms <= BUDGET_MS, f"import app.main took {total_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)"
+
+def test_heavy_dependencies_are_deferred(import_times):
+    imported = {name.split(".")[0] for name in import_times}
+    assert not imported.intersection(DEFERRED)
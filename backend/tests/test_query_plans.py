@@ -0,0 +1,170 @@
+"""
+Every query the routers run must be served by an index.
+
+The API is exercised against a seeded database while the SQL it sends is
+recorded; each SELECT is then EXPLAINed and the test fails on a full table
+scan. Loads that read a whole table on purpose (in-process indexes built at
+startup or on refresh) are listed in FULL_TABLE_LOADS.
+"""
+import json
+import re
+from datetime import datetime, timedelta
+from typing import List, Tuple
+import pytest
+from sqlalchemy import event, insert
+from app.database import SessionLocal, engine
+from app.http_cache import table_versions
+from app.models import Base, Leaderboard, Quiz, QuizAttempt, QuizQuestion, Resource, Subject, XPRecord
+from app.rag import passage_retriever
+
+# Queries that read a whole table by design, matched against the SQL
+FULL_TABLE_LOADS = {
+    # In-memory search index (app/search.py) and passage index (app/rag.py)
+    "resource bodies": re.compile(
+        r"SELECT resources\.id, resources\.subject_id, subjects\.grade, resources\.title, resources\.chapter, resources\.content\s+FROM resources JOIN subjects"
+    ),
+    "question texts": re.compile(
+        r"SELECT quiz_questions\.id, quizzes\.subject_id, subjects\.grade, quiz_questions\.question_text\s+FROM quiz_questions JOIN quizzes"
+    ),
+}
+
+SUBJECTS = 30
+ROWS_PER_SUBJECT = 20
+USERS = 50
+
+def _seed(now: datetime):
+    async def seed() -> None:
+        async with SessionLocal() as db:
+            await db.execute(insert(Subject), [
+                {"id": 1000 + s, "name": f"Subject {s}", "grade": 6 + s % 6, "is_active": s % 5 != 0}
+                for s in range(SUBJECTS)
+            ])
+            await db.execute(insert(Resource), [
+                {"subject_id": 1000 + s, "title": f"Chapter {r}", "content": f"Photosynthesis notes {s} {r}",
+                 "resource_type": "textbook", "chapter": str(r)}
+                for s in range(SUBJECTS) for r in range(ROWS_PER_SUBJECT)
+            ])
+            await db.execute(insert(Quiz), [
+                {"id": 1000 + s * ROWS_PER_SUBJECT + q, "subject_id": 1000 + s, "title": f"Quiz {q}", "is_active": True}
+                for s in range(SUBJECTS) for q in range(ROWS_PER_SUBJECT)
+            ])
+            await db.execute(insert(QuizQuestion), [
+                {"quiz_id": quiz_id, "question_text": f"Question {quiz_id} {n}", "option_a": "a", "option_b": "b",
+                 "option_c": "c", "option_d": "d", "correct_answer": "A"}
+                for quiz_id in range(1000, 1000 + SUBJECTS * ROWS_PER_SUBJECT) for n in range(3)
+            ])
+            await db.execute(insert(Leaderboard), [
+                {"user_id": 100000 + u, "grade": 6 + u % 6, "total_xp": u * 10, "last_updated": now}
+                for u in range(USERS)
+            ])
+            await db.execute(insert(QuizAttempt), [
+                {"user_id": 100000 + u, "quiz_id": 1000, "score": 5, "total_questions": 10, "correct_answers": 5,
+                 "completed_at": now - timedelta(minutes=n)}
+                for u in range(USERS) for n in range(ROWS_PER_SUBJECT)
+            ])
+            await db.execute(insert(XPRecord), [
+                {"user_id": 100000 + u, "xp_amount": 10, "source": "quiz", "created_at": now - timedelta(minutes=n)}
+                for u in range(USERS) for n in range(ROWS_PER_SUBJECT)
+            ])
+            await db.commit()
+
+    return seed
+
+@pytest.fixture(scope="module")
+def recorded_queries(client, register_user) -> List[Tuple[str, object]]:
+    client.portal.call(_seed(datetime.utcnow()))
+    # Bulk inserts bypass change tracking; make the in-process indexes reload
+    # so their loads are recorded with everything else
+    for table in ("subjects", "resources", "quizzes", "quiz_questions"):
+        table_versions.bump(table)
+    headers = register_user(grade=8)
+    queries: List[Tuple[str, object]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            queries.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        requests = [
+            ("get", "/subjects/", {}),
+            ("get", "/subjects/", {"params": {"grade": 8}}),
+            ("get", "/subjects/1001", {}),
+            ("get", "/subjects/1001/resources", {}),
+            ("get", "/subjects/1001/resources", {"params": {"resource_type": "textbook"}}),
+            ("get", "/quizzes/", {"params": {"subject_id": 1001}}),
+            ("get", "/quizzes/1005", {}),
+            ("get", "/quizzes/1005/questions", {}),
+            ("post", "/quizzes/1005/submit", {"json": {"answers": {}}}),
+            ("get", "/quizzes/attempts/my", {}),
+            ("get", "/auth/me", {}),
+            ("get", "/dashboard/stats", {}),
+            ("get", "/dashboard/rank", {}),
+            ("get", "/dashboard/leaderboard", {"params": {"grade": 8}}),
+            ("get", "/dashboard/xp-history", {}),
+            ("get", "/dashboard/recent-activity", {}),
+            ("get", "/search/", {"params": {"q": "photosynthesis"}}),
+        ]
+        for method, path, kwargs in requests:
+            response = getattr(client, method)(path, headers=headers, **kwargs)
+            assert response.status_code < 500, (path, response.text)
+
+        # The passage index behind /ai/chat (the chat itself needs Gemini)
+        async def load_passages() -> None:
+            async with SessionLocal() as db:
+                await passage_retriever.warm(db)
+
+        client.portal.call(load_passages)
+        # Page two of every keyset-paginated list
+        for path in ("/subjects/", "/quizzes/attempts/my", "/dashboard/xp-history"):
+            response = client.get(path, headers=headers, params={"limit": 1})
+            cursor = response.headers.get("x-next-cursor")
+            if cursor:
+                client.get(path, headers=headers, params={"limit": 1, "cursor": cursor})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    return queries
+
+def _sqlite_full_scans(conn, statement: str, parameters) -> List[str]:
+    details = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    # A LIMITed walk in ORDER BY order (no sort step) stops after one page
+    if re.search(r"\bORDER BY\b.*\bLIMIT\b", statement, re.S) and not any("TEMP B-TREE" in detail for detail in details):
+        return []
+    # SCAN, with or without an index, reads the whole table; "SCAN anon_1"
+    # and the like are subqueries
+    return [
+        detail for detail in details
+        if detail.startswith("SCAN ") and detail.split()[1] in Base.metadata.tables
+    ]
+
+def _postgres_full_scans(conn, statement: str, parameters) -> List[str]:
+    # Tiny test tables favour sequential scans; with them discouraged, a
+    # remaining Seq Scan means no index can serve the query
+    conn.exec_driver_sql("SET enable_seqscan = off")
+    plan = json.loads(conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar())
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan":
+            yield f"Seq Scan on {node['Relation Name']}"
+        for child in node.get("Plans", ()):
+            yield from walk(child)
+
+    return list(walk(plan[0]["Plan"]))
+
+def test_router_queries_use_indexes(client, recorded_queries):
+    assert recorded_queries
+
+    async def explain_all():
+        problems = []
+        async with engine.connect() as conn:
+            for statement, parameters in recorded_queries:
+                if any(pattern.search(statement) for pattern in FULL_TABLE_LOADS.values()):
+                    continue
+                explain = _postgres_full_scans if engine.dialect.name == "postgresql" else _sqlite_full_scans
+                scans = await conn.run_sync(lambda sync_conn: explain(sync_conn, statement, parameters))
+                if scans:
+                    problems.append(f"{', '.join(scans)}:\n{statement}")
+        return problems
+
+    problems = client.portal.call(explain_all)
+    assert not problems, "Queries without a usable index:\n\n" + "\n\n".join(problems)
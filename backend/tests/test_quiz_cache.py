@@ -0,0 +1,72 @@
+import asyncio
+from app.quiz_cache import QuizPayload, QuizPayloadCache
+
+def test_concurrent_misses_share_one_load(monkeypatch):
+    cache = QuizPayloadCache(ttl_seconds=60, max_entries=10)
+    loads = 0
+
+    async def load(db, quiz_id):
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return QuizPayload(body=b"[]", etag='"e"')
+
+    monkeypatch.setattr(cache, "_load", load)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get(None, 1) for _ in range(20)))
+
+    payloads = asyncio.run(scenario())
+    assert loads == 1
+    assert len(set(payloads)) == 1
+    assert cache._flights == {}
+
+def test_request_arriving_at_release_waits_its_turn(monkeypatch):
+    # Nothing is cached (the quiz does not exist), so every request loads,
+    # but never two at once
+    cache = QuizPayloadCache(ttl_seconds=60, max_entries=10)
+    active = max_active = 0
+    late_requests = []
+
+    async def load(db, quiz_id):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if not late_requests:
+            # Lands between this request releasing the lock and the queued
+            # waiter taking it
+            loop = asyncio.get_running_loop()
+            loop.call_soon(lambda: late_requests.append(asyncio.ensure_future(cache.get(None, 1))))
+        return None
+
+    monkeypatch.setattr(cache, "_load", load)
+
+    async def scenario():
+        await asyncio.gather(cache.get(None, 1), cache.get(None, 1))
+        await asyncio.gather(*late_requests)
+
+    asyncio.run(scenario())
+    assert max_active == 1
+    assert cache._flights == {}
+
+def test_cancelled_waiter_is_not_counted(monkeypatch):
+    cache = QuizPayloadCache(ttl_seconds=60, max_entries=10)
+
+    async def load(db, quiz_id):
+        await asyncio.sleep(0.01)
+        return QuizPayload(body=b"[]", etag='"e"')
+
+    monkeypatch.setattr(cache, "_load", load)
+
+    async def scenario():
+        first = asyncio.ensure_future(cache.get(None, 1))
+        waiter = asyncio.ensure_future(cache.get(None, 1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await first
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert cache._flights == {}
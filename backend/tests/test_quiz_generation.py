@@ -0,0 +1,72 @@
+import asyncio
+from app.quiz_generation import question_pool
+from app.rate_limit import KeyedRateLimiter
+from app.routers import ai_chat
+from app.schemas import QuizGenerationJob
+
+def _question(text: str) -> dict:
+    return {
+        "question": text,
+        "options": {"A": "Root", "B": "Stem", "C": "Leaf", "D": "Flower"},
+        "correct_answer": "C",
+        "explanation": None,
+    }
+
+def test_store_counts_only_new_questions(client):
+    job = QuizGenerationJob(subject="Science", topic="Plants", grade=7)
+
+    async def store_twice():
+        first = await question_pool._store(job, [_question("Where does photosynthesis happen?")])
+        # The repeat (differing only in case and punctuation) is skipped, not the whole batch
+        second = await question_pool._store(job, [
+            _question("where does photosynthesis happen"),
+            _question("Which part absorbs water?"),
+        ])
+        return first, second
+
+    assert client.portal.call(store_twice) == (1, 1)
+
+def test_concurrent_stores_insert_each_question_once(client):
+    job = QuizGenerationJob(subject="Science", topic="Cells", grade=7)
+    questions = [_question(f"Cell question {n}?") for n in range(5)]
+
+    async def store_concurrently():
+        return await asyncio.gather(*(question_pool._store(job, questions) for _ in range(4)))
+
+    assert sum(client.portal.call(store_concurrently)) == len(questions)
+
+def test_refills_only_seeded_topics_within_the_user_budget(client, register_user, monkeypatch):
+    async def seed():
+        seed_job = QuizGenerationJob(subject="Science", topic="Seeds", grade=6)
+        await question_pool._store(seed_job, [_question("What does a seed need to germinate?")])
+
+    client.portal.call(seed)
+    submitted = []
+    monkeypatch.setattr(ai_chat.question_pool, "submit", lambda job: submitted.append(job.topic) or True)
+    monkeypatch.setattr(ai_chat, "refill_limiter", KeyedRateLimiter(rate=1 / 3600, capacity=2))
+
+    async def generated(**kwargs):
+        return _question("Generated on demand?")
+
+    monkeypatch.setattr(ai_chat.get_ai_service(), "generate_quiz_question", generated)
+    headers = register_user()
+
+    def ask(topic: str) -> None:
+        response = client.post(
+            "/ai/generate-quiz-question", headers=headers,
+            params={"subject": "Science", "topic": topic, "grade": 6}
+        )
+        assert response.status_code == 200, response.text
+
+    ask("Anything at all")
+    assert submitted == []
+
+    for _ in range(4):
+        ask("Seeds")
+    assert submitted == ["Seeds", "Seeds"]
+
+def test_keyed_rate_limiter_is_per_key():
+    limiter = KeyedRateLimiter(rate=1 / 3600, capacity=1)
+    assert limiter.try_acquire(1)
+    assert not limiter.try_acquire(1)
+    assert limiter.try_acquire(2)
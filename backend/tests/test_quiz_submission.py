@@ -0,0 +1,259 @@
+import asyncio
+from datetime import date, timedelta
+import httpx
+from sqlalchemy import func, insert, literal, select
+from app.database import SessionLocal, engine
+from app.leaderboard import calculate_quiz_xp, quiz_xp_sql, rebuild_leaderboard, record_activity_day
+from app.models import Leaderboard, Profile, Quiz, QuizAttempt, QuizQuestion, Subject, XPRecord
+import app.xp_events
+from app.xp_events import xp_events
+
+SUBMISSIONS_PER_USER = 50
+
+def _create_quiz(client, answers: str) -> tuple:
+    """Quiz with one question per answer letter; returns (quiz_id, question ids)"""
+    async def create():
+        async with SessionLocal() as db:
+            subject_id = (await db.execute(
+                insert(Subject).values(name="Submission Science", grade=8).returning(Subject.id)
+            )).scalar_one()
+            quiz_id = (await db.execute(
+                insert(Quiz).values(subject_id=subject_id, title="Plants", is_active=True).returning(Quiz.id)
+            )).scalar_one()
+            question_ids = []
+            for n, answer in enumerate(answers):
+                question_ids.append((await db.execute(
+                    insert(QuizQuestion).values(
+                        quiz_id=quiz_id, question_text=f"Question {n}", option_a="a", option_b="b",
+                        option_c="c", option_d="d", correct_answer=answer
+                    ).returning(QuizQuestion.id)
+                )).scalar_one())
+            await db.commit()
+            return quiz_id, question_ids
+
+    return client.portal.call(create)
+
+def test_client_reported_scores_are_ignored(client, register_user):
+    quiz_id, question_ids = _create_quiz(client, "AB")
+    headers = register_user()
+
+    response = client.post(f"/quizzes/{quiz_id}/submit", headers=headers, json={
+        "answers": {str(question_ids[0]): "a", str(question_ids[1]): "C"},
+        "score": 2, "total_questions": 2, "correct_answers": 2,
+    })
+
+    assert response.status_code == 200, response.text
+    attempt = response.json()
+    assert (attempt["score"], attempt["total_questions"], attempt["correct_answers"]) == (1, 2, 1)
+
+def test_quiz_comes_from_the_path(client, register_user):
+    quiz_id, question_ids = _create_quiz(client, "A")
+    other_quiz_id, _ = _create_quiz(client, "B")
+
+    response = client.post(f"/quizzes/{quiz_id}/submit", headers=register_user(), json={
+        "quiz_id": other_quiz_id, "answers": {str(question_ids[0]): "A"},
+    })
+
+    assert response.status_code == 200, response.text
+    assert (response.json()["quiz_id"], response.json()["score"]) == (quiz_id, 1)
+
+def test_answers_are_required(client, register_user):
+    quiz_id, _ = _create_quiz(client, "A")
+    response = client.post(f"/quizzes/{quiz_id}/submit", headers=register_user(), json={
+        "score": 1, "total_questions": 1, "correct_answers": 1,
+    })
+
+    assert response.status_code == 422
+
+def test_concurrent_submissions_award_exact_xp(client, register_user):
+    quiz_id, question_ids = _create_quiz(client, "ABCD")
+    users = [register_user() for _ in range(4)]
+    user_ids = [client.get("/auth/me", headers=headers).json()["id"] for headers in users]
+
+    # Each user's submissions cycle through 0-4 correct answers
+    def answers(correct: int) -> dict:
+        return {
+            str(question_id): (letter if n < correct else "X")
+            for n, (question_id, letter) in enumerate(zip(question_ids, "ABCD"))
+        }
+
+    submissions = [
+        (headers, n % 5) for headers in users for n in range(SUBMISSIONS_PER_USER)
+    ]
+    expected_xp = SUBMISSIONS_PER_USER // 5 * sum(calculate_quiz_xp(correct, 4) for correct in range(5))
+
+    async def submit_all():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+            responses = await asyncio.gather(*(
+                api.post(f"/quizzes/{quiz_id}/submit", headers=headers,
+                         json={"answers": answers(correct)})
+                for headers, correct in submissions
+            ))
+        # Drain the write-behind XP queue
+        await xp_events.stop()
+        await xp_events.start()
+        return responses
+
+    responses = client.portal.call(submit_all)
+    assert [response.status_code for response in responses] == [200] * len(submissions)
+
+    async def totals():
+        async with SessionLocal() as db:
+            profiles = dict((await db.execute(
+                select(Profile.user_id, Profile.total_xp).where(Profile.user_id.in_(user_ids))
+            )).all())
+            attempts = (await db.execute(
+                select(func.count()).select_from(QuizAttempt).where(QuizAttempt.user_id.in_(user_ids))
+            )).scalar_one()
+            records = (await db.execute(
+                select(func.count()).select_from(XPRecord)
+                .where(XPRecord.user_id.in_(user_ids), XPRecord.source == "quiz")
+            )).scalar_one()
+            return profiles, attempts, records
+
+    profiles, attempts, records = client.portal.call(totals)
+    assert attempts == records == len(submissions)
+    assert profiles == {user_id: expected_xp for user_id in user_ids}
+
+def _xp_state(client, user_id: int) -> tuple:
+    """(profile total, leaderboard total, [totals_applied of each quiz XP record])"""
+    async def read():
+        async with SessionLocal() as db:
+            profile_xp = (await db.execute(select(Profile.total_xp).where(Profile.user_id == user_id))).scalar_one()
+            leaderboard_xp = (await db.execute(select(Leaderboard.total_xp).where(Leaderboard.user_id == user_id))).scalar_one()
+            applied = (await db.execute(
+                select(XPRecord.totals_applied).where(XPRecord.user_id == user_id, XPRecord.source == "quiz")
+            )).scalars().all()
+            return profile_xp, leaderboard_xp, applied
+
+    return client.portal.call(read)
+
+def test_xp_lost_from_the_queue_is_swept_up(client, register_user, monkeypatch):
+    quiz_id, question_ids = _create_quiz(client, "A")
+    headers = register_user()
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+
+    async def lost(event):
+        pass
+
+    # The worker dies with the event still queued
+    monkeypatch.setattr(xp_events, "publish", lost)
+    response = client.post(f"/quizzes/{quiz_id}/submit", headers=headers,
+                           json={"answers": {str(question_ids[0]): "A"}})
+    assert response.status_code == 200, response.text
+    assert _xp_state(client, user_id) == (0, 0, [False])
+
+    monkeypatch.undo()
+    assert client.portal.call(xp_events.sweep, 0) >= 1
+    xp = calculate_quiz_xp(1, 1)
+    assert _xp_state(client, user_id) == (xp, xp, [True])
+
+    # Replaying the event (the queue was flushed after all) changes nothing
+    assert client.portal.call(xp_events.sweep, 0) == 0
+    assert _xp_state(client, user_id) == (xp, xp, [True])
+
+def test_failed_direct_xp_write_still_accepts_the_submission(client, register_user, monkeypatch):
+    quiz_id, question_ids = _create_quiz(client, "A")
+    headers = register_user()
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+
+    async def failing(db, events):
+        raise RuntimeError("database unavailable")
+
+    client.portal.call(xp_events.stop)
+    try:
+        monkeypatch.setattr(app.xp_events, "apply_xp_events", failing)
+        response = client.post(f"/quizzes/{quiz_id}/submit", headers=headers,
+                               json={"answers": {str(question_ids[0]): "B"}})
+        monkeypatch.undo()
+    finally:
+        client.portal.call(xp_events.start)
+
+    # Not a 500: the attempt is committed, so a retry would submit it twice
+    assert response.status_code == 200, response.text
+    assert _xp_state(client, user_id) == (0, 0, [False])
+
+    client.portal.call(xp_events.sweep, 0)
+    assert _xp_state(client, user_id) == (calculate_quiz_xp(0, 1),) * 2 + ([True],)
+
+def test_average_score_is_a_percentage(client, register_user):
+    short_quiz, short_questions = _create_quiz(client, "A")
+    long_quiz, long_questions = _create_quiz(client, "ABCD")
+    headers = register_user()
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+
+    # 1/1 and 1/4 correct: 100% and 25%, not 1 and 1
+    for quiz_id, question_ids in ((short_quiz, short_questions), (long_quiz, long_questions)):
+        response = client.post(f"/quizzes/{quiz_id}/submit", headers=headers,
+                               json={"answers": {str(question_ids[0]): "A"}})
+        assert response.status_code == 200, response.text
+
+    async def averages():
+        await xp_events.stop()
+        await xp_events.start()
+        async with SessionLocal() as db:
+            incremental = (await db.execute(
+                select(Leaderboard.average_score).where(Leaderboard.user_id == user_id)
+            )).scalar_one()
+        async with engine.connect() as conn:
+            await rebuild_leaderboard(conn)
+            rebuilt = (await conn.execute(
+                select(Leaderboard.average_score).where(Leaderboard.user_id == user_id)
+            )).scalar_one()
+            await conn.rollback()
+        return incremental, rebuilt
+
+    incremental, rebuilt = client.portal.call(averages)
+    assert incremental == 62.5
+    assert float(rebuilt) == 62.5
+    assert client.get("/dashboard/stats", headers=headers).json()["average_score"] == 62.5
+
+def test_streak_follows_activity_days(client, register_user):
+    headers = register_user()
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    start = date(2026, 3, 1)
+
+    async def streak_after(offset: int) -> tuple:
+        async with SessionLocal() as db:
+            await record_activity_day(db, user_id, start + timedelta(days=offset))
+            await db.commit()
+            return tuple((await db.execute(
+                select(Profile.current_streak, Profile.longest_streak).where(Profile.user_id == user_id)
+            )).one())
+
+    # Consecutive days grow it, a repeat or older day leaves it, a gap restarts it
+    expected = [(0, (1, 1)), (0, (1, 1)), (1, (2, 2)), (2, (3, 3)), (1, (3, 3)), (5, (1, 3)), (6, (2, 3))]
+    for offset, streaks in expected:
+        assert client.portal.call(streak_after, offset) == streaks, offset
+
+def test_submission_advances_the_streak(client, register_user):
+    quiz_id, question_ids = _create_quiz(client, "A")
+    headers = register_user()
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+
+    response = client.post(f"/quizzes/{quiz_id}/submit", headers=headers,
+                           json={"answers": {str(question_ids[0]): "A"}})
+    assert response.status_code == 200, response.text
+
+    async def leaderboard_streak():
+        await xp_events.stop()
+        await xp_events.start()
+        async with SessionLocal() as db:
+            return (await db.execute(
+                select(Leaderboard.current_streak).where(Leaderboard.user_id == user_id)
+            )).scalar_one()
+
+    assert client.portal.call(leaderboard_streak) == 1
+    stats = client.get("/dashboard/stats", headers=headers).json()
+    assert (stats["current_streak"], stats["longest_streak"]) == (1, 1)
+
+def test_sql_quiz_xp_matches_calculate_quiz_xp(client):
+    scores = [(score, total) for total in range(21) for score in range(total + 1)]
+
+    async def sql_xp():
+        async with SessionLocal() as db:
+            return [(await db.execute(select(quiz_xp_sql(literal(score), literal(total))))).scalar_one()
+                    for score, total in scores]
+
+    assert client.portal.call(sql_xp) == [calculate_quiz_xp(score, total) for score, total in scores]
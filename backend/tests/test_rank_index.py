@@ -0,0 +1,108 @@
+import asyncio
+import random
+from sqlalchemy import delete, insert
+from app.database import SessionLocal
+from app.models import Leaderboard
+from app.rank_index import GradeRankIndex, SortedSet
+
+TRIALS = 200
+
+def _ordered(scores: dict) -> list:
+    """Reference order: score descending, then member ascending"""
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+def _check(zset: SortedSet, scores: dict) -> None:
+    ordered = _ordered(scores)
+    assert len(zset) == len(scores)
+    assert zset.range(0, len(scores) + 1) == ordered
+    for position, (member, score) in enumerate(ordered):
+        assert zset.position(member) == position
+        assert zset.score(member) == score
+        assert zset.count_greater(score) == sum(1 for other in scores.values() if other > score)
+        assert zset.count_at_least(score) == sum(1 for other in scores.values() if other >= score)
+
+def test_sorted_set_matches_a_sorted_list():
+    rng = random.Random(2026)
+    for _ in range(TRIALS):
+        zset = SortedSet()
+        scores = {}
+        for _ in range(rng.randint(0, 60)):
+            member = rng.randint(1, 40)
+            # A narrow score range makes ties common
+            if rng.random() < 0.25:
+                zset.remove(member)
+                scores.pop(member, None)
+            else:
+                score = rng.randint(0, 10)
+                zset.add(member, score)
+                scores[member] = score
+        _check(zset, scores)
+
+        start, stop = sorted(rng.randint(0, len(scores) + 2) for _ in range(2))
+        assert zset.range(start, stop) == _ordered(scores)[start:stop]
+
+def test_bulk_load_matches_inserts():
+    rng = random.Random(7)
+    for _ in range(TRIALS):
+        scores = {member: rng.randint(0, 5) for member in rng.sample(range(1, 500), rng.randint(0, 100))}
+        zset = SortedSet.from_sorted(_ordered(scores))
+        _check(zset, scores)
+
+        # A bulk-loaded set keeps working under updates
+        for member in list(scores)[:10]:
+            scores[member] = rng.randint(0, 5)
+            zset.add(member, scores[member])
+        _check(zset, scores)
+
+def test_ties_share_a_score_and_break_by_member():
+    zset = SortedSet()
+    for member in (3, 1, 2):
+        zset.add(member, 50)
+    zset.add(4, 70)
+
+    assert zset.range(0, 4) == [(4, 70), (1, 50), (2, 50), (3, 50)]
+    assert zset.count_greater(50) == 1
+    assert zset.count_at_least(50) == 4
+    assert [zset.position(member) for member in (1, 2, 3)] == [1, 2, 3]
+
+    zset.remove(2)
+    zset.remove(2)
+    assert zset.range(0, 4) == [(4, 70), (1, 50), (3, 50)]
+    assert zset.position(2) is None
+
+GRADE = 42
+
+def test_stale_grade_is_served_while_it_reloads(client):
+    index = GradeRankIndex(refresh_seconds=60)
+
+    async def scenario():
+        async with SessionLocal() as db:
+            await db.execute(delete(Leaderboard).where(Leaderboard.grade == GRADE))
+            await db.execute(insert(Leaderboard), [
+                {"user_id": 900000 + n, "grade": GRADE, "total_xp": 10 * n} for n in range(5)
+            ])
+            await db.commit()
+
+            assert await index.total(db, GRADE) == 5
+            assert await index.rank(db, GRADE, 25) == 3
+
+            # Another worker adds a user; this process awards XP meanwhile
+            await db.execute(insert(Leaderboard).values(user_id=900010, grade=GRADE, total_xp=100))
+            await db.commit()
+            index._grades[GRADE]._built_at -= 60
+
+            assert await index.total(db, GRADE) == 5
+            reload = index._grades[GRADE]._refresh
+            # Let the reload start reading, then commit XP it may not see
+            await asyncio.sleep(0)
+            index.update(900000, GRADE, 1000)
+            await reload
+
+            assert await index.total(db, GRADE) == 6
+            assert await index.rank(db, GRADE, 1000) == 1
+            assert await index.rank(db, GRADE, 100) == 2
+
+            await db.execute(delete(Leaderboard).where(Leaderboard.grade == GRADE))
+            await db.commit()
+
+    client.portal.call(scenario)
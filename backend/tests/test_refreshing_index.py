@@ -0,0 +1,56 @@
+import asyncio
+from app.http_cache import table_versions
+from app.refreshing_index import RefreshingIndex
+
+TABLE = "refreshing_index_test"
+
+def test_stale_index_is_served_while_it_rebuilds():
+    async def scenario():
+        builds = []
+        release = asyncio.Event()
+
+        async def build(db):
+            if builds:
+                await release.wait()
+            builds.append(len(builds))
+            return f"index {len(builds)}"
+
+        index = RefreshingIndex("test", (TABLE,), refresh_seconds=60, build=build)
+        assert await index.get(None) == "index 1"
+
+        table_versions.bump(TABLE)
+        # Concurrent requests get the old index at once and start one rebuild
+        assert await asyncio.gather(*(index.get(None) for _ in range(10))) == ["index 1"] * 10
+        assert not index.is_fresh()
+
+        release.set()
+        await index._refresh
+        assert builds == [0, 1]
+        assert await index.get(None) == "index 2"
+        assert index.is_fresh()
+
+    asyncio.run(scenario())
+
+def test_failed_rebuild_keeps_the_previous_index():
+    async def scenario():
+        calls = 0
+
+        async def build(db):
+            nonlocal calls
+            calls += 1
+            if calls > 1:
+                raise RuntimeError("database unavailable")
+            return "index"
+
+        index = RefreshingIndex("test", (TABLE,), refresh_seconds=60, build=build)
+        await index.get(None)
+        table_versions.bump(TABLE)
+
+        assert await index.get(None) == "index"
+        await index._refresh
+        # Retried after a delay, not on every request
+        assert await index.get(None) == "index"
+        assert index._refresh.done() and calls == 2
+        await index.stop()
+
+    asyncio.run(scenario())
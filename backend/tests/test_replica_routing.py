@@ -0,0 +1,75 @@
+import time
+import pytest
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.database import READ_YOUR_WRITES_COOKIE, ReplicaRouter, engine, replica_router
+
+@pytest.fixture(scope="module")
+def replica_engine(tmp_path_factory):
+    # Never connected to: the tests only check which engine a session is bound to
+    return create_async_engine(f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('replica')}/replica.db")
+
+def make_router(replica_engine) -> ReplicaRouter:
+    return ReplicaRouter(replica_engine, check_interval=60, max_lag_seconds=5, read_your_writes_seconds=10)
+
+def request_with(cookies: dict) -> Request:
+    header = "; ".join(f"{name}={value}" for name, value in cookies.items())
+    return Request({"type": "http", "headers": [(b"cookie", header.encode())] if header else []})
+
+def cookies_of(response: Response) -> dict:
+    cookies = {}
+    for name, value in response.raw_headers:
+        if name == b"set-cookie":
+            key, _, rest = value.decode().partition("=")
+            cookies[key] = rest.split(";")[0]
+    return cookies
+
+def test_reads_use_the_replica(replica_engine):
+    router = make_router(replica_engine)
+    assert router.session().bind is replica_engine
+    assert router.session(user_id=1).bind is replica_engine
+
+def test_writer_reads_from_the_primary_in_process(replica_engine):
+    router = make_router(replica_engine)
+    router.mark_write(1)
+    assert router.session(user_id=1).bind is engine
+    assert router.session(user_id=2).bind is replica_engine
+
+def test_pin_cookie_routes_other_workers_to_the_primary(replica_engine):
+    writer, other_worker = make_router(replica_engine), make_router(replica_engine)
+    response = Response()
+    writer.mark_write(1, response)
+
+    request = request_with(cookies_of(response))
+    assert other_worker.pinned(request)
+    assert other_worker.session(user_id=1, pinned=other_worker.pinned(request)).bind is engine
+    assert not other_worker.pinned(request_with({}))
+
+def test_expired_or_malformed_pins_are_ignored(replica_engine):
+    router = make_router(replica_engine)
+    assert not router.pinned(request_with({READ_YOUR_WRITES_COOKIE: str(int(time.time()) - 1)}))
+    assert not router.pinned(request_with({READ_YOUR_WRITES_COOKIE: "soon"}))
+
+def test_unhealthy_replica_reads_from_the_primary(replica_engine):
+    router = make_router(replica_engine)
+    router.healthy = False
+    assert router.session().bind is engine
+
+def test_write_paths_set_the_pin(client, register_user, replica_engine, monkeypatch):
+    # The app runs without a replica; give the global router one
+    monkeypatch.setattr(replica_router, "engine", replica_engine)
+    client.cookies.clear()
+
+    headers = register_user()
+    assert READ_YOUR_WRITES_COOKIE in client.cookies
+    client.cookies.clear()
+
+    response = client.put("/auth/me", headers=headers, json={"school": "Royal College"})
+    assert response.status_code == 200, response.text
+    assert READ_YOUR_WRITES_COOKIE in response.cookies
+    client.cookies.clear()
+
+def test_database_health_reports_only_status(client):
+    response = client.get("/health/db")
+    assert response.status_code == 200
+    assert response.json() == {"status": "up"}
@@ -0,0 +1,133 @@
+import pytest
+from sqlalchemy import delete, insert, update
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Resource, Subject
+from app.resource_content import apply_content_fields, content_fields, parse_range, RangeNotSatisfiable
+from app.routers import subjects
+
+TEXT = ("Photosynthesis converts light energy. " * 200) + "ශ්‍රී ලංකාව"
+RAW = TEXT.encode("utf-8")
+
+@pytest.fixture(scope="module")
+def resources(client):
+    """Resource ids by name ("legacy" predates the content fields) and their subject"""
+    async def seed():
+        async with SessionLocal() as db:
+            subject_id = (await db.execute(
+                insert(Subject).values(name="Reading", grade=8).returning(Subject.id)
+            )).scalar_one()
+            ids = {"subject": subject_id}
+            for name, content in (("big", TEXT), ("empty", ""), ("legacy", "legacy body")):
+                resource = Resource(subject_id=subject_id, title=name, content=content, resource_type="textbook")
+                await apply_content_fields(resource)
+                db.add(resource)
+                await db.flush()
+                ids[name] = resource.id
+            await db.execute(
+                update(Resource).where(Resource.id == ids["legacy"])
+                .values(content_hash=None, content_size=None, content_gzip=None, content_br=None)
+            )
+            await db.commit()
+            return ids
+
+    return client.portal.call(seed)
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Several substr() reads per body
+    monkeypatch.setattr(settings, "resource_chunk_bytes", 1000)
+
+def content_url(resource_id: int) -> str:
+    return f"/subjects/resources/{resource_id}/content"
+
+def test_identity_body_is_read_in_chunks(client, resources):
+    response = client.get(content_url(resources["big"]), headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == RAW
+    assert response.headers["content-length"] == str(len(RAW))
+
+def test_compressed_body(client, resources):
+    response = client.get(content_url(resources["big"]), headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    # httpx decodes it; check the stored copy round-trips
+    assert response.content == RAW
+    assert int(response.headers["content-length"]) < len(RAW)
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=10-19", RAW[10:20]),
+    ("bytes=995-2004", RAW[995:2005]),
+    ("bytes=-25", RAW[-25:]),
+    (f"bytes={len(RAW) - 3}-", RAW[-3:]),
+])
+def test_ranges_cover_multibyte_text(client, resources, header, expected):
+    response = client.get(content_url(resources["big"]), headers={"Range": header})
+    assert response.status_code == 206
+    assert response.content == expected
+
+def test_unsatisfiable_ranges(client, resources):
+    response = client.get(content_url(resources["big"]), headers={"Range": f"bytes={len(RAW)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(RAW)}"
+
+    response = client.get(content_url(resources["empty"]), headers={"Range": "bytes=-5"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */0"
+
+def test_empty_body(client, resources):
+    response = client.get(content_url(resources["empty"]))
+    assert response.status_code == 200
+    assert response.content == b""
+
+def test_legacy_body(client, resources):
+    response = client.get(content_url(resources["legacy"]), headers={"Range": "bytes=0-5"})
+    assert response.status_code == 206
+    assert response.content == b"legacy"
+
+def test_resource_deleted_before_the_body_is_read(client, resources, monkeypatch):
+    async def seed():
+        async with SessionLocal() as db:
+            resource = Resource(subject_id=resources["subject"], title="doomed", content=TEXT, resource_type="textbook")
+            db.add(resource)
+            await db.commit()
+            return resource.id
+
+    resource_id = client.portal.call(seed)
+    read_body = subjects.read_body
+
+    async def delete_then_read(sessions, resource_id, *args):
+        async with SessionLocal() as db:
+            await db.execute(delete(Resource).where(Resource.id == resource_id))
+            await db.commit()
+        async for chunk in read_body(sessions, resource_id, *args):
+            yield chunk
+
+    monkeypatch.setattr(subjects, "read_body", delete_then_read)
+    assert client.get(content_url(resource_id)).status_code == 404
+
+def test_suffix_range_of_empty_body_is_unsatisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=-1", 0)
+    assert parse_range("bytes=-1", 1) == (0, 0)
+
+def test_flush_without_apply_content_fields_does_not_compress(client, resources):
+    async def write():
+        async with SessionLocal() as db:
+            resource = Resource(subject_id=resources["subject"], title="unprepared", content=TEXT, resource_type="textbook")
+            db.add(resource)
+            await db.commit()
+            return resource
+
+    resource = client.portal.call(write)
+    expected = content_fields(TEXT)
+    assert (resource.content_size, resource.content_hash) == (expected["content_size"], expected["content_hash"])
+    assert resource.content_gzip is None and resource.content_br is None
+
+    response = client.get(content_url(resource.id), headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == RAW
+
+def test_best_compression_is_smaller():
+    online, best = content_fields(TEXT), content_fields(TEXT, best=True)
+    assert online["content_hash"] == best["content_hash"]
+    assert len(best["content_gzip"]) <= len(online["content_gzip"])
@@ -0,0 +1,32 @@
+from app.response_cache import ResponseCache
+
+def make_cache(**overrides) -> ResponseCache:
+    options = dict(ttl_seconds=60, max_entries=100, max_bytes=1 << 20, similarity_threshold=0.5)
+    options.update(overrides)
+    return ResponseCache(**options)
+
+def test_semantic_hit_for_non_latin_question():
+    cache = make_cache()
+    cache.set("prompt 1", "ප්‍රභාසංශ්ලේෂණය සිදුවන්නේ කොහේද", "Science", 8, "In the leaves")
+
+    assert cache.get("prompt 2", "ප්‍රභාසංශ්ලේෂණය සිදුවන්නේ කොහේද?", "Science", 8) == "In the leaves"
+    assert cache.semantic_hits == 1
+
+def test_questions_without_tokens_skip_the_semantic_tier():
+    cache = make_cache()
+    cache.set("prompt 1", "???", "Science", 8, "Ask a question")
+
+    assert cache._scopes == {}
+    assert cache.get("prompt 2", "!!!", "Science", 8) is None
+    # The exact tier still serves it
+    assert cache.get("prompt 1", "???", "Science", 8) == "Ask a question"
+
+def test_semantic_candidates_are_capped_per_scope():
+    cache = make_cache(max_scope_entries=2)
+    for n, topic in enumerate(["photosynthesis", "evaporation", "germination"]):
+        cache.set(f"prompt {n}", f"explain {topic}", "Science", 8, topic)
+
+    assert len(cache._scopes[("Science", 8)]) == 2
+    assert cache.get("other", "explain photosynthesis", "Science", 8) is None
+    assert cache.get("prompt 0", "explain photosynthesis", "Science", 8) == "photosynthesis"
+    assert cache.get("other", "explain germination", "Science", 8) == "germination"
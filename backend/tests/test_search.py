@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import insert
+from app.database import SessionLocal
+from app.http_cache import table_versions
+from app.models import Resource, Subject
+from app.search import highlight, search_engine, search_terms
+
+@pytest.mark.parametrize("text, terms", [
+    ("ප්‍රභාසංශ්ලේෂණය", ["ප්‍රභාසංශ්ලේෂණය"]),
+    ("ஒளிச்சேர்க்கை எங்கு", ["ஒளிச்சேர்க்கை", "எங்கு"]),
+    ("Photosynthesis, in LEAVES", ["photosynthesis", "in", "leaves"]),
+])
+def test_search_terms_keep_whole_words(text, terms):
+    assert search_terms(text) == terms
+
+def test_highlight_marks_whole_non_latin_words():
+    text = "පත්‍ර තුළ ප්‍රභාසංශ්ලේෂණය සිදු කෙරේ"
+    assert highlight(text, ["ප්‍රභා"]) == "පත්‍ර තුළ <mark>ප්‍රභාසංශ්ලේෂණය</mark> සිදු කෙරේ"
+
+# Each language has a resource about photosynthesis and one about evaporation
+RESOURCES = {
+    "Sinhala": ("ප්‍රභාසංශ්ලේෂණය", "ප්‍රභාසංශ්ලේෂණය ශාක පත්‍ර තුළ සිදු කෙරේ", "වාෂ්පීකරණය මගින් ජලය වායුගෝලයට එකතු වේ"),
+    "Tamil": ("ஒளிச்சேர்க்கை", "ஒளிச்சேர்க்கை இலைகளில் நடைபெறுகிறது", "ஆவியாதல் மூலம் நீர் வளிமண்டலத்தை அடைகிறது"),
+}
+
+def test_search_finds_non_latin_resources(client):
+    async def seed():
+        subject_ids = {}
+        async with SessionLocal() as db:
+            for language, (_, relevant, other) in RESOURCES.items():
+                subject_id = (await db.execute(
+                    insert(Subject).values(name=f"Search science ({language})", grade=10).returning(Subject.id)
+                )).scalar_one()
+                await db.execute(insert(Resource), [
+                    {"subject_id": subject_id, "title": title, "content": content, "resource_type": "textbook"}
+                    for title, content in (("relevant", relevant), ("other", other))
+                ])
+                subject_ids[language] = subject_id
+            await db.commit()
+        table_versions.bump("resources")
+        # Searches keep the previous index until the rebuild is done
+        async with SessionLocal() as db:
+            await search_engine.warm(db)
+        return subject_ids
+
+    subject_ids = client.portal.call(seed)
+
+    for language, (query, _, _) in RESOURCES.items():
+        # A prefix of the word matches it whole
+        for q in (query, query[:len(query) // 2]):
+            response = client.get("/search/", params={"q": q, "subject_id": subject_ids[language]})
+            assert response.status_code == 200, response.text
+            hits = response.json()
+            assert [hit["title"] for hit in hits] == ["relevant"], (language, q)
+            assert f"<mark>{query}</mark>" in hits[0]["snippet"]